@@ -0,0 +1,94 @@
+import datetime
+import errno
+import hashlib
+import json
+import os
+
+from scripts.kernel_sources import HASH_CHUNK_SIZE, cache_lock, sha256_of_file
+
+CHECKSUMS_FILE = "SHA256SUMS"
+
+
+def balanced_batches(paths, batches):
+    """
+    Splits `paths` into at most `batches` lists of roughly equal total size,
+    largest files first, so one rpmsign call does not end up with every big
+    package while the others finish early.
+    """
+    batches = max(1, min(batches, len(paths)))
+    groups = [[] for _ in range(batches)]
+    sizes = [0] * batches
+    for path in sorted(paths, key=os.path.getsize, reverse=True):
+        smallest = sizes.index(min(sizes))
+        groups[smallest].append(path)
+        sizes[smallest] += os.path.getsize(path)
+    return [sorted(group) for group in groups if group]
+
+
+def _copy_with_checksum(src, dst):
+    # Copies and hashes in a single read of the source
+    digest = hashlib.sha256()
+    tmp_path = dst + ".part"
+    with open(src, "rb") as src_f, open(tmp_path, "wb") as dst_f:
+        for chunk in iter(lambda: src_f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            dst_f.write(chunk)
+    os.replace(tmp_path, dst)
+    os.remove(src)
+    return digest.hexdigest()
+
+
+def publish_artifact(src, dest_dir):
+    """
+    Moves `src` into `dest_dir`. A rename is used when both are on the same
+    filesystem; otherwise the file is copied and checksummed in the same pass
+    (the rpmbuild root normally lives in the container, artifacts/ on the
+    bind-mounted workspace). After a rename the file is read once more for
+    its checksum: rpmsign, an external tool, wrote it last, so there is no
+    write to hash along with. The read usually hits the page cache.
+    Returns a manifest entry.
+    """
+    dst = os.path.join(dest_dir, os.path.basename(src))
+    try:
+        os.replace(src, dst)
+        method = "move"
+        sha256 = sha256_of_file(dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        method = "copy"
+        sha256 = _copy_with_checksum(src, dst)
+    return {
+        "name": os.path.basename(dst),
+        "size_bytes": os.path.getsize(dst),
+        "sha256": sha256,
+        "method": method,
+    }
+
+
+def update_checksums_file(dest_dir, entries):
+    """
+    Adds `entries` to dest_dir/SHA256SUMS (sha256sum -c format), replacing the
+    lines of older files with the same name. Concurrent builds share the
+    directory, so the update is done under its lock.
+    """
+    checksums_path = os.path.join(dest_dir, CHECKSUMS_FILE)
+    with cache_lock(dest_dir):
+        checksums = {}
+        if os.path.exists(checksums_path):
+            with open(checksums_path, encoding='utf-8') as f:
+                for line in f:
+                    sha256, _, name = line.strip().partition("  ")
+                    if name:
+                        checksums[name] = sha256
+        checksums.update((entry["name"], entry["sha256"]) for entry in entries)
+        with open(checksums_path + ".tmp", "w", encoding='utf-8') as f:
+            for name in sorted(checksums):
+                f.write(f"{checksums[name]}  {name}\n")
+        os.replace(checksums_path + ".tmp", checksums_path)
+    return checksums_path
+
+
+def write_manifest(path, entries, **info):
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(dict(info, created_at=datetime.datetime.now().isoformat(timespec="seconds"), artifacts=entries), f, indent=2)
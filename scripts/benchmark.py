@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the build tooling itself, in two tiers:
+
+synthetic
+    kernel_builder.py runs end to end against a generated source tarball,
+    served by a local mirror, with stand-ins for make, rpmbuild, rpmsign,
+    strip and depmod (benchmark_tools.py). No container, no compiler; a run
+    takes seconds. Each scenario stresses one part of the tooling: stage
+    orchestration, logging, extraction and copying. Memory is the peak RSS
+    of the largest process of the run, normally kernel_builder.py.
+
+real
+    local_kernel_build.py builds kernel-config/tiny-config/tiny.config in
+    the builder container with a fixed number of make jobs.
+
+Every scenario runs --repeat times; the medians are compared with the
+baseline of the tier (log/benchmarks/baseline-<tier>.json), which
+--save-baseline records together with what it was measured on (CPU, make
+jobs, commit, tool versions, config fingerprint, builder image).
+"""
+import argparse
+import contextlib
+import datetime
+import functools
+import glob
+import hashlib
+import http.server
+import io
+import json
+import os
+import platform
+import random
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.benchmark_tools import TOOLS, filler
+from scripts.build_history import MIN_STAGE_DURATION_DELTA
+from scripts.builder_image import DEFAULT_IMAGE
+from scripts.kconfig import KernelConfig
+from scripts.kernel_sources import (KERNEL_ORG_MIRROR, KernelSourceFetcher, TarballCache,
+                                    kernel_release_dir_url, print_log, sha256_of_file)
+
+DEFAULT_WORK_DIR = os.path.join(repo_root, "build-cache", "benchmark")
+DEFAULT_RESULTS_DIR = os.path.join(repo_root, "log", "benchmarks")
+DEFAULT_CONFIG = "kernel-config/tiny-config/tiny.config"
+TOOLS_SCRIPT = os.path.join(repo_root, "scripts", "benchmark_tools.py")
+
+# Synthetic scenarios: (description, settings, metrics compared with the
+# baseline). The settings size the source tree and become the BENCH_*
+# variables of the stand-ins; --scale multiplies the counts.
+SCENARIOS = {
+    "overhead": (
+        "stand-ins do next to nothing, the wall time is orchestration",
+        {"source_files": 200, "source_file_bytes": 2048, "modules": 20, "module_bytes": 16384,
+         "kernel_bytes": 1 << 20, "make_lines": 0, "rpmbuild_lines": 0},
+        ["wall_seconds", "orchestration_seconds", "peak_rss_bytes"],
+    ),
+    "logging": (
+        "make and rpmbuild -vv print as much as a full kernel build",
+        {"source_files": 200, "source_file_bytes": 2048, "modules": 20, "module_bytes": 16384,
+         "kernel_bytes": 1 << 20, "make_lines": 200000, "rpmbuild_lines": 50000},
+        ["log_lines_per_second", "peak_rss_bytes"],
+    ),
+    "io": (
+        "source tree, modules and packages of some size: extraction and copying",
+        {"source_files": 10000, "source_file_bytes": 8192, "modules": 500, "module_bytes": 65536,
+         "kernel_bytes": 16 << 20, "make_lines": 0, "rpmbuild_lines": 0},
+        ["extract_mib_per_second", "module_mib_per_second", "artifacts_mib_per_second", "peak_rss_bytes"],
+    ),
+}
+SCALED_SETTINGS = ("source_files", "modules", "make_lines", "rpmbuild_lines")
+
+# Compared with the baseline: (description, whether growth is a regression,
+# minimum absolute change that counts)
+SYNTHETIC_METRICS = {
+    "wall_seconds": ("wall time", True, 0.2),
+    "orchestration_seconds": ("orchestration overhead", True, 0.2),
+    "log_lines_per_second": ("logging throughput", False, 0),
+    "extract_mib_per_second": ("extraction throughput", False, 0),
+    "module_mib_per_second": ("module post-processing throughput", False, 0),
+    "artifacts_mib_per_second": ("artifact publishing throughput", False, 0),
+    "peak_rss_bytes": ("peak RSS", True, 8 * 2**20),
+}
+MIN_SYNTHETIC_STAGE_DELTA = 0.2
+REAL_METRICS = {
+    "wall_seconds": ("total build duration", True, 10.0),
+    "rpm_bytes": ("total RPM size", True, 0),
+    "container_memory_peak_bytes": ("container peak memory", True, 64 * 2**20),
+}
+# A baseline recorded with different values is not comparable
+ENVIRONMENT_KEYS = ("cpu_model", "cpu_count", "make_jobs", "kernel_version", "config_fingerprint", "image_id", "builder_args")
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_directory(directory):
+    """Serves `directory` over HTTP on a free local port and yields its URL."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _source_file(number, size):
+    # A quarter of random hex keeps the tarball from compressing far better than real sources
+    noise = random.Random(number).randbytes(size // 8).hex().encode("ascii")
+    return noise + filler(size - len(noise), salt=number)
+
+
+def make_source_tarball(mirror_dir, kernel_version, settings, symbols):
+    """
+    Writes a synthetic linux-<version>.tar.xz below `mirror_dir`, laid out
+    like kernel.org (v<major>.x/ with sha256sums.asc), and returns the
+    uncompressed size of its tree. The tree has a top-level Makefile with
+    the version, Kconfig files declaring `symbols` and the source files. The
+    tarball is kept and only generated again when the settings or the
+    symbols change.
+    """
+    release_dir = kernel_release_dir_url(kernel_version, mirror_dir)
+    tarball_name = f"linux-{kernel_version}.tar.xz"
+    tree_path = os.path.join(release_dir, "tree.json")
+    tree = {key: settings[key] for key in ("source_files", "source_file_bytes")}
+    # The Kconfig files come from the benchmarked configuration
+    tree["symbols_sha256"] = hashlib.sha256("\n".join(symbols).encode("utf-8")).hexdigest()
+    if os.path.exists(tree_path) and os.path.exists(os.path.join(release_dir, tarball_name)):
+        with open(tree_path, encoding='utf-8') as f:
+            existing = json.load(f)
+        if existing["settings"] == tree:
+            return existing["bytes"]
+
+    os.makedirs(release_dir, exist_ok=True)
+    tmp_path = os.path.join(release_dir, tarball_name + ".tmp")
+    total = 0
+    with tarfile.open(tmp_path, "w:xz", preset=1) as tar:
+        def add(name, data):
+            nonlocal total
+            # Fixed metadata, the same settings give the same tarball
+            info = tarfile.TarInfo(f"linux-{kernel_version}/{name}")
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+            total += len(data)
+
+        version, patchlevel, sublevel = (kernel_version.split("-")[0].split(".") + ["0", "0"])[:3]
+        add("Makefile", f"VERSION = {version}\nPATCHLEVEL = {patchlevel}\nSUBLEVEL = {sublevel}\nEXTRAVERSION =\n".encode("utf-8"))
+        for first in range(0, len(symbols), 200):
+            entries = "".join(f"config {symbol}\n\ttristate \"{symbol}\"\n\n" for symbol in symbols[first:first + 200])
+            add(f"drivers/kconfig{first // 200}/Kconfig", entries.encode("utf-8"))
+        for number in range(settings["source_files"]):
+            add(f"drivers/bench{number // 50}/file{number}.c", _source_file(number, settings["source_file_bytes"]))
+    sha256 = sha256_of_file(tmp_path)
+    os.replace(tmp_path, os.path.join(release_dir, tarball_name))
+    with open(os.path.join(release_dir, "sha256sums.asc"), "w", encoding='utf-8') as f:
+        f.write(f"-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA256\n\n{sha256}  {tarball_name}\n")
+    with open(tree_path, "w", encoding='utf-8') as f:
+        json.dump({"settings": tree, "bytes": total}, f)
+    return total
+
+
+def install_tools(bin_dir):
+    """Puts a wrapper for every stand-in into `bin_dir`, to go first on PATH."""
+    os.makedirs(bin_dir, exist_ok=True)
+    for tool in TOOLS:
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w", encoding='utf-8') as f:
+            # -S: no site packages, the stand-ins only need the standard library and start faster
+            f.write(f"#!/bin/sh\nexec {shlex.quote(sys.executable)} -S {shlex.quote(TOOLS_SCRIPT)} {tool} \"$@\"\n")
+        os.chmod(path, 0o755)
+
+
+def busy_seconds(intervals):
+    """Length of the union of (start, end) intervals; overlapping calls count once."""
+    total = 0.0
+    current = None
+    for start, end in sorted(intervals):
+        if current and start <= current[1]:
+            current[1] = max(current[1], end)
+            continue
+        if current:
+            total += current[1] - current[0]
+        current = [start, end]
+    if current:
+        total += current[1] - current[0]
+    return total
+
+
+def _rate(amount, seconds):
+    return round(amount / seconds, 1) if seconds else None
+
+
+def run_synthetic_build(workspace, bin_dir, config_path, settings, source_bytes, mirror_url, args, builder_args):
+    """
+    Runs kernel_builder.py once in a fresh `workspace` (its repository root,
+    rpmbuild root and log directory) and returns the measurements of the run.
+    """
+    shutil.rmtree(workspace, ignore_errors=True)
+    log_dir = os.path.join(workspace, "log")
+    os.makedirs(log_dir)
+    config_name = os.path.join("kernel-config", os.path.basename(config_path))
+    os.makedirs(os.path.join(workspace, "kernel-config"))
+    shutil.copy(config_path, os.path.join(workspace, config_name))
+
+    tool_log = os.path.join(log_dir, "tools.jsonl")
+    env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""), BENCH_TOOL_LOG=tool_log)
+    env.update({f"BENCH_{key.upper()}": str(value) for key, value in settings.items()})
+    command = [
+        sys.executable, os.path.join(repo_root, "scripts", "kernel_builder.py"), config_name, "bench",
+        "--repo-root", workspace,
+        "--rpmbuild-root", os.path.join(workspace, "rpmbuild"),
+        "--log-dir", log_dir,
+        "--make-jobs", str(args.make_jobs),
+        "--kernel-version", args.kernel_version,
+        "--kernel-mirror", mirror_url,
+    ] + builder_args
+    console_path = os.path.join(log_dir, "console.log")
+    start = time.monotonic()
+    with open(console_path, "w", encoding='utf-8') as console:
+        process = subprocess.Popen(command, stdout=console, stderr=subprocess.STDOUT, env=env)
+        # wait4() also returns the resource usage of the finished process tree
+        _, status, usage = os.wait4(process.pid, 0)
+    wall = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"kernel_builder.py failed with exit code {process.returncode}, see {console_path}.")
+
+    with open(os.path.join(log_dir, "build-metrics.json"), encoding='utf-8') as f:
+        metrics = json.load(f)
+    with open(tool_log, encoding='utf-8') as f:
+        tool_calls = [json.loads(line) for line in f]
+    stages = {stage["name"]: stage["duration_seconds"] for stage in metrics["stages"]}
+    tool_seconds = busy_seconds([(call["start"], call["end"]) for call in tool_calls])
+    log_lines = sum(call["lines"] for call in tool_calls if call["tool"] in ("make", "rpmbuild"))
+    rpm_bytes = sum(entry["size_bytes"] for entry in metrics.get("artifacts", []))
+    modules = metrics.get("modules", {})
+    run = {
+        "wall_seconds": round(wall, 3),
+        "tool_seconds": round(tool_seconds, 3),
+        # Everything that is not a stand-in at work: kernel_builder.py, module_postprocess.py, the scriptlet shells
+        "orchestration_seconds": round(max(0.0, wall - tool_seconds), 3),
+        "log_lines": log_lines,
+        "log_bytes": sum(os.path.getsize(path) for path in glob.glob(os.path.join(log_dir, "*.log")) if path != console_path),
+        # Most lines go through the rpmbuild stage, the stand-ins write them as fast as they are read
+        "log_lines_per_second": _rate(log_lines, stages.get("rpmbuild")) if log_lines else None,
+        "source_bytes": source_bytes,
+        "extract_mib_per_second": _rate(source_bytes / 2**20, stages.get("extract")),
+        "module_mib_per_second": _rate(modules.get("bytes", 0) / 2**20, modules.get("process_seconds")),
+        "rpm_bytes": rpm_bytes,
+        "artifacts_mib_per_second": _rate(rpm_bytes / 2**20, stages.get("artifacts")),
+        "peak_rss_bytes": usage.ru_maxrss * 1024,
+        "stages": stages,
+    }
+    if not args.keep:
+        shutil.rmtree(workspace)
+    return run
+
+
+def summarize(runs):
+    """Median, minimum and maximum of every numeric measurement and stage duration over the runs."""
+    def stats(values):
+        return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+    summary = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if isinstance(run.get(key), (int, float))]
+        if values:
+            summary[key] = stats(values)
+    summary["stages"] = {}
+    for name in runs[0]["stages"]:
+        summary["stages"][name] = stats([run["stages"][name] for run in runs if name in run["stages"]])
+    return summary
+
+
+def _first_line(command):
+    try:
+        process = subprocess.run(command, capture_output=True, text=True)
+    except OSError:
+        return None
+    lines = (process.stdout or process.stderr).splitlines()
+    return lines[0].strip() if lines else None
+
+
+def environment():
+    """What a result was measured on, recorded so baselines can be reproduced."""
+    cpu_model = None
+    with open("/proc/cpuinfo", encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("model name"):
+                cpu_model = line.split(":", 1)[1].strip()
+                break
+    total_ram_bytes = None
+    with open("/proc/meminfo", encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("MemTotal:"):
+                total_ram_bytes = int(line.split()[1]) * 1024
+                break
+    return {
+        "cpu_model": cpu_model,
+        "cpu_count": os.cpu_count(),
+        "total_ram_bytes": total_ram_bytes,
+        "kernel": platform.release(),
+        "python": platform.python_version(),
+        "git_commit": _first_line(["git", "-C", repo_root, "rev-parse", "HEAD"]),
+        "scripts_modified": bool(_first_line(["git", "-C", repo_root, "status", "--porcelain", "--", "scripts"])),
+        "tools": {tool: _first_line([tool, "--version"]) for tool in ("tar", "xz", "zstd", "pixz")},
+    }
+
+
+def run_synthetic_tier(args, builder_args):
+    config_path = os.path.join(repo_root, args.config)
+    kernel_config = KernelConfig.from_file(config_path)
+    bin_dir = os.path.join(args.work_dir, "bin")
+    install_tools(bin_dir)
+    if not shutil.which("zstd") and "--module-compression" not in builder_args:
+        # Modules are only compressed in the format the config's kernel can decompress
+        builder_args = builder_args + ["--module-compression", "xz" if kernel_config.enabled("MODULE_COMPRESS_XZ") else "none"]
+
+    scenarios = {}
+    for name in args.scenario:
+        description, settings, compared = SCENARIOS[name]
+        settings = {key: int(value * args.scale) if key in SCALED_SETTINGS else value for key, value in settings.items()}
+        mirror_dir = os.path.join(args.work_dir, "mirror", name)
+        print_log(f"Scenario '{name}': {description}.")
+        source_bytes = make_source_tarball(mirror_dir, args.kernel_version, settings, sorted(kernel_config.symbols))
+        runs = []
+        with serve_directory(mirror_dir) as mirror_url:
+            for index in range(args.repeat):
+                run = run_synthetic_build(os.path.join(args.work_dir, "runs", f"{name}-{index + 1}"), bin_dir, config_path,
+                                          settings, source_bytes, mirror_url, args, builder_args)
+                print_log(f"Run {index + 1}/{args.repeat}: {run['wall_seconds']:.2f} s wall time, "
+                          f"{run['orchestration_seconds']:.2f} s orchestration, peak RSS {run['peak_rss_bytes'] / 2**20:.0f} MiB")
+                runs.append(run)
+        scenarios[name] = {"description": description, "settings": settings, "compared": compared,
+                           "runs": runs, "summary": summarize(runs)}
+
+    env = environment()
+    env.update(make_jobs=args.make_jobs, kernel_version=args.kernel_version,
+               config_fingerprint=kernel_config.fingerprint(), builder_args=builder_args)
+    return {"tier": "synthetic", "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "repeat": args.repeat, "environment": env, "scenarios": scenarios}
+
+
+def run_real_tier(args, builder_args):
+    kernel_config = KernelConfig.from_file(os.path.join(repo_root, args.config))
+    # The download is not what is measured, fetch the tarball before the first run
+    mirror = args.kernel_mirror or KERNEL_ORG_MIRROR
+    KernelSourceFetcher(TarballCache(os.path.join(repo_root, "kernel-sources")), mirror=mirror).fetch(args.kernel_version)
+    os.makedirs(args.work_dir, exist_ok=True)
+    # Benchmark builds stay out of the regular build history and its regression checks
+    history_db = os.path.join(args.work_dir, "real-history.sqlite3")
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    runs = []
+    for index in range(args.repeat):
+        build_id = f"benchmark-{timestamp}-{index + 1}"
+        command = [
+            sys.executable, os.path.join(repo_root, "scripts", "local_kernel_build.py"), args.config, "benchmark",
+            "--build-id", build_id,
+            "--make-jobs", str(args.make_jobs),
+            "--kernel-version", args.kernel_version,
+            "--history-db", history_db,
+        ] + (["--kernel-mirror", args.kernel_mirror] if args.kernel_mirror else []) + builder_args
+        console_path = os.path.join(args.work_dir, f"{build_id}.console.log")
+        print_log(f"Run {index + 1}/{args.repeat}: building {args.config} as {build_id} (output in {console_path})...")
+        with open(console_path, "w", encoding='utf-8') as console:
+            returncode = subprocess.run(command, stdout=console, stderr=subprocess.STDOUT).returncode
+        report_path = os.path.join(repo_root, "log", build_id, "report-summary.json")
+        if returncode != 0 or not os.path.exists(report_path):
+            raise RuntimeError(f"local_kernel_build.py failed with exit code {returncode}, see {console_path}.")
+        with open(report_path, encoding='utf-8') as f:
+            report = json.load(f)
+        if report["build"].get("status") != "success":
+            raise RuntimeError(f"Build {build_id} did not succeed, see {os.path.dirname(report_path)}.")
+
+        stages = dict(report["host_stages"])
+        stages.update({stage["name"]: stage["duration_seconds"] for stage in report["build"].get("stages", [])})
+        container_stats = report.get("container_stats") or {}
+        run = {
+            "build_id": build_id,
+            "wall_seconds": report["total_duration_seconds"],
+            "rpm_bytes": sum(artifact["size_bytes"] for artifact in report["build"].get("artifacts", [])),
+            "container_memory_peak_bytes": container_stats.get("memory_peak_bytes"),
+            "stages": stages,
+        }
+        print_log(f"Run {index + 1}/{args.repeat}: {run['wall_seconds']:.2f} s")
+        runs.append(run)
+
+    name = os.path.basename(args.config)
+    if name.endswith(".config"):
+        name = name[:-len(".config")]
+    env = environment()
+    image_id = _first_line(["docker", "image", "inspect", "--format", "{{.Id}}", DEFAULT_IMAGE])
+    env.update(make_jobs=args.make_jobs, kernel_version=args.kernel_version, config_fingerprint=kernel_config.fingerprint(),
+               image_id=image_id if image_id and image_id.startswith("sha256:") else None, builder_args=builder_args)
+    compared = [key for key in REAL_METRICS if any(run[key] is not None for run in runs)]
+    return {"tier": "real", "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "repeat": args.repeat, "environment": env,
+            "scenarios": {name: {"description": f"local_kernel_build.py {args.config}", "settings": {"config": args.config},
+                                 "compared": compared, "runs": runs, "summary": summarize(runs)}}}
+
+
+def _compare(description, value, baseline, threshold, min_delta, growth_is_worse=True):
+    if not baseline:
+        return []
+    change = value / baseline - 1
+    if growth_is_worse and change > threshold and value - baseline >= min_delta:
+        return [f"{description} regressed: {value:.2f} vs. baseline {baseline:.2f} (+{100.0 * change:.0f}%)"]
+    if not growth_is_worse and change < -threshold and baseline - value >= min_delta:
+        return [f"{description} regressed: {value:.2f} vs. baseline {baseline:.2f} ({100.0 * change:.0f}%)"]
+    return []
+
+
+def compare(result, baseline, threshold=0.2):
+    """
+    Compares the medians of `result` with those of `baseline` and returns a
+    message for every compared metric or stage that got worse by more than
+    `threshold` (0.2 = 20%).
+    """
+    real = result["tier"] == "real"
+    metrics = REAL_METRICS if real else SYNTHETIC_METRICS
+    min_stage_delta = MIN_STAGE_DURATION_DELTA if real else MIN_SYNTHETIC_STAGE_DELTA
+    regressions = []
+    notes = []
+    for name, scenario in result["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if not previous:
+            continue
+        if scenario["settings"] != previous["settings"]:
+            notes.append(f"Note: scenario '{name}' ran with different settings than the baseline.")
+        summary, previous_summary = scenario["summary"], previous["summary"]
+        for key in scenario["compared"]:
+            description, growth_is_worse, min_delta = metrics[key]
+            if key in summary and key in previous_summary:
+                regressions += _compare(f"{name}: {description}", summary[key]["median"], previous_summary[key]["median"],
+                                        threshold, min_delta, growth_is_worse)
+        for stage, stats in summary["stages"].items():
+            if stage in previous_summary["stages"]:
+                regressions += _compare(f"{name}: '{stage}' stage", stats["median"], previous_summary["stages"][stage]["median"],
+                                        threshold, min_stage_delta)
+    changed = [key for key in ENVIRONMENT_KEYS if result["environment"].get(key) != baseline["environment"].get(key)]
+    if changed:
+        notes.append(f"Note: {', '.join(changed)} changed since the baseline was recorded.")
+    return regressions + notes if regressions else []
+
+
+def _format_value(key, value):
+    if key.endswith("_bytes"):
+        return f"{value / 2**20:.1f} MiB"
+    if key.endswith("_seconds"):
+        return f"{value:.3f} s"
+    return f"{value:,.1f}" if isinstance(value, float) else f"{value:,}"
+
+
+def format_result(result):
+    lines = []
+    for name, scenario in result["scenarios"].items():
+        lines.append(f"{name} ({len(scenario['runs'])} runs, {scenario['description']}):")
+        for key, stats in scenario["summary"].items():
+            if key != "stages":
+                lines.append(f"  {key:<28} {_format_value(key, stats['median']):>16}  "
+                             f"(min {_format_value(key, stats['min'])}, max {_format_value(key, stats['max'])})")
+        lines.append("  Stage durations (median):")
+        for stage, stats in scenario["summary"]["stages"].items():
+            lines.append(f"    {stage:<26} {stats['median']:10.3f} s")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the build tooling: synthetic builds with stand-in tools, or real builds of a small configuration.")
+    subparsers = parser.add_subparsers(dest="tier", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the medians are reported. Default is 3.")
+    common.add_argument("--config", default=DEFAULT_CONFIG, help=f"Kernel configuration, relative to the repository. Default is {DEFAULT_CONFIG}.")
+    common.add_argument("--kernel-version", default="6.16.8", help="Kernel version. Default is \"6.16.8\".")
+    common.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help=f"Directory for stand-ins, mirror and workspaces. Default is {DEFAULT_WORK_DIR}.")
+    common.add_argument("--output", default=None, help="Result file. Default is log/benchmarks/<tier>-<timestamp>.json.")
+    common.add_argument("--baseline", default=None, help="Baseline to compare with. Default is log/benchmarks/baseline-<tier>.json.")
+    common.add_argument("--save-baseline", action="store_true", help="Record this result as the baseline instead of comparing with it.")
+    common.add_argument("--threshold", type=float, default=0.2, help="Change that counts as a regression. Default is 0.2 (20%%).")
+
+    synthetic_parser = subparsers.add_parser("synthetic", parents=[common], help="kernel_builder.py with stand-in tools against a generated source tarball.")
+    synthetic_parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="Scenarios to run. Default is all.")
+    synthetic_parser.add_argument("--scale", type=float, default=1.0, help="Multiplies the file, module and output line counts of the scenarios.")
+    synthetic_parser.add_argument("--make-jobs", type=int, default=4, help="make jobs (and module and packaging threads). Default is 4.")
+    synthetic_parser.add_argument("--keep", action="store_true", help="Keep the workspace of every run.")
+    real_parser = subparsers.add_parser("real", parents=[common], help="local_kernel_build.py builds in the builder container.")
+    real_parser.add_argument("--make-jobs", type=int, default=os.cpu_count(), help="make jobs, fixed so runs are comparable. Default is the number of CPUs.")
+    real_parser.add_argument("--kernel-mirror", default=None, help="Base URL of a kernel.org mirror.")
+
+    # Any other option is passed to every kernel_builder.py (synthetic) or local_kernel_build.py (real) run
+    args, builder_args = parser.parse_known_args()
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"{args.tier}-{timestamp}.json")
+    baseline_path = args.baseline or os.path.join(DEFAULT_RESULTS_DIR, f"baseline-{args.tier}.json")
+
+    try:
+        result = run_synthetic_tier(args, builder_args) if args.tier == "synthetic" else run_real_tier(args, builder_args)
+    except (RuntimeError, OSError, subprocess.CalledProcessError) as e:
+        print(f">>> ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    for line in format_result(result):
+        print(line)
+    print(f"Results written to {output_path}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        shutil.copy(output_path, baseline_path)
+        print(f"Baseline saved to {baseline_path}")
+        return
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, record one with --save-baseline.")
+        return
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(result, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if not regressions:
+        print(f"No regressions against {baseline_path}.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
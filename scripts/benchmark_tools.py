@@ -0,0 +1,197 @@
+"""
+Stand-ins for make, rpmbuild, rpmsign, strip and depmod used by
+benchmark.py. They do just enough for kernel_builder.py to run end to end
+(a kernel image, modules, packages) in a fraction of a second, so what a
+benchmark measures is the tooling around them. benchmark.py puts small
+wrappers named after the tools on PATH that call this script:
+
+    benchmark_tools.py make -j4 LOCALVERSION=-bench
+
+The work they do is set through BENCH_* environment variables (see
+benchmark.py). Every call appends the interval it spent working to
+$BENCH_TOOL_LOG (JSONL); rpmbuild leaves out the %build and %install
+scriptlets it runs, those belong to the build and to module_postprocess.py.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tarfile
+import time
+
+# Compressible filler, roughly like object code and C sources
+FILLER = b"".join(b"%08x mov rax, [rbp-%d]; call bench_fn_%d\n" % (i * 2654435761 % 2**32, i % 97, i % 13) for i in range(4096))
+
+
+def _setting(name, default=0):
+    return int(os.environ.get(f"BENCH_{name}", default))
+
+
+def _record(tool, start, lines=0):
+    log_path = os.environ.get("BENCH_TOOL_LOG")
+    if not log_path:
+        return
+    with open(log_path, "a", encoding='utf-8') as f:
+        f.write(json.dumps({"tool": tool, "start": start, "end": time.time(), "lines": lines}) + "\n")
+
+
+def filler(size, salt=0):
+    """`size` bytes of FILLER, starting at an offset that depends on `salt`."""
+    offset = salt * 4099 % len(FILLER)
+    data = FILLER[offset:] + FILLER[:offset]
+    return (data * (size // len(data) + 1))[:size]
+
+
+def _write_filler(path, size, salt=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(filler(size, salt))
+
+
+def _emit_lines(count, template):
+    # Written in batches, the reader (run_streaming) sees them as fast as it can take them
+    for first in range(0, count, 1000):
+        sys.stdout.write("".join(template % n for n in range(first, min(first + 1000, count))))
+    sys.stdout.flush()
+    return count
+
+
+def _kernel_version(source_dir):
+    with open(os.path.join(source_dir, "Makefile"), encoding='utf-8') as f:
+        fields = dict(re.findall(r"^(VERSION|PATCHLEVEL|SUBLEVEL|EXTRAVERSION)\s*=\s*(\S*)", f.read(), re.MULTILINE))
+    return f"{fields['VERSION']}.{fields['PATCHLEVEL']}.{fields['SUBLEVEL']}{fields.get('EXTRAVERSION', '')}"
+
+
+def fake_make(args):
+    variables = dict(arg.split("=", 1) for arg in args if "=" in arg and not arg.startswith("-"))
+    targets = [arg for arg in args if "=" not in arg and not arg.startswith("-")]
+    object_dir = variables.get("O", os.getcwd())
+    lines = 0
+    if "kernelrelease" in targets:
+        print(_kernel_version(os.getcwd()) + variables.get("LOCALVERSION", ""))
+    elif "olddefconfig" in targets:
+        # The configuration is taken as it is, nothing is dropped
+        print("#\n# configuration written to .config\n#")
+    elif "modules_install" in targets:
+        module_dir = os.path.join(variables["INSTALL_MOD_PATH"], "lib", "modules", variables["KERNELRELEASE"])
+        modules = _setting("MODULES", 20)
+        for n in range(modules):
+            path = os.path.join(module_dir, "kernel", "drivers", f"bench{n // 50}", f"bench_{n}.ko")
+            _write_filler(path, _setting("MODULE_BYTES", 16384), salt=n)
+            print(f"  INSTALL {path}")
+        os.symlink(os.getcwd(), os.path.join(module_dir, "build"))
+        lines = modules
+    elif not targets:
+        _write_filler(os.path.join(object_dir, "arch", "x86", "boot", "bzImage"), _setting("KERNEL_BYTES", 1 << 20))
+        with open(os.path.join(object_dir, "System.map"), "w", encoding='utf-8') as f:
+            f.writelines(f"ffffffff81{n:06x} T bench_fn_{n}\n" for n in range(1000))
+        lines = _emit_lines(_setting("MAKE_LINES"), "  CC      drivers/bench/file%d.o\n")
+    return lines
+
+
+def _spec_sections(spec):
+    macros = dict(re.findall(r"^%global\s+(\S+)\s+(.*)$", spec, re.MULTILINE))
+    macros["version"] = re.search(r"^Version:\s*(\S+)", spec, re.MULTILINE).group(1)
+    macros["release"] = re.search(r"^Release:\s*(\S+)", spec, re.MULTILINE).group(1)
+    sections = {}
+    current = None
+    for line in spec.splitlines():
+        match = re.match(r"^%(prep|build|install|files|changelog|package|description)\b", line)
+        if match:
+            current = match.group(1)
+            sections.setdefault(current, [])
+        elif current in ("build", "install"):
+            sections[current].append(line)
+    return macros, {name: "\n".join(body) for name, body in sections.items()}
+
+
+def _expand(text, macros):
+    return re.sub(r"%\{(\w+)\}", lambda match: macros.get(match.group(1), match.group(0)), text)
+
+
+def fake_rpmbuild(args):
+    start = time.time()
+    topdir = next(arg.split(None, 1)[1] for arg in args if arg.startswith("_topdir "))
+    with open(args[-1], encoding='utf-8') as f:
+        macros, sections = _spec_sections(f.read())
+    nvr = f"{macros['version']}-{macros['release']}"
+    buildroot = os.path.join(topdir, "BUILDROOT", f"kernel-{nvr}.x86_64")
+    macros["buildroot"] = buildroot
+    lines = _emit_lines(_setting("RPMBUILD_LINES"), "D: bench: read header %d\n")
+    _record("rpmbuild", start, lines)
+
+    for section in ("build", "install"):
+        print(f"Executing(%{section}): /bin/sh -e /var/tmp/rpm-tmp.bench", flush=True)
+        process = subprocess.run(["/bin/sh", "-e", "-c", _expand(sections.get(section, ""), macros)])
+        if process.returncode != 0:
+            print(f"error: Bad exit status from /var/tmp/rpm-tmp.bench (%{section})", file=sys.stderr)
+            sys.exit(1)
+
+    start = time.time()
+    module_dir = os.path.join("lib", "modules", macros["final_krelease"])
+    packages = {
+        "kernel": ["boot"],
+        "kernel-modules": [os.path.join(module_dir, name) for name in os.listdir(os.path.join(buildroot, module_dir)) if name != "build"],
+        "kernel-devel": [os.path.join(module_dir, "build")],
+    }
+    rpms_dir = os.path.join(topdir, "RPMS", "x86_64")
+    os.makedirs(rpms_dir, exist_ok=True)
+    for name, paths in packages.items():
+        rpm_path = os.path.join(rpms_dir, f"{name}-{nvr}.x86_64.rpm")
+        with tarfile.open(rpm_path, "w") as payload:
+            for path in paths:
+                payload.add(os.path.join(buildroot, path), arcname=path)
+        print(f"Wrote: {rpm_path}")
+    _record("rpmbuild", start, len(packages))
+    return None
+
+
+def fake_rpmsign(args):
+    rpm_files = [arg for arg in args if arg.endswith(".rpm")]
+    for rpm_file in rpm_files:
+        with open(rpm_file, "ab") as f:
+            f.write(b"\0" * 1024)
+        print(f"{rpm_file}:")
+    return len(rpm_files)
+
+
+def fake_strip(args):
+    # Drops the second half, about what --strip-debug does to a module
+    path = args[-1]
+    os.truncate(path, os.path.getsize(path) // 2)
+    return 0
+
+
+def fake_depmod(args):
+    buildroot = args[args.index("-b") + 1]
+    module_dir = os.path.join(buildroot, "lib", "modules", args[-1])
+    modules = []
+    for dirpath, dirnames, filenames in os.walk(module_dir):
+        dirnames[:] = [name for name in dirnames if name != "build"]
+        modules += [os.path.relpath(os.path.join(dirpath, name), module_dir) for name in filenames if ".ko" in name]
+    with open(os.path.join(module_dir, "modules.dep"), "w", encoding='utf-8') as f:
+        f.writelines(f"{module}:\n" for module in sorted(modules))
+    return 0
+
+
+TOOLS = {
+    "make": fake_make,
+    "rpmbuild": fake_rpmbuild,
+    "rpmsign": fake_rpmsign,
+    "strip": fake_strip,
+    "depmod": fake_depmod,
+}
+
+
+def main():
+    tool, args = sys.argv[1], sys.argv[2:]
+    start = time.time()
+    lines = TOOLS[tool](args)
+    # rpmbuild records its own intervals around the scriptlets
+    if lines is not None:
+        _record(tool, start, lines)
+
+
+if __name__ == "__main__":
+    main()
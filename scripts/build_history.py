@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import statistics
+import sys
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+DEFAULT_DB_PATH = os.path.join(repo_root, "log", "build-history.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    build_id TEXT UNIQUE NOT NULL,
+    timestamp TEXT NOT NULL,
+    kernel_version TEXT,
+    kernel_config TEXT,
+    config_hash TEXT,
+    custom_suffix TEXT,
+    make_jobs TEXT,
+    cpu_model TEXT,
+    total_ram TEXT,
+    status TEXT,
+    duration_seconds REAL,
+    rpm_total_bytes INTEGER,
+    incremental INTEGER,
+    compiler_cache TEXT,
+    source_cache TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    duration_seconds REAL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    size_bytes INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_by_config ON runs (kernel_config, kernel_version, timestamp);
+"""
+
+# Columns added after the first release, added to older databases on open.
+# They describe how warm a build starts, so only runs alike are compared.
+BUILD_MODE_COLUMNS = {
+    "incremental": "INTEGER",
+    "compiler_cache": "TEXT",
+    "source_cache": "TEXT",
+}
+
+# Metrics compared against earlier runs by check_regressions(), with the
+# minimum absolute growth that counts (keeps short builds from flapping)
+REGRESSION_METRICS = {
+    "duration_seconds": ("total build duration", 10.0),
+    "rpm_total_bytes": ("total RPM size", 0),
+}
+MIN_STAGE_DURATION_DELTA = 10.0
+
+
+class BuildHistory:
+    """
+    Local SQLite store of finished builds, fed with the report-summary.json of
+    every local_kernel_build.py run.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(runs)")}
+        with self.connection:
+            for column, column_type in BUILD_MODE_COLUMNS.items():
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE runs ADD COLUMN {column} {column_type}")
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, report):
+        build = report.get("build", {})
+        artifacts = build.get("artifacts", [])
+        # Reports written before these were recorded only have them in the build metrics
+        incremental = report.get("incremental", build.get("incremental"))
+        compiler_cache = report.get("compiler_cache") or build.get("compiler_cache_tool") or (build.get("compiler_cache") or {}).get("tool")
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE build_id = ?", (report["build_id"],))
+            cursor = self.connection.execute(
+                "INSERT INTO runs (build_id, timestamp, kernel_version, kernel_config, config_hash, custom_suffix,"
+                " make_jobs, cpu_model, total_ram, status, duration_seconds, rpm_total_bytes,"
+                " incremental, compiler_cache, source_cache)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    report["build_id"], report["timestamp"], report.get("kernel_version"), report.get("kernel_config"),
+                    report.get("config_hash"), report.get("custom_suffix"), str(report.get("make_jobs")),
+                    report.get("cpu_model"), report.get("total_ram"), build.get("status", "unknown"),
+                    report.get("total_duration_seconds"),
+                    sum(artifact["size_bytes"] for artifact in artifacts) if artifacts else None,
+                    None if incremental is None else int(bool(incremental)),
+                    compiler_cache,
+                    report.get("source_cache", build.get("source_cache")),
+                )
+            )
+            run_id = cursor.lastrowid
+            stages = [(run_id, name, duration) for name, duration in report.get("host_stages", {}).items()]
+            stages += [(run_id, stage["name"], stage["duration_seconds"]) for stage in build.get("stages", [])]
+            self.connection.executemany("INSERT INTO stages (run_id, name, duration_seconds) VALUES (?, ?, ?)", stages)
+            self.connection.executemany(
+                "INSERT INTO artifacts (run_id, name, size_bytes) VALUES (?, ?, ?)",
+                [(run_id, artifact["name"], artifact["size_bytes"]) for artifact in artifacts]
+            )
+        return run_id
+
+    def runs(self, kernel_config=None, limit=20):
+        query = "SELECT * FROM runs"
+        params = []
+        if kernel_config:
+            query += " WHERE kernel_config LIKE ?"
+            params.append(f"%{kernel_config}%")
+        query += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+        return self.connection.execute(query, params).fetchall()
+
+    def get_run(self, build_id=None):
+        if build_id:
+            return self.connection.execute("SELECT * FROM runs WHERE build_id = ?", (build_id,)).fetchone()
+        return self.connection.execute("SELECT * FROM runs ORDER BY timestamp DESC LIMIT 1").fetchone()
+
+    def _stage_durations(self, run_id):
+        rows = self.connection.execute("SELECT name, duration_seconds FROM stages WHERE run_id = ?", (run_id,))
+        return {row["name"]: row["duration_seconds"] for row in rows}
+
+    def baseline_runs(self, run, window=5):
+        # Earlier successful builds of the same config, kernel and job count that
+        # start as warm: an incremental or cached build is not compared with a cold one.
+        # IS matches unknown (NULL) modes of older runs only with each other.
+        return self.connection.execute(
+            "SELECT * FROM runs WHERE kernel_config = ? AND kernel_version = ? AND make_jobs = ?"
+            " AND incremental IS ? AND compiler_cache IS ? AND source_cache IS ?"
+            " AND status = 'success' AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",
+            (run["kernel_config"], run["kernel_version"], run["make_jobs"],
+             run["incremental"], run["compiler_cache"], run["source_cache"], run["timestamp"], window)
+        ).fetchall()
+
+    def check_regressions(self, run, threshold=0.2, window=5, stages=("compile", "rpmbuild")):
+        """
+        Compares `run` with the median of up to `window` earlier runs of the same
+        configuration and returns a message for every metric that grew by more
+        than `threshold` (0.2 = 20%).
+        """
+        baseline = self.baseline_runs(run, window)
+        if not baseline:
+            return []
+
+        regressions = []
+        # Any run in the median may have been built from another configuration
+        config_changed = any(row["config_hash"] != run["config_hash"] for row in baseline)
+        for column, (description, min_delta) in REGRESSION_METRICS.items():
+            previous = [row[column] for row in baseline if row[column]]
+            if run[column] and previous:
+                regressions += self._compare(description, run[column], statistics.median(previous), threshold, min_delta)
+
+        current_stages = self._stage_durations(run["id"])
+        previous_stages = [self._stage_durations(row["id"]) for row in baseline]
+        for stage in stages:
+            previous = [durations[stage] for durations in previous_stages if durations.get(stage)]
+            if current_stages.get(stage) and previous:
+                regressions += self._compare(f"'{stage}' stage", current_stages[stage], statistics.median(previous),
+                                             threshold, MIN_STAGE_DURATION_DELTA)
+
+        if regressions and config_changed:
+            regressions.append("Note: the kernel configuration differs from some of the runs compared with.")
+        return regressions
+
+    @staticmethod
+    def _compare(description, value, baseline, threshold, min_delta):
+        if baseline and value > baseline * (1 + threshold) and value - baseline >= min_delta:
+            return [f"{description} regressed: {value:.2f} vs. median {baseline:.2f} (+{100.0 * (value / baseline - 1):.0f}%)"]
+        return []
+
+    def trends(self, kernel_config=None):
+        query = "SELECT kernel_config, kernel_version FROM runs"
+        params = []
+        if kernel_config:
+            query += " WHERE kernel_config LIKE ?"
+            params.append(f"%{kernel_config}%")
+        query += " GROUP BY kernel_config, kernel_version ORDER BY kernel_config, kernel_version"
+        trends = []
+        for group in self.connection.execute(query, params).fetchall():
+            rows = self.connection.execute(
+                "SELECT duration_seconds, rpm_total_bytes FROM runs WHERE kernel_config = ? AND kernel_version = ?"
+                " AND status = 'success' ORDER BY timestamp",
+                (group["kernel_config"], group["kernel_version"])
+            ).fetchall()
+            durations = [row["duration_seconds"] for row in rows if row["duration_seconds"]]
+            sizes = [row["rpm_total_bytes"] for row in rows if row["rpm_total_bytes"]]
+            if not durations:
+                continue
+            trends.append({
+                "kernel_config": group["kernel_config"],
+                "kernel_version": group["kernel_version"],
+                "runs": len(durations),
+                "duration_min": min(durations),
+                "duration_median": statistics.median(durations),
+                "duration_max": max(durations),
+                "duration_last": durations[-1],
+                "rpm_size_last": sizes[-1] if sizes else None,
+            })
+        return trends
+
+
+def import_reports(history, paths):
+    imported = 0
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            history.record(json.load(f))
+        imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the kernel build history and detect regressions between runs.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help=f"History database. Default is {DEFAULT_DB_PATH}.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List recent builds.")
+    list_parser.add_argument("--config", help="Only builds whose config path contains this text.")
+    list_parser.add_argument("--limit", type=int, default=20)
+
+    trends_parser = subparsers.add_parser("trends", help="Duration and size trends per config and kernel version.")
+    trends_parser.add_argument("--config", help="Only configs whose path contains this text.")
+
+    check_parser = subparsers.add_parser("check", help="Check a build (default: the latest) for regressions. Exits with 1 if any are found.")
+    check_parser.add_argument("--build-id", help="Build to check.")
+    check_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed growth before a metric counts as regressed. Default is 0.2 (20%%).")
+    check_parser.add_argument("--window", type=int, default=5, help="Number of earlier runs forming the baseline. Default is 5.")
+
+    import_parser = subparsers.add_parser("import", help="Add existing log/<build-id>/report-summary.json files to the history.")
+    import_parser.add_argument("reports", nargs="*", help="Report files. Default is every log/*/report-summary.json.")
+
+    args = parser.parse_args()
+    history = BuildHistory(args.db)
+
+    if args.command == "list":
+        print(f"{'Build ID':<40} {'Version':<10} {'Config':<28} {'Jobs':<10} {'Status':<8} {'Duration':>10} {'RPM size':>10}")
+        for run in history.runs(args.config, args.limit):
+            size = f"{run['rpm_total_bytes'] / 2**20:.0f} MiB" if run["rpm_total_bytes"] else "-"
+            duration = f"{run['duration_seconds']:.0f} s" if run["duration_seconds"] else "-"
+            print(f"{run['build_id']:<40} {run['kernel_version'] or '-':<10} {os.path.basename(run['kernel_config'] or '-'):<28} "
+                  f"{run['make_jobs']:<10} {run['status']:<8} {duration:>10} {size:>10}")
+    elif args.command == "trends":
+        for trend in history.trends(args.config):
+            size = f"{trend['rpm_size_last'] / 2**20:.0f} MiB" if trend["rpm_size_last"] else "-"
+            print(f"{os.path.basename(trend['kernel_config'])} ({trend['kernel_version']}): {trend['runs']} runs, "
+                  f"duration min/median/max {trend['duration_min']:.0f}/{trend['duration_median']:.0f}/{trend['duration_max']:.0f} s, "
+                  f"last {trend['duration_last']:.0f} s, last RPM size {size}")
+    elif args.command == "check":
+        run = history.get_run(args.build_id)
+        if run is None:
+            print("No such build in the history.", file=sys.stderr)
+            sys.exit(2)
+        regressions = history.check_regressions(run, args.threshold, args.window)
+        for regression in regressions:
+            print(f"REGRESSION ({run['build_id']}): {regression}")
+        if not regressions:
+            print(f"No regressions found for {run['build_id']}.")
+        sys.exit(1 if regressions else 0)
+    elif args.command == "import":
+        reports = args.reports or sorted(glob.glob(os.path.join(repo_root, "log", "*", "report-summary.json")))
+        print(f"Imported {import_reports(history, reports)} reports.")
+    history.close()
+
+
+if __name__ == "__main__":
+    main()
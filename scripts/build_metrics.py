@@ -0,0 +1,204 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+# ru_inblock/ru_oublock count 512 byte blocks
+BLOCK_SIZE = 512
+
+
+def _read_cpu_times():
+    with open("/proc/stat", encoding='utf-8') as f:
+        fields = [int(value) for value in f.readline().split()[1:]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    return sum(fields), idle
+
+
+def _process_tree_rss(root_pids):
+    """Summed RSS and number of processes of the trees below `root_pids` that still run."""
+    parents = {}
+    rss = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding='utf-8') as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm", encoding='utf-8') as f:
+                rss[int(entry)] = int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+        # The command name may contain spaces, the fields after ")" do not
+        parents[int(entry)] = int(stat.rsplit(")", 1)[1].split()[1])
+
+    roots = [pid for pid in root_pids if pid in rss]
+    total = sum(rss[pid] for pid in roots)
+    processes = len(roots)
+    pending = list(roots)
+    children = {}
+    for pid, ppid in parents.items():
+        children.setdefault(ppid, []).append(pid)
+    while pending:
+        for child in children.get(pending.pop(), []):
+            total += rss.get(child, 0)
+            processes += 1
+            pending.append(child)
+    return total, processes
+
+
+class ResourceSampler:
+    """
+    Samples the process trees of a stage's commands every `interval` seconds
+    while the stage runs: summed RSS, plus system CPU utilization and load
+    average. Each sample is appended to `samples_path` (JSONL) as it is taken.
+    Commands are registered with add_process() when they start and with
+    process_finished() and their resource usage (os.wait4) when they are done;
+    the summary's CPU time and I/O come from those. Stages run concurrently, so
+    only their own commands count, not the whole process. System CPU and load
+    are machine wide by nature.
+    """
+
+    def __init__(self, interval=2.0, samples_path=None, label=None):
+        self.interval = interval
+        self.samples_path = samples_path
+        self.label = label
+        self._stop = threading.Event()
+        # Set by add_process(), so a short command is sampled at least once
+        self._wake = threading.Event()
+        self._thread = None
+        self.peak_rss = 0
+        self.peak_processes = 0
+        self.load_samples = []
+        self.cpu_samples = []
+        self._lock = threading.Lock()
+        self._pids = set()
+        self._cpu_seconds = 0.0
+        self._read_blocks = 0
+        self._written_blocks = 0
+        self._peak_single_rss = 0
+
+    def add_process(self, process):
+        """Samples the tree of `process` (a Popen) from now on."""
+        with self._lock:
+            self._pids.add(process.pid)
+        self._wake.set()
+
+    def process_finished(self, process, usage=None):
+        """Stops sampling `process` (it is reaped, its pid may be reused) and adds its resource usage."""
+        with self._lock:
+            self._pids.discard(process.pid)
+            if usage is None:
+                return
+            self._cpu_seconds += usage.ru_utime + usage.ru_stime
+            self._read_blocks += usage.ru_inblock
+            self._written_blocks += usage.ru_oublock
+            # ru_maxrss is in KiB on Linux
+            self._peak_single_rss = max(self._peak_single_rss, usage.ru_maxrss * 1024)
+
+    def _sample(self, samples_f, previous_cpu):
+        with self._lock:
+            pids = set(self._pids)
+        rss, processes = _process_tree_rss(pids)
+        total, idle = _read_cpu_times()
+        cpu_percent = None
+        if previous_cpu and total > previous_cpu[0]:
+            cpu_percent = round(100.0 * (1 - (idle - previous_cpu[1]) / (total - previous_cpu[0])), 1)
+            self.cpu_samples.append(cpu_percent)
+        load = os.getloadavg()[0]
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_processes = max(self.peak_processes, processes)
+        self.load_samples.append(load)
+        if samples_f:
+            samples_f.write(json.dumps({
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "stage": self.label,
+                "rss_bytes": rss,
+                "processes": processes,
+                "cpu_percent": cpu_percent,
+                "load_1m": load,
+            }) + "\n")
+            samples_f.flush()
+        return total, idle
+
+    def _loop(self):
+        samples_f = open(self.samples_path, "a", encoding='utf-8') if self.samples_path else None
+        try:
+            previous_cpu = None
+            while not self._stop.is_set():
+                previous_cpu = self._sample(samples_f, previous_cpu)
+                self._wake.wait(self.interval)
+                self._wake.clear()
+        finally:
+            if samples_f:
+                samples_f.close()
+
+    def start(self):
+        self._start_time = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        wall = time.monotonic() - self._start_time
+        with self._lock:
+            cpu_seconds = self._cpu_seconds
+            read_bytes = self._read_blocks * BLOCK_SIZE
+            write_bytes = self._written_blocks * BLOCK_SIZE
+            peak_single_rss = self._peak_single_rss
+        return {
+            "wall_seconds": round(wall, 2),
+            "cpu_seconds": round(cpu_seconds, 2),
+            # Share of all CPUs the stage kept busy, 100% = every core all the time
+            "cpu_utilization_percent": round(100.0 * cpu_seconds / (wall * os.cpu_count()), 1) if wall else 0.0,
+            # A command may finish between two samples, its own peak is a lower bound
+            "peak_rss_bytes": max(self.peak_rss, peak_single_rss),
+            "peak_single_process_rss_bytes": peak_single_rss,
+            "peak_processes": self.peak_processes,
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+            "load_average_max": round(max(self.load_samples), 2) if self.load_samples else None,
+            "load_average_mean": round(sum(self.load_samples) / len(self.load_samples), 2) if self.load_samples else None,
+            "system_cpu_percent_mean": round(sum(self.cpu_samples) / len(self.cpu_samples), 1) if self.cpu_samples else None,
+        }
+
+
+class BuildMetrics:
+    """
+    Collects stage timings and other build facts and writes them as JSON.
+    Stages run in threads of their own, so recording is locked.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def record_stage(self, name, started_at, duration, status="success", resources=None):
+        stage = {
+            "name": name,
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "duration_seconds": round(duration, 3),
+            "status": status,
+        }
+        if resources:
+            stage["resources"] = resources
+        with self._lock:
+            self.stages.append(stage)
+
+    def set(self, key, value):
+        with self._lock:
+            self.data[key] = value
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self.data, stages=list(self.stages))
+
+    def write(self, path):
+        with open(path, "w", encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
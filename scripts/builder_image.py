@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import hashlib
+import os
+import subprocess
+import sys
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.docker_api import DockerCli
+from scripts.kernel_sources import print_log
+
+DOCKER_DIR = os.path.join(repo_root, "docker")
+DEFAULT_IMAGE = "kernel-builder-py"
+DEFAULT_DOCKERFILE = "tumbleweed.Dockerfile"
+BUILD_TARGET = "toolchain"
+HASH_LABEL = "kernel-builder.content-hash"
+DOCKERFILE_LABEL = "kernel-builder.dockerfile"
+
+
+def dockerfile_inputs(dockerfile, context_dir=DOCKER_DIR):
+    """The Dockerfile and every file it COPYs from the build context, e.g. the package lists."""
+    inputs = [os.path.join(context_dir, dockerfile)]
+    with open(inputs[0], encoding='utf-8') as f:
+        for line in f:
+            words = line.split()
+            if not words or words[0].upper() not in ("COPY", "ADD"):
+                continue
+            if any(word.startswith("--from") for word in words):
+                continue
+            inputs += [os.path.join(context_dir, word) for word in words[1:-1] if not word.startswith("--")]
+    return inputs
+
+
+def content_hash(dockerfile, context_dir=DOCKER_DIR):
+    digest = hashlib.sha256()
+    for path in dockerfile_inputs(dockerfile, context_dir):
+        digest.update(os.path.relpath(path, context_dir).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def image_labels(image, docker=None):
+    """
+    Returns the labels of a local image, or None if it does not exist.
+    `docker` is a DockerClient or DockerCli (the default).
+    """
+    inspection = (docker or DockerCli()).inspect_image(image)
+    if inspection is None:
+        return None
+    labels = (inspection.get("Config") or {}).get("Labels") or {}
+    return {DOCKERFILE_LABEL: labels.get(DOCKERFILE_LABEL) or None, HASH_LABEL: labels.get(HASH_LABEL) or None}
+
+
+def image_status(image, dockerfile=None, docker=None):
+    """
+    Compares the image with the Dockerfile it was built from (or `dockerfile`).
+    Returns (status, dockerfile): "current", "stale", "missing" or "unlabeled"
+    for images not built by this script.
+    """
+    labels = image_labels(image, docker)
+    if labels is None:
+        return "missing", dockerfile
+    dockerfile = dockerfile or labels[DOCKERFILE_LABEL]
+    if not labels[HASH_LABEL] or not dockerfile:
+        return "unlabeled", dockerfile
+    return ("current" if labels[HASH_LABEL] == content_hash(dockerfile) else "stale"), dockerfile
+
+
+def build_image(image, dockerfile, refresh_base=False, log=print_log):
+    command = [
+        "docker", "build",
+        "--target", BUILD_TARGET,
+        "--label", f"{HASH_LABEL}={content_hash(dockerfile)}",
+        "--label", f"{DOCKERFILE_LABEL}={dockerfile}",
+        "-t", image,
+        "-f", os.path.join(DOCKER_DIR, dockerfile),
+    ]
+    if refresh_base:
+        command += ["--build-arg", f"BASE_REFRESH={datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"]
+    command.append(DOCKER_DIR)
+    log(f"Building Docker image '{image}' from '{dockerfile}'...")
+    # Cache mounts (RUN --mount=type=cache) need BuildKit, which the Engine
+    # API's /build only offers through a BuildKit session, so both backends
+    # build with the docker command
+    subprocess.run(command, check=True, env=dict(os.environ, DOCKER_BUILDKIT="1"))
+    log(f"Docker image '{image}' built successfully.")
+
+
+def ensure_image(image=DEFAULT_IMAGE, dockerfile=None, force=False, refresh_base=False, log=print_log, docker=None):
+    """
+    Builds the image unless it exists and matches the content hash of its
+    Dockerfile and package lists. Returns "reused" or "built".
+    """
+    status, dockerfile = image_status(image, dockerfile, docker)
+    dockerfile = dockerfile or DEFAULT_DOCKERFILE
+    if status == "current" and not force and not refresh_base:
+        log(f"Docker image '{image}' is current ({dockerfile}), not rebuilding.")
+        return "reused"
+    if status != "missing":
+        log(f"Docker image '{image}' is {status}, rebuilding from '{dockerfile}'.")
+    build_image(image, dockerfile, refresh_base, log)
+    return "built"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the kernel builder Docker image only when its Dockerfile or package lists changed.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build the image if it is missing or out of date.")
+    build_parser.add_argument("--image", default=DEFAULT_IMAGE, help=f"Image name. Default is {DEFAULT_IMAGE}.")
+    build_parser.add_argument("--dockerfile", default=None, help=f"Dockerfile in docker/. Default is the one the image was built from, or {DEFAULT_DOCKERFILE}.")
+    build_parser.add_argument("--force", action="store_true", help="Build even if the image is current (unchanged layers still come from the cache).")
+    build_parser.add_argument("--refresh-base", action="store_true", help="Also rebuild the base layer, i.e. upgrade the distribution packages.")
+
+    status_parser = subparsers.add_parser("status", help="Show whether the image matches its Dockerfile. Exits with 1 unless it is current.")
+    status_parser.add_argument("--image", default=DEFAULT_IMAGE, help=f"Image name. Default is {DEFAULT_IMAGE}.")
+    status_parser.add_argument("--dockerfile", default=None, help="Dockerfile to compare with. Default is the one the image was built from.")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        try:
+            ensure_image(args.image, args.dockerfile, args.force, args.refresh_base)
+        except subprocess.CalledProcessError as e:
+            print(f">>> ERROR: Docker image build failed: {e}", file=sys.stderr)
+            sys.exit(1)
+    elif args.command == "status":
+        status, dockerfile = image_status(args.image, args.dockerfile)
+        print(f"{args.image}: {status}" + (f" ({dockerfile})" if dockerfile else ""))
+        sys.exit(0 if status == "current" else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Compiler wrapper that records how long every compiler call takes.
+
+Used as CC="python3 cc_timing_wrapper.py [ccache] gcc": runs the rest of its
+command line and appends one JSON line per call to $KBUILD_TIMING_LOG (the
+output object, wall and CPU seconds). config_impact.py aggregates the records.
+
+The wall and CPU seconds are the compiler's alone. The wrapper's own cost
+(mostly Python start-up, tens of milliseconds per call) is recorded separately as
+wrapper_wall_seconds and wrapper_cpu_seconds, so it can be reported without
+distorting the per-object figures.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+TIMING_LOG_VARIABLE = "KBUILD_TIMING_LOG"
+
+
+def _output_file(args):
+    for index, arg in enumerate(args[:-1]):
+        if arg == "-o":
+            return args[index + 1]
+    return None
+
+
+def _process_age():
+    """Seconds since this process started, to a clock tick (None without /proc)."""
+    try:
+        with open("/proc/self/stat", encoding='utf-8') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22, the start time in clock ticks since boot; the command name may contain spaces
+    start_ticks = int(stat.rsplit(")", 1)[1].split()[19])
+    return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def main():
+    command = sys.argv[1:]
+    if not command:
+        print("usage: cc_timing_wrapper.py COMPILER [ARGS...]", file=sys.stderr)
+        return 2
+
+    start = time.monotonic()
+    returncode = subprocess.call(command)
+    wall = time.monotonic() - start
+
+    log_path = os.environ.get(TIMING_LOG_VARIABLE)
+    output = _output_file(command)
+    # Only calls that produce an object; preprocessing and cc-option probes are skipped
+    if log_path and output and output.endswith(".o") and "-c" in command:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        own_usage = resource.getrusage(resource.RUSAGE_SELF)
+        age = _process_age()
+        record = json.dumps({
+            "object": os.path.normpath(os.path.join(os.getcwd(), output)),
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 4),
+            "wrapper_wall_seconds": round(max(0.0, age - wall), 4) if age is not None else None,
+            "wrapper_cpu_seconds": round(own_usage.ru_utime + own_usage.ru_stime, 4),
+            "returncode": returncode,
+        }) + "\n"
+        # One write per record, O_APPEND keeps records of parallel calls intact
+        fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, record.encode("utf-8"))
+        finally:
+            os.close(fd)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import collections
+import os
+import subprocess
+import threading
+
+# Number of trailing output lines kept per stream for error reports.
+DEFAULT_TAIL_LINES = 200
+
+
+class CommandResult:
+    def __init__(self, command, returncode, stdout, stderr, rusage=None):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        # Resources of the command and the descendants it waited for (os.wait4)
+        self.rusage = rusage
+
+    def check_returncode(self):
+        if self.returncode != 0:
+            raise subprocess.CalledProcessError(self.returncode, self.command, self.stdout, self.stderr)
+
+
+def run_streaming(command, cwd=None, env=None, on_stdout=None, on_stderr=None,
+                  capture_stdout=False, merge_stderr=False, tail_lines=DEFAULT_TAIL_LINES, on_start=None):
+    """
+    Runs a command and hands its stdout/stderr to the callbacks line by line as
+    the lines arrive. Both pipes are drained concurrently so neither can fill up
+    and stall the child. Only the last `tail_lines` lines of each stream are
+    kept in memory, unless `capture_stdout` asks for the complete stdout (meant
+    for short commands whose output is parsed, e.g. `make -s kernelrelease`).
+    With `merge_stderr` both streams go through `on_stdout` in the order the
+    child wrote them. `on_start` is called with the Popen as soon as the child
+    runs, e.g. to sample its process tree.
+    """
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        bufsize=1
+    )
+
+    if on_start:
+        try:
+            on_start(process)
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+
+    stdout_lines = [] if capture_stdout else collections.deque(maxlen=tail_lines)
+    stderr_lines = collections.deque(maxlen=tail_lines)
+    callback_errors = []
+
+    def pump(stream, sink, callback):
+        # A failing callback (e.g. a full disk under the log file) must not stop
+        # the draining, the child would block on the full pipe forever. The
+        # first error is re-raised once the command has finished.
+        with stream:
+            for line in stream:
+                line = line.rstrip('\n')
+                sink.append(line)
+                if callback and not callback_errors:
+                    try:
+                        callback(line)
+                    except Exception as e:
+                        callback_errors.append(e)
+
+    readers = [threading.Thread(target=pump, args=(process.stdout, stdout_lines, on_stdout), daemon=True)]
+    if not merge_stderr:
+        readers.append(threading.Thread(target=pump, args=(process.stderr, stderr_lines, on_stderr), daemon=True))
+    for reader in readers:
+        reader.start()
+    try:
+        for reader in readers:
+            reader.join()
+        # Reaped here rather than by process.wait() for the resource usage
+        _, status, rusage = os.wait4(process.pid, 0)
+        returncode = process.returncode = os.waitstatus_to_exitcode(status)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    if callback_errors:
+        raise callback_errors[0]
+
+    return CommandResult(command, returncode, '\n'.join(stdout_lines), '\n'.join(stderr_lines), rusage)
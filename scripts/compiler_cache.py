@@ -0,0 +1,86 @@
+import json
+import re
+
+SUPPORTED_TOOLS = ("ccache", "sccache")
+
+
+class CompilerCache:
+    """
+    Describes how a compiler cache (ccache or sccache) is wired into the kernel
+    build: the environment it needs, the make variables that put it in front of
+    gcc, and the commands used to prepare it and to read its statistics.
+    Eviction is left to the tool itself, bounded by `max_size` (e.g. "20G").
+
+    The cache directory may be shared by concurrent builds (matrix builds,
+    pooled containers), so its counters are never zeroed: a build reads them
+    when it starts and reports the growth by the time it is done.
+    """
+
+    def __init__(self, tool, cache_dir, max_size):
+        if tool not in SUPPORTED_TOOLS:
+            raise ValueError(f"Unsupported compiler cache '{tool}', expected one of: {', '.join(SUPPORTED_TOOLS)}")
+        self.tool = tool
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def environment(self):
+        if self.tool == "ccache":
+            return {"CCACHE_DIR": self.cache_dir, "CCACHE_MAXSIZE": self.max_size}
+        return {"SCCACHE_DIR": self.cache_dir, "SCCACHE_CACHE_SIZE": self.max_size}
+
+    def make_variables(self):
+        return [f"CC={self.tool} gcc", f"HOSTCC={self.tool} gcc"]
+
+    def prepare_commands(self):
+        if self.tool == "ccache":
+            # --max-size is stored in the cache's own config and evicts right away if needed
+            return [["ccache", "--max-size", self.max_size]]
+        # The sccache server reads SCCACHE_CACHE_SIZE only when it starts
+        return [["sccache", "--start-server"]]
+
+    def stats_command(self):
+        if self.tool == "ccache":
+            return ["ccache", "--print-stats"]
+        return ["sccache", "--show-stats", "--stats-format=json"]
+
+    def finish_commands(self):
+        if self.tool == "ccache":
+            return []
+        return [["sccache", "--stop-server"]]
+
+    def parse_stats(self, output, before=None):
+        """
+        Hits, misses and hit rate from the output of stats_command(). With
+        `before`, the parse_stats() result of the snapshot taken when the build
+        started, only the lookups since then are counted.
+        """
+        if self.tool == "ccache":
+            # "ccache --print-stats" prints one "<counter>\t<value>" pair per line
+            counters = {}
+            for line in output.splitlines():
+                match = re.match(r"^(\w+)\t(\d+)$", line.strip())
+                if match:
+                    counters[match.group(1)] = int(match.group(2))
+            hits = counters.get("direct_cache_hit", 0) + counters.get("preprocessed_cache_hit", 0)
+            misses = counters.get("cache_miss", 0)
+            cache_size = counters.get("cache_size_kibibyte", 0) * 1024
+        else:
+            info = json.loads(output)
+            stats = info.get("stats", {})
+            hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+            misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+            cache_size = info.get("cache_size") or 0
+
+        if before:
+            # A counter that went down was reset in between, then all of it is new
+            hits = hits - before["hits"] if hits >= before["hits"] else hits
+            misses = misses - before["misses"] if misses >= before["misses"] else misses
+        lookups = hits + misses
+        return {
+            "tool": self.tool,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(100.0 * hits / lookups, 2) if lookups else 0.0,
+            "cache_size_bytes": cache_size,
+            "max_size": self.max_size,
+        }
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import sys
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.kconfig import KernelConfig
+
+# "obj-$(CONFIG_FOO) += foo.o bar/", "lib-y += x.o", "foo-$(CONFIG_BAR) += a.o", "foo-objs := a.o b.o"
+ASSIGNMENT_PATTERN = re.compile(r"^([A-Za-z0-9_.-]+?)-(y|m|objs|\$\(CONFIG_([A-Za-z0-9_]+)\))\s*[:+]?=\s*(.*)$")
+# Variables with the same shape that do not list objects
+NON_OBJECT_VARIABLES = {"extra", "always", "hostprogs", "userprogs", "targets", "subdir", "core", "drivers", "libs", "head"}
+CORE = "(core)"
+
+
+class KbuildDirectory:
+    def __init__(self):
+        self.objects = {}   # "foo.o" -> guarding symbol (None for obj-y/obj-m)
+        self.subdirs = {}   # "bar" or "bar/baz" -> guarding symbol
+        self.members = {}   # "a.o" -> (composite object "foo.o", guarding symbol)
+
+
+def _logical_lines(text):
+    # Joins backslash continuations and drops comments
+    for line in text.replace("\\\n", " ").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            yield line
+
+
+def parse_kbuild_file(text):
+    directory = KbuildDirectory()
+    for line in _logical_lines(text):
+        match = ASSIGNMENT_PATTERN.match(line)
+        if not match:
+            continue
+        name, _, symbol, values = match.groups()
+        if name in NON_OBJECT_VARIABLES or name.endswith(("flags", "FLAGS")):
+            continue
+        for value in values.split():
+            if "$" in value:
+                continue
+            if name in ("obj", "lib"):
+                if value.endswith("/"):
+                    directory.subdirs[value.rstrip("/")] = symbol
+                elif value.endswith(".o"):
+                    directory.objects[value] = symbol
+            elif value.endswith(".o"):
+                directory.members[value] = (f"{name}.o", symbol)
+    return directory
+
+
+def parse_kbuild_tree(source_dir):
+    """Parses the Kbuild (or Makefile) of every directory below `source_dir`, keyed by relative directory."""
+    directories = {}
+    for directory, dirnames, filenames in os.walk(source_dir):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for filename in ("Kbuild", "Makefile"):
+            if filename in filenames:
+                with open(os.path.join(directory, filename), encoding='utf-8', errors='replace') as f:
+                    relative = os.path.relpath(directory, source_dir)
+                    directories[relative if relative != "." else ""] = parse_kbuild_file(f.read())
+                break
+    return directories
+
+
+def symbol_chain(directories, object_path):
+    """
+    Kconfig symbols that decide whether `object_path` (relative to the object
+    tree) is built, most specific first: the object's own obj-$(CONFIG_...)
+    line, the composite object it belongs to, then every directory above it.
+    """
+    chain = []
+    directory, name = os.path.split(object_path)
+    info = directories.get(directory)
+    seen = set()
+    while info and name not in seen:
+        seen.add(name)
+        if name in info.objects:
+            chain.append(info.objects[name])
+            break
+        if name not in info.members:
+            break
+        name, symbol = info.members[name]
+        chain.append(symbol)
+
+    while directory:
+        parent = os.path.dirname(directory)
+        # obj-$(CONFIG_X) += a/b/ may skip levels, so look at every ancestor
+        ancestor = parent
+        while True:
+            ancestor_info = directories.get(ancestor)
+            relative = directory[len(ancestor) + 1:] if ancestor else directory
+            if ancestor_info and relative in ancestor_info.subdirs:
+                chain.append(ancestor_info.subdirs[relative])
+                parent = ancestor
+                break
+            if not ancestor:
+                break
+            ancestor = os.path.dirname(ancestor)
+        directory = parent
+
+    symbols = []
+    for symbol in chain:
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def load_timings(path, object_dir):
+    timings = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            object_path = os.path.relpath(record["object"], object_dir)
+            if object_path.startswith(".."):
+                continue
+            timing = timings.setdefault(object_path, {"cpu_seconds": 0.0, "wall_seconds": 0.0,
+                                                      "wrapper_cpu_seconds": 0.0, "wrapper_wall_seconds": 0.0})
+            # An object compiled twice (e.g. a rebuild) counts with its total cost
+            timing["cpu_seconds"] += record["cpu_seconds"]
+            timing["wall_seconds"] += record["wall_seconds"]
+            # Not in records of older wrappers
+            timing["wrapper_cpu_seconds"] += record.get("wrapper_cpu_seconds") or 0.0
+            timing["wrapper_wall_seconds"] += record.get("wrapper_wall_seconds") or 0.0
+    return timings
+
+
+def analyze(source_dir, object_dir, timings_path, config=None):
+    """
+    Aggregates per-object compile times and object/module sizes by Kconfig
+    symbol. Every object counts for all symbols in its chain, so a symbol's
+    figures are what disabling it would save (inclusive); "self" figures count
+    only the most specific symbol. The timing wrapper's own overhead is only
+    part of the totals (wrapper_*), it is not attributed to any symbol.
+    """
+    directories = parse_kbuild_tree(source_dir)
+    timings = load_timings(timings_path, object_dir)
+    symbols = {}
+
+    def entry(symbol):
+        return symbols.setdefault(symbol, {
+            "symbol": symbol, "objects": 0, "cpu_seconds": 0.0, "wall_seconds": 0.0, "object_bytes": 0,
+            "self_cpu_seconds": 0.0, "modules": [], "module_bytes": 0,
+        })
+
+    totals = {"objects": 0, "cpu_seconds": 0.0, "wall_seconds": 0.0, "object_bytes": 0, "modules": 0, "module_bytes": 0,
+              "wrapper_cpu_seconds": 0.0, "wrapper_wall_seconds": 0.0}
+    for object_path, timing in timings.items():
+        full_path = os.path.join(object_dir, object_path)
+        size = os.path.getsize(full_path) if os.path.exists(full_path) else 0
+        chain = symbol_chain(directories, object_path) or [CORE]
+        totals["objects"] += 1
+        totals["cpu_seconds"] += timing["cpu_seconds"]
+        totals["wall_seconds"] += timing["wall_seconds"]
+        totals["wrapper_cpu_seconds"] += timing["wrapper_cpu_seconds"]
+        totals["wrapper_wall_seconds"] += timing["wrapper_wall_seconds"]
+        totals["object_bytes"] += size
+        entry(chain[0])["self_cpu_seconds"] += timing["cpu_seconds"]
+        for symbol in chain:
+            stats = entry(symbol)
+            stats["objects"] += 1
+            stats["cpu_seconds"] += timing["cpu_seconds"]
+            stats["wall_seconds"] += timing["wall_seconds"]
+            stats["object_bytes"] += size
+
+    for directory, _, filenames in os.walk(object_dir):
+        for filename in filenames:
+            if not filename.endswith(".ko"):
+                continue
+            module_path = os.path.relpath(os.path.join(directory, filename), object_dir)
+            size = os.path.getsize(os.path.join(directory, filename))
+            totals["modules"] += 1
+            totals["module_bytes"] += size
+            for symbol in symbol_chain(directories, module_path[:-len(".ko")] + ".o") or [CORE]:
+                stats = entry(symbol)
+                stats["modules"].append(module_path)
+                stats["module_bytes"] += size
+
+    ranked = sorted(symbols.values(), key=lambda stats: (stats["cpu_seconds"], stats["module_bytes"]), reverse=True)
+    for stats in ranked:
+        stats["cpu_share_percent"] = round(100.0 * stats["cpu_seconds"] / totals["cpu_seconds"], 2) if totals["cpu_seconds"] else 0.0
+        stats["cpu_seconds"] = round(stats["cpu_seconds"], 2)
+        stats["self_cpu_seconds"] = round(stats["self_cpu_seconds"], 2)
+        stats["wall_seconds"] = round(stats["wall_seconds"], 2)
+        stats["value"] = config.get(stats["symbol"]) if config and stats["symbol"] != CORE else None
+    totals["cpu_seconds"] = round(totals["cpu_seconds"], 2)
+    totals["wall_seconds"] = round(totals["wall_seconds"], 2)
+    totals["wrapper_cpu_seconds"] = round(totals["wrapper_cpu_seconds"], 2)
+    totals["wrapper_wall_seconds"] = round(totals["wrapper_wall_seconds"], 2)
+    return {"totals": totals, "symbols": ranked}
+
+
+def format_report(report, top=25):
+    totals = report["totals"]
+    lines = [
+        f"{totals['objects']} objects, {totals['cpu_seconds']:.0f} s compiler CPU time, "
+        f"{totals['object_bytes'] / 2**20:.0f} MiB objects, {totals['modules']} modules ({totals['module_bytes'] / 2**20:.0f} MiB)",
+        f"Timing wrapper overhead, not included below: {totals['wrapper_cpu_seconds']:.0f} s CPU, {totals['wrapper_wall_seconds']:.0f} s wall",
+        f"{'Symbol':<36} {'Value':>5} {'CPU s':>9} {'Share':>7} {'Self s':>9} {'Objects':>8} {'Modules':>8} {'Module MiB':>11}",
+    ]
+    for stats in report["symbols"][:top]:
+        lines.append(
+            f"{stats['symbol']:<36} {stats['value'] or '':>5} {stats['cpu_seconds']:>9.1f} {stats['cpu_share_percent']:>6.1f}% "
+            f"{stats['self_cpu_seconds']:>9.1f} {stats['objects']:>8} {len(stats['modules']):>8} {stats['module_bytes'] / 2**20:>11.1f}"
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank Kconfig symbols by the compile time and module size they cost, from a build run with --compile-timing.")
+    parser.add_argument("--source-dir", required=True, help="Kernel source tree (for the Kbuild files).")
+    parser.add_argument("--object-dir", help="Object tree of the build. Defaults to the source tree.")
+    parser.add_argument("--timings", required=True, help="compile-times.jsonl written by cc_timing_wrapper.py.")
+    parser.add_argument("--config", help="The .config of the build, to show the value of each symbol.")
+    parser.add_argument("--top", type=int, default=25, help="Number of symbols to show. Default is 25.")
+    parser.add_argument("--json", help="Also write the full report as JSON to this file.")
+    args = parser.parse_args()
+
+    config = KernelConfig.from_file(args.config) if args.config else None
+    report = analyze(args.source_dir, args.object_dir or args.source_dir, args.timings, config)
+    for line in format_report(report, args.top):
+        print(line)
+    if args.json:
+        with open(args.json, "w", encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
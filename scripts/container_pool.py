@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.builder_image import DEFAULT_IMAGE
+from scripts.docker_api import DockerAPIError, DockerCli, DockerClient
+from scripts.kernel_sources import cache_lock, print_log
+
+DEFAULT_POOL_DIR = os.path.join(repo_root, "build-cache", "container-pool")
+DEFAULT_COMPILER_CACHE_DIR = os.path.join(repo_root, "build-cache", "compiler-cache")
+COMPILER_CACHE_IN_CONTAINER = "/compiler-cache"
+CONTAINER_PREFIX = "kernel-builder-pool-"
+# Leftovers of a previous build: a failed build keeps its rpmbuild root, an
+# interrupted one may leave an sccache server running
+RESET_COMMAND = "rm -rf /root/rpmbuild /tmp/gpg_batch_file; (sccache --stop-server >/dev/null 2>&1 || true)"
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _age_seconds(timestamp):
+    return (datetime.datetime.now() - datetime.datetime.fromisoformat(timestamp)).total_seconds()
+
+
+def _process_start_time(pid):
+    """Start time of a process in clock ticks since boot (field 22 of /proc/<pid>/stat), None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat", encoding='utf-8') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces, the fields after ")" do not
+    return int(stat.rsplit(")", 1)[1].split()[19])
+
+
+def _pid_alive(pid, start_time=None):
+    """
+    Whether the process that took a lease still runs. PIDs are reused, so
+    the start time recorded with the lease has to match as well.
+    """
+    if not pid:
+        return False
+    current_start_time = _process_start_time(pid)
+    if current_start_time is None:
+        return False
+    return start_time is None or current_start_time == start_time
+
+
+class ContainerPool:
+    """
+    Pre-started builder containers with a GPG key already generated, shared by
+    local_kernel_build.py runs (--pool). The pool state lives in
+    <pool_dir>/pool.json and is only changed under the directory's lock, so
+    concurrent builds (e.g. matrix_build.py) never lease the same container.
+    Each container mounts the workspace and the compiler cache directory.
+    Containers are controlled through `docker`, a DockerClient or DockerCli
+    (the default).
+    """
+
+    def __init__(self, pool_dir=DEFAULT_POOL_DIR, image=DEFAULT_IMAGE, compiler_cache_dir=DEFAULT_COMPILER_CACHE_DIR, log=print_log, docker=None):
+        self.pool_dir = pool_dir
+        self.state_path = os.path.join(pool_dir, "pool.json")
+        self.image = image
+        self.compiler_cache_dir = os.path.abspath(compiler_cache_dir)
+        self.log = log
+        self.docker = docker or DockerCli()
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, containers):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(containers, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _image_id(self):
+        inspection = self.docker.inspect_image(self.image)
+        return inspection["Id"] if inspection else None
+
+    def _healthy(self, name):
+        inspection = self.docker.inspect_container(name)
+        return bool(inspection and inspection["State"]["Running"])
+
+    def _create(self):
+        # Runs outside the lock: starting a container and generating a key takes seconds
+        name = CONTAINER_PREFIX + uuid.uuid4().hex[:8]
+        os.makedirs(self.compiler_cache_dir, exist_ok=True)
+        self.log(f"Starting pool container {name}...")
+        self.docker.run_container(name, self.image, ["tail", "-f", "/dev/null"],
+                                  volumes=[f"{repo_root}:/workspace", f"{self.compiler_cache_dir}:{COMPILER_CACHE_IN_CONTAINER}"],
+                                  labels={"kernel-builder.pool": "1"})
+        try:
+            self.docker.exec_run(name, ["bash", "/workspace/scripts/generate_gpg_key.sh"]).check_returncode()
+        except (subprocess.CalledProcessError, DockerAPIError):
+            self._remove(name)
+            raise
+        return name, {
+            "state": "idle",
+            "image_id": self._image_id(),
+            "compiler_cache_dir": self.compiler_cache_dir,
+            "created_at": _now(),
+            "last_used": _now(),
+            "builds": 0,
+        }
+
+    def _remove(self, name):
+        self.docker.remove_container(name)
+
+    def _usable(self, entry, image_id):
+        return entry["image_id"] == image_id and entry["compiler_cache_dir"] == self.compiler_cache_dir
+
+    def warm(self, size):
+        """Starts containers until at least `size` usable ones exist."""
+        os.makedirs(self.pool_dir, exist_ok=True)
+        image_id = self._image_id()
+        with cache_lock(self.pool_dir):
+            usable = sum(1 for entry in self._load().values() if self._usable(entry, image_id))
+        missing = max(0, size - usable)
+        if not missing:
+            return []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=missing) as executor:
+            created = list(executor.map(lambda _: self._create(), range(missing)))
+        with cache_lock(self.pool_dir):
+            containers = self._load()
+            containers.update(created)
+            self._save(containers)
+        self.log(f"Pool warmed: {len(created)} containers started.")
+        return [name for name, _ in created]
+
+    def lease(self, build_id):
+        """
+        Hands out an idle container (creating one if none is free) and returns
+        its name. The container is checked first; dead ones are replaced.
+        """
+        os.makedirs(self.pool_dir, exist_ok=True)
+        image_id = self._image_id()
+        while True:
+            with cache_lock(self.pool_dir):
+                containers = self._load()
+                candidates = sorted(
+                    (name for name, entry in containers.items() if entry["state"] == "idle" and self._usable(entry, image_id)),
+                    key=lambda name: containers[name]["last_used"], reverse=True
+                )
+                name = candidates[0] if candidates else None
+                if name:
+                    containers[name].update(state="leased", build_id=build_id, pid=os.getpid(),
+                                           pid_start_time=_process_start_time(os.getpid()), leased_at=_now())
+                    self._save(containers)
+            if name is None:
+                name, entry = self._create()
+                entry.update(state="leased", build_id=build_id, pid=os.getpid(),
+                             pid_start_time=_process_start_time(os.getpid()), leased_at=_now())
+                with cache_lock(self.pool_dir):
+                    containers = self._load()
+                    containers[name] = entry
+                    self._save(containers)
+                return name
+            if self._healthy(name):
+                return name
+            self.log(f"Pool container {name} is not running, replacing it.", level='warning')
+            self._forget(name)
+
+    def release(self, name, discard=False):
+        """Resets the container for the next build and marks it idle (or removes it)."""
+        if not discard:
+            try:
+                discard = self.docker.exec_run(name, ["bash", "-c", RESET_COMMAND]).returncode != 0
+            except DockerAPIError:
+                discard = True
+        if discard:
+            self._forget(name)
+            return
+        with cache_lock(self.pool_dir):
+            containers = self._load()
+            entry = containers.get(name)
+            if entry:
+                for key in ("build_id", "pid", "pid_start_time", "leased_at"):
+                    entry.pop(key, None)
+                entry.update(state="idle", last_used=_now(), builds=entry.get("builds", 0) + 1)
+                self._save(containers)
+
+    def _forget(self, name):
+        self._remove(name)
+        with cache_lock(self.pool_dir):
+            containers = self._load()
+            containers.pop(name, None)
+            self._save(containers)
+
+    def reap(self, idle_timeout, keep=0):
+        """
+        Removes containers idle for longer than `idle_timeout` seconds (keeping
+        the `keep` most recently used), containers of an outdated image and
+        containers that stopped. Leases of builds that died are released.
+        """
+        image_id = self._image_id()
+        removed = []
+        reclaimed = []
+        with cache_lock(self.pool_dir):
+            containers = self._load()
+            idle = sorted((name for name, entry in containers.items() if entry["state"] == "idle"),
+                          key=lambda name: containers[name]["last_used"], reverse=True)
+            for position, name in enumerate(idle):
+                entry = containers[name]
+                expired = position >= keep and _age_seconds(entry["last_used"]) > idle_timeout
+                if expired or not self._usable(entry, image_id) or not self._healthy(name):
+                    removed.append(name)
+            for name, entry in containers.items():
+                if entry["state"] == "leased" and not _pid_alive(entry.get("pid"), entry.get("pid_start_time")):
+                    reclaimed.append(name)
+        for name in removed:
+            self.log(f"Removing pool container {name}.")
+            self._forget(name)
+        for name in reclaimed:
+            self.log(f"Build {containers[name].get('build_id')} holding {name} is gone, resetting the container.")
+            self.release(name)
+        return removed, reclaimed
+
+    def drain(self):
+        """Removes every idle container; leased ones stay until their build has finished."""
+        removed, _ = self.reap(idle_timeout=-1)
+        return removed
+
+    def status(self):
+        with cache_lock(self.pool_dir):
+            return self._load()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the pool of pre-started builder containers used by local_kernel_build.py --pool.")
+    parser.add_argument("--pool-dir", default=DEFAULT_POOL_DIR, help=f"Pool state directory. Default is {DEFAULT_POOL_DIR}.")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help=f"Builder image. Default is {DEFAULT_IMAGE}.")
+    parser.add_argument("--compiler-cache-dir", default=DEFAULT_COMPILER_CACHE_DIR, help="Host compiler cache directory mounted into the containers.")
+    parser.add_argument("--docker-backend", choices=["cli", "api"], default="cli", help="Control the containers through the docker command (\"cli\") or the Engine API socket (\"api\"). Default is \"cli\".")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm_parser = subparsers.add_parser("warm", help="Start containers until the pool has the given size.")
+    warm_parser.add_argument("--size", type=int, default=2)
+    subparsers.add_parser("status", help="List the pool containers.")
+    reap_parser = subparsers.add_parser("reap", help="Remove idle, outdated and stopped containers and release leases of dead builds.")
+    reap_parser.add_argument("--idle-timeout", type=int, default=3600, help="Seconds a container may stay idle. Default is 3600.")
+    reap_parser.add_argument("--keep", type=int, default=0, help="Number of idle containers kept regardless of the timeout.")
+    subparsers.add_parser("drain", help="Remove all idle containers.")
+    maintain_parser = subparsers.add_parser("maintain", help="Keep the pool warm and reaped until interrupted.")
+    maintain_parser.add_argument("--size", type=int, default=2)
+    maintain_parser.add_argument("--idle-timeout", type=int, default=3600)
+    maintain_parser.add_argument("--interval", type=int, default=60, help="Seconds between checks. Default is 60.")
+
+    args = parser.parse_args()
+    try:
+        pool = ContainerPool(args.pool_dir, args.image, args.compiler_cache_dir,
+                             docker=DockerClient() if args.docker_backend == "api" else DockerCli())
+        if args.command == "warm":
+            pool.warm(args.size)
+        elif args.command == "status":
+            containers = pool.status()
+            for name, entry in sorted(containers.items()):
+                detail = f"build {entry['build_id']}" if entry["state"] == "leased" else f"last used {entry['last_used']}"
+                print(f"{name:<30} {entry['state']:<7} {entry.get('builds', 0):>4} builds  {detail}")
+            print(f"{len(containers)} containers")
+        elif args.command == "reap":
+            removed, reclaimed = pool.reap(args.idle_timeout, args.keep)
+            print(f"Removed {len(removed)} containers, reclaimed {len(reclaimed)} leases.")
+        elif args.command == "drain":
+            print(f"Removed {len(pool.drain())} containers.")
+        elif args.command == "maintain":
+            while True:
+                # The idle timeout never shrinks the pool below --size
+                pool.reap(args.idle_timeout, keep=args.size)
+                pool.warm(args.size)
+                time.sleep(args.interval)
+    except subprocess.CalledProcessError as e:
+        print(f">>> ERROR: {e}: {e.stderr}", file=sys.stderr)
+        sys.exit(1)
+    except DockerAPIError as e:
+        print(f">>> ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
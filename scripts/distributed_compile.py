@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import concurrent.futures
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_PORT = 3632
+DEFAULT_SLOTS = 4
+# distccmon-text lines end with the host and slot a job runs on: "  4193  Compile  fork.c  10.0.0.2[1]"
+MONITOR_JOB_PATTERN = re.compile(r"^\s*\d+\s+\S+.*\s(\S+)\[(\d+)\]\s*$")
+
+DistccHost = collections.namedtuple("DistccHost", ["host", "port", "slots"])
+
+
+def parse_hosts(spec):
+    """
+    Parses "host[:port][/slots]" entries separated by spaces or commas,
+    e.g. "buildbox1/16 buildbox2:3633/8". Slots default to 4 as in distcc.
+    """
+    hosts = []
+    for entry in re.split(r"[\s,]+", spec.strip()):
+        if not entry:
+            continue
+        match = re.match(r"^([^:/]+)(?::(\d+))?(?:/(\d+))?$", entry)
+        if not match:
+            raise ValueError(f"Invalid distcc host '{entry}', expected host[:port][/slots].")
+        hosts.append(DistccHost(match.group(1), int(match.group(2) or DEFAULT_PORT), int(match.group(3) or DEFAULT_SLOTS)))
+    return hosts
+
+
+def probe_host(host, timeout=1.0):
+    try:
+        with socket.create_connection((host.host, host.port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class DistccCluster:
+    """
+    Describes how distcc is wired into the kernel build, like CompilerCache:
+    the hosts that answered the probe, the environment and make variables,
+    and the -j that keeps every remote slot busy. Unreachable hosts are left
+    out; with none left the build compiles locally. Behind ccache, distcc
+    runs as CCACHE_PREFIX, so only cache misses go over the network.
+    """
+
+    def __init__(self, hosts, local_slots, state_dir):
+        self.hosts = hosts
+        self.local_slots = local_slots
+        self.state_dir = state_dir
+        self.reachable = []
+
+    def probe(self, timeout=1.0):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.hosts))) as executor:
+            answers = list(executor.map(lambda host: probe_host(host, timeout), self.hosts))
+        self.reachable = [host for host, answered in zip(self.hosts, answers) if answered]
+        return self.reachable
+
+    @property
+    def active(self):
+        return bool(self.reachable)
+
+    def remote_slots(self):
+        return sum(host.slots for host in self.reachable)
+
+    def make_jobs(self, requested_jobs):
+        """Enough jobs for every remote slot plus the local ones, never fewer than requested."""
+        if not self.active:
+            return requested_jobs
+        return max(requested_jobs, self.remote_slots() + self.local_slots)
+
+    def hosts_value(self):
+        # Preprocessing and linking stay local, "localhost" also takes compile jobs
+        entries = [f"{host.host}:{host.port}/{host.slots}" for host in self.reachable]
+        return " ".join(entries + [f"localhost/{self.local_slots}"])
+
+    def environment(self, behind_ccache=False):
+        if not self.active:
+            return {}
+        environment = {
+            "DISTCC_HOSTS": self.hosts_value(),
+            # distccmon-text reads the job states from here
+            "DISTCC_DIR": self.state_dir,
+            # Compile locally when a host fails, and leave it alone for a minute
+            "DISTCC_FALLBACK": "1",
+            "DISTCC_BACKOFF_PERIOD": "60",
+        }
+        if behind_ccache:
+            environment["CCACHE_PREFIX"] = "distcc"
+        return environment
+
+    def compiler(self):
+        return "distcc gcc"
+
+
+class DistccMonitor:
+    """
+    Polls distccmon-text every `interval` seconds while a stage compiles and
+    counts the busy slots per host. The utilization of a host is its mean
+    number of busy slots over all samples divided by its slots.
+
+    distccmon-text names the host of a remote job by the host name of its
+    DISTCC_HOSTS entry, without the port, and local jobs "localhost". Entries
+    that differ only in their port, e.g. several distccd on one machine, are
+    therefore reported together as one row with their slots summed.
+    """
+
+    def __init__(self, cluster, interval=1.0):
+        self.cluster = cluster
+        self.interval = interval
+        self.samples = 0
+        self.busy = collections.Counter()
+        self.available = True
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, output):
+        """Counts the jobs of one distccmon-text listing."""
+        self.samples += 1
+        for line in output.splitlines():
+            match = MONITOR_JOB_PATTERN.match(line)
+            if match:
+                self.busy[match.group(1)] += 1
+
+    def _sample(self):
+        try:
+            process = subprocess.run(["distccmon-text"], capture_output=True, text=True,
+                                     env=dict(os.environ, DISTCC_DIR=self.cluster.state_dir))
+        except FileNotFoundError:
+            self.available = False
+            return
+        self.record(process.stdout)
+
+    def _loop(self):
+        while self.available and not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def utilization(self):
+        # The local compile jobs are the "localhost/<slots>" entry of DISTCC_HOSTS
+        local = DistccHost("localhost", None, self.cluster.local_slots)
+        groups = collections.OrderedDict()
+        for host in self.cluster.hosts + [local]:
+            groups.setdefault(host.host, []).append(host)
+        rows = []
+        for name, hosts in groups.items():
+            reachable = [host for host in hosts if host is local or host in self.cluster.reachable]
+            # A job is listed once, under the bare name or, should distccmon-text
+            # ever print it, under the host:port of its entry
+            tokens = {name} | {f"{host.host}:{host.port}" for host in hosts if host is not local}
+            busy = sum(count for token, count in self.busy.items() if token in tokens)
+            mean_busy = busy / self.samples if self.samples else 0.0
+            slots = sum(host.slots for host in reachable)
+            rows.append({
+                "host": ", ".join(name if host is local else f"{host.host}:{host.port}" for host in hosts),
+                "slots": slots or sum(host.slots for host in hosts),
+                "reachable": bool(reachable),
+                "mean_busy_slots": round(mean_busy, 2),
+                "utilization_percent": round(100.0 * mean_busy / slots, 1) if slots else 0.0,
+            })
+        return rows
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _self_check_source(n):
+    # Enough code for each compile to take a noticeable moment
+    functions = "".join(f"int f{n}_{i}(int x) {{ int s = 0; for (int k = 0; k < x; k++) s += k * {i} % 7; return s; }}\n" for i in range(40))
+    return f"{functions}int main_{n}(void) {{ return f{n}_1(3); }}\n"
+
+
+def self_check(daemons, slots=2, local_slots=1, log=print):
+    """
+    Starts `daemons` distccd on 127.0.0.1, each on its own port, and compiles
+    C files through distcc with the environment a build would get. Returns
+    the compiles that failed, the jobs each daemon served (from its log) and
+    the DistccMonitor utilization.
+    """
+    for tool in ("distccd", "distcc", "gcc"):
+        if not shutil.which(tool):
+            raise RuntimeError(f"{tool} not found, the self-check needs distcc and gcc installed.")
+    with tempfile.TemporaryDirectory(prefix="distcc-self-check-") as work_dir:
+        ports = [_free_port() for _ in range(daemons)]
+        processes = []
+        try:
+            for port in ports:
+                processes.append(subprocess.Popen([
+                    "distccd", "--daemon", "--no-detach", "--listen", "127.0.0.1", "--allow", "127.0.0.1",
+                    "--port", str(port), "--jobs", str(slots),
+                    "--log-file", os.path.join(work_dir, f"distccd-{port}.log"), "--log-level", "info",
+                ]))
+            cluster = DistccCluster([DistccHost("127.0.0.1", port, slots) for port in ports], local_slots,
+                                    state_dir=os.path.join(work_dir, "distcc"))
+            os.makedirs(cluster.state_dir)
+            deadline = time.monotonic() + 10
+            while len(cluster.probe()) < daemons:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Only {len(cluster.reachable)} of {daemons} distccd answered.")
+                time.sleep(0.2)
+            log(f"DISTCC_HOSTS=\"{cluster.hosts_value()}\"")
+
+            sources = []
+            for n in range(4 * cluster.remote_slots()):
+                sources.append(os.path.join(work_dir, f"unit{n}.c"))
+                with open(sources[-1], "w", encoding='utf-8') as f:
+                    f.write(_self_check_source(n))
+            environment = dict(os.environ, **cluster.environment())
+            compile_command = cluster.compiler().split()
+
+            def compile_source(source):
+                process = subprocess.run(compile_command + ["-O2", "-c", source, "-o", source[:-2] + ".o"],
+                                         capture_output=True, text=True, env=environment)
+                return process.returncode
+
+            monitor = DistccMonitor(cluster, interval=0.1)
+            monitor.start()
+            try:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=cluster.make_jobs(1)) as executor:
+                    returncodes = list(executor.map(compile_source, sources))
+            finally:
+                monitor.stop()
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+        served = {}
+        for port in ports:
+            try:
+                with open(os.path.join(work_dir, f"distccd-{port}.log"), encoding='utf-8', errors='replace') as f:
+                    served[port] = f.read().count("COMPILE_OK")
+            except FileNotFoundError:
+                served[port] = 0
+    return {
+        "compiles": len(sources),
+        "failed": sum(1 for returncode in returncodes if returncode != 0),
+        "served": served,
+        "utilization": monitor.utilization() if monitor.available else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check distcc hosts and show the make jobs a build would use.")
+    parser.add_argument("hosts", nargs="?", help="Hosts as \"host[:port][/slots] ...\", e.g. \"buildbox1/16 buildbox2:3633/8\".")
+    parser.add_argument("--local-slots", type=int, default=2, help="Compile jobs kept on this machine. Default is 2.")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Seconds to wait for each host. Default is 1.")
+    parser.add_argument("--self-check", type=int, default=None, metavar="DAEMONS",
+                        help="Instead of checking hosts, start this many distccd on 127.0.0.1 and compile through them.")
+    parser.add_argument("--slots", type=int, default=2, help="Slots of each self-check distccd. Default is 2.")
+    args = parser.parse_args()
+
+    if args.self_check:
+        try:
+            result = self_check(args.self_check, args.slots, args.local_slots)
+        except RuntimeError as e:
+            print(f">>> ERROR: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"{result['compiles'] - result['failed']} of {result['compiles']} compiles succeeded")
+        for port, jobs in result["served"].items():
+            print(f"127.0.0.1:{port:<6} {jobs:>3} jobs")
+        for host in result["utilization"] or []:
+            print(f"{host['host']}: {host['mean_busy_slots']} of {host['slots']} slots busy on average ({host['utilization_percent']}%)")
+        if result["utilization"] is None:
+            print("distccmon-text not found, no utilization recorded.")
+        if result["failed"] or not all(result["served"].values()):
+            sys.exit(1)
+        return
+    if not args.hosts:
+        parser.error("hosts are required unless --self-check is given")
+
+    try:
+        cluster = DistccCluster(parse_hosts(args.hosts), args.local_slots, state_dir=None)
+    except ValueError as e:
+        print(f">>> ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    cluster.probe(args.timeout)
+    for host in cluster.hosts:
+        print(f"{host.host}:{host.port:<6} {host.slots:>3} slots  {'reachable' if host in cluster.reachable else 'unreachable'}")
+    if not cluster.active:
+        print("No host reachable, builds would compile locally.")
+        sys.exit(1)
+    print(f"DISTCC_HOSTS=\"{cluster.hosts_value()}\"")
+    print(f"make -j{cluster.make_jobs(1)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+import argparse
+import codecs
+import collections
+import datetime
+import http.client
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.command_runner import DEFAULT_TAIL_LINES, CommandResult, run_streaming
+
+DEFAULT_SOCKET_PATH = "/var/run/docker.sock"
+# Timeout of ordinary API calls; exec output and stats are read without one
+REQUEST_TIMEOUT = 60
+# Stream types of the multiplexed exec/attach stream (no TTY)
+STREAM_STDOUT = 1
+STREAM_STDERR = 2
+
+
+class DockerAPIError(RuntimeError):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def docker_socket_path():
+    """The Engine socket from DOCKER_HOST (unix:// only), or the default one."""
+    docker_host = os.environ.get("DOCKER_HOST")
+    if not docker_host:
+        return DEFAULT_SOCKET_PATH
+    if not docker_host.startswith("unix://"):
+        raise DockerAPIError(f"DOCKER_HOST={docker_host} is not a unix socket, use --docker-backend cli.")
+    return docker_host[len("unix://"):]
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP/1.1 over a unix socket, the transport of the Docker Engine API."""
+
+    def __init__(self, socket_path, timeout=REQUEST_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _read_exact(response, size):
+    data = b""
+    while len(data) < size:
+        chunk = response.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def demux_stream(response):
+    """
+    Yields (stream type, payload) for every frame of a multiplexed stream: an
+    8 byte header (stream type, three zero bytes, big-endian payload size)
+    followed by the payload.
+    """
+    while True:
+        header = _read_exact(response, 8)
+        if len(header) < 8:
+            return
+        stream_type, size = struct.unpack(">BxxxL", header)
+        yield stream_type, _read_exact(response, size)
+
+
+class _LineSplitter:
+    """Turns arbitrarily cut stream frames into complete lines for a callback."""
+
+    def __init__(self, callback, tail_lines):
+        self.callback = callback
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.pending = ""
+        self.tail = collections.deque(maxlen=tail_lines)
+
+    def _emit(self, line):
+        self.tail.append(line)
+        if self.callback:
+            self.callback(line)
+
+    def feed(self, data, final=False):
+        lines = (self.pending + self.decoder.decode(data, final)).split("\n")
+        self.pending = lines.pop()
+        for line in lines:
+            self._emit(line)
+        if final and self.pending:
+            self._emit(self.pending)
+            self.pending = ""
+
+
+class DockerClient:
+    """
+    Minimal Docker Engine API client over the unix socket, covering what the
+    builds need: containers, image inspection, exec with streamed output and
+    stats. Every call
+    opens its own connection, so the client can be shared between threads.
+    Paths carry no API version prefix, i.e. the daemon's current version.
+    """
+
+    name = "api"
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or docker_socket_path()
+
+    def _open(self, method, path, params=None, body=None, timeout=REQUEST_TIMEOUT):
+        if params:
+            path += "?" + urllib.parse.urlencode(params)
+        headers = {"Host": "docker"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        connection = UnixHTTPConnection(self.socket_path, timeout=timeout)
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            return connection, connection.getresponse()
+        except OSError as e:
+            connection.close()
+            raise DockerAPIError(f"Cannot reach the Docker daemon at {self.socket_path}: {e}") from e
+
+    def _request(self, method, path, params=None, body=None, ignore=()):
+        """Returns the decoded JSON response (None if empty or in `ignore`d statuses)."""
+        connection, response = self._open(method, path, params, body)
+        try:
+            data = response.read()
+        finally:
+            connection.close()
+        if response.status in ignore:
+            return None
+        if response.status >= 400:
+            try:
+                message = json.loads(data)["message"]
+            except (ValueError, KeyError, TypeError):
+                message = data.decode("utf-8", "replace").strip()
+            raise DockerAPIError(f"{method} {path}: {response.status} {message}", response.status)
+        return json.loads(data) if data else None
+
+    def ping(self):
+        connection, response = self._open("GET", "/_ping")
+        try:
+            return response.status == 200 and response.read() == b"OK"
+        finally:
+            connection.close()
+
+    def inspect_image(self, image):
+        """The image's inspect data (Id, Config.Labels, ...), None if there is no such image."""
+        return self._request("GET", f"/images/{image}/json", ignore=(404,))
+
+    def inspect_container(self, name):
+        """The container's inspect data (State.Running, ...), None if there is no such container."""
+        return self._request("GET", f"/containers/{name}/json", ignore=(404,))
+
+    def remove_container(self, name, force=True):
+        self._request("DELETE", f"/containers/{name}", {"force": "true" if force else "false"}, ignore=(404,))
+
+    def pull_image(self, image):
+        """
+        Pulls an image like `docker pull`. The daemon answers 200 right away
+        and reports progress, and errors, as a stream of JSON objects.
+        """
+        repository, tag = image, "latest"
+        # A ":" before the last "/" belongs to a registry port
+        if ":" in image.rsplit("/", 1)[-1]:
+            repository, tag = image.rsplit(":", 1)
+        connection, response = self._open("POST", "/images/create", {"fromImage": repository, "tag": tag}, timeout=None)
+        try:
+            body = response.read().decode("utf-8", "replace")
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise DockerAPIError(f"Pulling {image} failed: {response.status} {body.strip()}", response.status)
+        for line in body.splitlines():
+            try:
+                progress = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(progress, dict) and progress.get("error"):
+                raise DockerAPIError(f"Pulling {image} failed: {progress['error']}")
+
+    def run_container(self, name, image, command, volumes=(), environment=None, labels=None):
+        """
+        Creates and starts a detached container. `volumes` are "host:container"
+        binds. A missing image is pulled first, as `docker run` does.
+        """
+        body = {
+            "Image": image,
+            "Cmd": list(command),
+            "Env": [f"{key}={value}" for key, value in (environment or {}).items()],
+            "Labels": labels or {},
+            "HostConfig": {"Binds": list(volumes)},
+        }
+        try:
+            created = self._request("POST", "/containers/create", {"name": name}, body=body)
+        except DockerAPIError as e:
+            if e.status != 404:
+                raise
+            self.pull_image(image)
+            created = self._request("POST", "/containers/create", {"name": name}, body=body)
+        # 304: already running
+        self._request("POST", f"/containers/{created['Id']}/start", ignore=(304,))
+        return created["Id"]
+
+    def stop_container(self, name, timeout=10):
+        self._request("POST", f"/containers/{name}/stop", {"t": timeout}, ignore=(304, 404))
+
+    def exec_run(self, container, command, on_stdout=None, on_stderr=None, environment=None, tail_lines=DEFAULT_TAIL_LINES):
+        """
+        Runs a command in a running container and hands its stdout/stderr to
+        the callbacks line by line as the frames arrive. Returns a
+        CommandResult with the exit code and the last lines of each stream.
+        The Engine API cannot end an exec, so if a callback raises (or the
+        stream breaks) the container is stopped before the error is passed on,
+        rather than leaving the command running in it.
+        """
+        created = self._request("POST", f"/containers/{container}/exec", body={
+            "Cmd": list(command),
+            "Env": [f"{key}={value}" for key, value in (environment or {}).items()],
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": False,
+        })
+        exec_id = created["Id"]
+        splitters = {STREAM_STDOUT: _LineSplitter(on_stdout, tail_lines), STREAM_STDERR: _LineSplitter(on_stderr, tail_lines)}
+        # A build runs for hours without necessarily printing anything
+        connection, response = self._open("POST", f"/exec/{exec_id}/start", body={"Detach": False, "Tty": False}, timeout=None)
+        try:
+            if response.status >= 400:
+                raise DockerAPIError(f"Starting exec in {container} failed: {response.status} {response.read().decode('utf-8', 'replace').strip()}", response.status)
+            try:
+                for stream_type, payload in demux_stream(response):
+                    if stream_type in splitters:
+                        splitters[stream_type].feed(payload)
+            except BaseException:
+                self._stop_exec(container)
+                raise
+        finally:
+            connection.close()
+        for splitter in splitters.values():
+            splitter.feed(b"", final=True)
+        return CommandResult(command, self._exec_exit_code(exec_id),
+                             "\n".join(splitters[STREAM_STDOUT].tail), "\n".join(splitters[STREAM_STDERR].tail))
+
+    def _stop_exec(self, container):
+        try:
+            self.stop_container(container)
+        except DockerAPIError:
+            # The original error matters more than this one
+            pass
+
+    def _exec_exit_code(self, exec_id):
+        # The stream can close a moment before the daemon has recorded the exit code
+        for _ in range(50):
+            state = self._request("GET", f"/exec/{exec_id}/json")
+            if not state["Running"] and state["ExitCode"] is not None:
+                return state["ExitCode"]
+            time.sleep(0.1)
+        raise DockerAPIError(f"Exec {exec_id} did not report an exit code.")
+
+    def stats(self, container):
+        """One stats snapshot; the daemon waits for a second sample to fill in precpu_stats."""
+        return self._request("GET", f"/containers/{container}/stats", {"stream": "false"})
+
+
+class DockerCli:
+    """The same operations as DockerClient through the docker command line tool."""
+
+    name = "cli"
+
+    def _inspect(self, kind, name):
+        process = subprocess.run(["docker", kind, "inspect", name], capture_output=True, text=True)
+        return json.loads(process.stdout)[0] if process.returncode == 0 else None
+
+    def inspect_image(self, image):
+        return self._inspect("image", image)
+
+    def inspect_container(self, name):
+        return self._inspect("container", name)
+
+    def remove_container(self, name, force=True):
+        subprocess.run(["docker", "rm"] + (["-f"] if force else []) + [name], capture_output=True, text=True)
+
+    def run_container(self, name, image, command, volumes=(), environment=None, labels=None):
+        docker_command = ["docker", "run", "-d", "--name", name]
+        for volume in volumes:
+            docker_command += ["-v", volume]
+        for key, value in (environment or {}).items():
+            docker_command += ["-e", f"{key}={value}"]
+        for key, value in (labels or {}).items():
+            docker_command += ["--label", f"{key}={value}"]
+        process = subprocess.run(docker_command + [image] + list(command), capture_output=True, text=True, check=True)
+        return process.stdout.strip()
+
+    def stop_container(self, name, timeout=10):
+        subprocess.run(["docker", "stop", "-t", str(timeout), name], capture_output=True, text=True)
+
+    def exec_run(self, container, command, on_stdout=None, on_stderr=None, environment=None, tail_lines=DEFAULT_TAIL_LINES):
+        docker_command = ["docker", "exec"]
+        for key, value in (environment or {}).items():
+            docker_command += ["-e", f"{key}={value}"]
+        return run_streaming(docker_command + [container] + list(command),
+                             on_stdout=on_stdout, on_stderr=on_stderr, tail_lines=tail_lines)
+
+
+def summarize_stats(stats):
+    """CPU, memory and block I/O figures of one /containers/{id}/stats snapshot."""
+    cpu = stats.get("cpu_stats") or {}
+    precpu = stats.get("precpu_stats") or {}
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online_cpus = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    # Like `docker stats`: 100% per fully used CPU
+    cpu_percent = round(100.0 * online_cpus * cpu_delta / system_delta, 1) if system_delta > 0 and cpu_delta >= 0 else None
+
+    memory = stats.get("memory_stats") or {}
+    memory_stats = memory.get("stats") or {}
+    # Page cache that can be dropped is not counted (cgroup v2 and v1 names)
+    inactive_file = memory_stats.get("inactive_file", memory_stats.get("total_inactive_file", 0))
+    memory_bytes = max(0, memory.get("usage", 0) - inactive_file)
+
+    read_bytes = write_bytes = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        if entry.get("op", "").lower() == "read":
+            read_bytes += entry.get("value", 0)
+        elif entry.get("op", "").lower() == "write":
+            write_bytes += entry.get("value", 0)
+
+    return {
+        "cpu_percent": cpu_percent,
+        "memory_bytes": memory_bytes,
+        "memory_limit_bytes": memory.get("limit"),
+        "block_read_bytes": read_bytes,
+        "block_write_bytes": write_bytes,
+        "pids": (stats.get("pids_stats") or {}).get("current"),
+    }
+
+
+class ContainerStatsSampler:
+    """
+    Samples a container's CPU, memory and block I/O through the Engine API
+    every `interval` seconds while a build runs in it. Each sample is appended
+    to `samples_path` (JSONL). Block I/O counters are cumulative since the
+    container started (pool containers run several builds), so the summary
+    reports the growth between the first and the last sample.
+    """
+
+    def __init__(self, client, container, interval=5.0, samples_path=None):
+        self.client = client
+        self.container = container
+        self.interval = interval
+        self.samples_path = samples_path
+        self.samples = []
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        samples_f = open(self.samples_path, "a", encoding='utf-8') if self.samples_path else None
+        try:
+            while not self._stop.is_set():
+                try:
+                    sample = summarize_stats(self.client.stats(self.container))
+                except (DockerAPIError, OSError, ValueError):
+                    self.errors += 1
+                else:
+                    self.samples.append(sample)
+                    if samples_f:
+                        samples_f.write(json.dumps(dict(sample, time=datetime.datetime.now().isoformat(timespec="seconds"))) + "\n")
+                        samples_f.flush()
+                self._stop.wait(self.interval)
+        finally:
+            if samples_f:
+                samples_f.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        cpu_samples = [sample["cpu_percent"] for sample in self.samples if sample["cpu_percent"] is not None]
+        first = self.samples[0] if self.samples else {}
+        last = self.samples[-1] if self.samples else {}
+        return {
+            "samples": len(self.samples),
+            "failed_samples": self.errors,
+            "cpu_percent_mean": round(sum(cpu_samples) / len(cpu_samples), 1) if cpu_samples else None,
+            "cpu_percent_max": max(cpu_samples) if cpu_samples else None,
+            "memory_peak_bytes": max((sample["memory_bytes"] for sample in self.samples), default=None),
+            "memory_limit_bytes": last.get("memory_limit_bytes"),
+            "block_read_bytes": last.get("block_read_bytes", 0) - first.get("block_read_bytes", 0),
+            "block_write_bytes": last.get("block_write_bytes", 0) - first.get("block_write_bytes", 0),
+            "pids_max": max((sample["pids"] for sample in self.samples if sample["pids"] is not None), default=None),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query a container through the Docker Engine API.")
+    parser.add_argument("--socket", default=None, help=f"Engine API socket. Default is DOCKER_HOST or {DEFAULT_SOCKET_PATH}.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ping", help="Check that the daemon answers.")
+    stats_parser = subparsers.add_parser("stats", help="Print one CPU/memory/block I/O sample of a container.")
+    stats_parser.add_argument("container")
+    exec_parser = subparsers.add_parser("exec", help="Run a command in a container, streaming its output.")
+    exec_parser.add_argument("container")
+    exec_parser.add_argument("exec_command", nargs=argparse.REMAINDER)
+
+    args = parser.parse_args()
+    try:
+        client = DockerClient(args.socket)
+        if args.command == "ping":
+            print("OK" if client.ping() else "no answer")
+        elif args.command == "stats":
+            print(json.dumps(summarize_stats(client.stats(args.container)), indent=2))
+        elif args.command == "exec":
+            result = client.exec_run(args.container, args.exec_command,
+                                     on_stdout=print, on_stderr=lambda line: print(line, file=sys.stderr))
+            sys.exit(result.returncode)
+    except DockerAPIError as e:
+        print(f">>> ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import hashlib
+import os
+import re
+import sys
+import tempfile
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+CONFIG_PREFIX = "CONFIG_"
+NOT_SET_SUFFIX = " is not set"
+VALUE_PATTERN = re.compile(r'^(?:[ymn]|-?\d+|0x[0-9a-fA-F]+|"(?:[^"\\]|\\.)*")$')
+HEADER_VERSION_PATTERN = re.compile(r"^# Linux/\S+ (\S+) Kernel Configuration$")
+KCONFIG_SYMBOL_PATTERN = re.compile(r"^\s*(?:menu)?config\s+([A-Za-z0-9_]+)\s*$", re.MULTILINE)
+
+# Detected by olddefconfig from the toolchain in use, not chosen by the config
+# author; ignored by fingerprints and the dropped symbols check so another
+# compiler version does not count as a config change
+TOOLCHAIN_SYMBOLS = re.compile(
+    r"^(?:CC_VERSION_TEXT|(?:GCC|CLANG|AS|LD|LLD|RUSTC|RUSTC_LLVM|PAHOLE|BINDGEN)_VERSION"
+    r"|(?:CC|AS|LD|RUSTC|PAHOLE)_(?:HAS|CAN|IS)_\w+|TOOLS_SUPPORT_\w+)$"
+)
+
+# Options that make a build a lot slower or bigger than a plain one
+EXPENSIVE_OPTIONS = {
+    "DEBUG_INFO": "DWARF debug info multiplies compile and link time and the size of the object tree",
+    "DEBUG_INFO_BTF": "runs pahole over vmlinux and every module",
+    "MODULE_SIG_ALL": "signs every module during modules_install",
+    "KASAN": "instruments every memory access",
+    "UBSAN": "instruments undefined behaviour checks",
+    "KCOV": "instruments every basic block for coverage",
+    "GCOV_KERNEL": "gcov profiling of the kernel",
+    "LTO_CLANG_FULL": "full LTO links vmlinux as one unit",
+    "LTO_CLANG_THIN": "thin LTO adds a long link step",
+}
+
+ConfigIssue = collections.namedtuple("ConfigIssue", "level symbol message")
+
+
+class KernelConfig:
+    """
+    Symbol table of a kernel .config: symbol name (without CONFIG_) -> value
+    as written ("y", "m", "n" for "is not set", numbers and quoted strings).
+    Malformed and duplicate lines are kept in `errors`/`duplicates`.
+    """
+
+    def __init__(self, symbols=None, kernel_version=None, errors=None, duplicates=None, path=None):
+        self.symbols = symbols or {}
+        self.kernel_version = kernel_version
+        self.errors = errors or []
+        self.duplicates = duplicates or []
+        self.path = path
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            config = cls.from_lines(f)
+        config.path = path
+        return config
+
+    @classmethod
+    def from_lines(cls, lines):
+        symbols = {}
+        errors = []
+        duplicates = []
+        kernel_version = None
+        for number, line in enumerate(lines, 1):
+            line = line.rstrip("\n")
+            if line.startswith(CONFIG_PREFIX):
+                name, sep, value = line[len(CONFIG_PREFIX):].partition("=")
+                if not sep or not name or not VALUE_PATTERN.match(value):
+                    errors.append((number, line))
+                    continue
+            elif line.startswith("# " + CONFIG_PREFIX) and line.endswith(NOT_SET_SUFFIX):
+                name = line[2 + len(CONFIG_PREFIX):-len(NOT_SET_SUFFIX)]
+                value = "n"
+            elif not line.strip() or line.startswith("#"):
+                if kernel_version is None and line.startswith("# Linux/"):
+                    match = HEADER_VERSION_PATTERN.match(line)
+                    if match:
+                        kernel_version = match.group(1)
+                continue
+            else:
+                errors.append((number, line))
+                continue
+            if name in symbols:
+                duplicates.append((number, name))
+            symbols[name] = value
+        return cls(symbols, kernel_version, errors, duplicates)
+
+    def get(self, name):
+        return self.symbols.get(name, "n")
+
+    def enabled(self, name):
+        return self.get(name) in ("y", "m")
+
+    def fingerprint(self):
+        """
+        SHA-256 over the sorted symbol assignments. Comments, ordering, "is not
+        set" lines (same as absent) and toolchain version symbols do not count.
+        """
+        digest = hashlib.sha256()
+        for name in sorted(self.symbols):
+            value = self.symbols[name]
+            if value != "n" and not TOOLCHAIN_SYMBOLS.match(name):
+                digest.update(f"{name}={value}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def counts(self):
+        values = collections.Counter(self.symbols.values())
+        return {"builtin": values["y"], "modules": values["m"], "disabled": values["n"], "total": len(self.symbols)}
+
+
+def diff_configs(old, new):
+    """
+    Returns the symbols added to, removed from and changed between two configs.
+    An absent symbol counts as "n", like in the kernel, so "is not set" lines
+    coming or going make no difference.
+    """
+    added = {}
+    removed = {}
+    changed = {}
+    for name in old.symbols.keys() | new.symbols.keys():
+        old_value, new_value = old.get(name), new.get(name)
+        if old_value == new_value:
+            continue
+        if name not in old.symbols:
+            added[name] = new_value
+        elif name not in new.symbols:
+            removed[name] = old_value
+        else:
+            changed[name] = (old_value, new_value)
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def dropped_symbols(requested, resolved):
+    """
+    Symbols the config asked for that olddefconfig did not keep: unknown to this
+    kernel version or with unmet dependencies. Returns name -> (requested, resolved).
+    """
+    return {
+        name: (value, resolved.get(name))
+        for name, value in requested.symbols.items()
+        if value != "n" and resolved.get(name) != value and not TOOLCHAIN_SYMBOLS.match(name)
+    }
+
+
+def scan_kconfig_symbols(source_dir):
+    """Collects every symbol declared by a "config" or "menuconfig" entry in the Kconfig files of a source tree."""
+    symbols = set()
+    for directory, dirnames, filenames in os.walk(source_dir):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for filename in filenames:
+            if filename.startswith("Kconfig"):
+                with open(os.path.join(directory, filename), encoding='utf-8', errors='replace') as f:
+                    symbols.update(KCONFIG_SYMBOL_PATTERN.findall(f.read()))
+    return symbols
+
+
+class KconfigSymbolCache:
+    """
+    Known Kconfig symbols per kernel version, one name per line in
+    <cache_dir>/linux-<version>.symbols. Filled after the first extraction of
+    a version, so later builds can spot unknown symbols before extracting.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def path(self, kernel_version):
+        return os.path.join(self.cache_dir, f"linux-{kernel_version}.symbols")
+
+    def load(self, kernel_version):
+        path = self.path(kernel_version)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return set(f.read().split()) or None
+
+    def store(self, kernel_version, symbols):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            f.write("\n".join(sorted(symbols)) + "\n")
+        os.replace(tmp_path, self.path(kernel_version))
+
+
+def validate_config(config, kernel_version=None, known_symbols=None, strict=False):
+    """
+    Checks a parsed config before anything expensive runs. Returns a list of
+    ConfigIssue; with `strict`, warnings are reported as errors.
+    """
+    issues = []
+    warning = "error" if strict else "warning"
+    if not config.symbols:
+        issues.append(ConfigIssue("error", None, "no CONFIG_ symbols found, is this a kernel .config?"))
+    for number, line in config.errors:
+        issues.append(ConfigIssue("error", None, f"line {number}: malformed line: {line!r}"))
+    for number, name in config.duplicates:
+        issues.append(ConfigIssue(warning, name, f"line {number}: CONFIG_{name} assigned more than once, the last value wins"))
+    if kernel_version and config.kernel_version and config.kernel_version != kernel_version:
+        issues.append(ConfigIssue(warning, None, f"config was generated for {config.kernel_version}, building {kernel_version}"))
+    for name, reason in EXPENSIVE_OPTIONS.items():
+        if config.enabled(name):
+            issues.append(ConfigIssue(warning, name, f"CONFIG_{name} is enabled: {reason}"))
+    if known_symbols is not None:
+        for name in sorted(config.symbols):
+            if config.symbols[name] != "n" and name not in known_symbols:
+                issues.append(ConfigIssue(warning, name, f"CONFIG_{name} does not exist in this kernel version, olddefconfig will drop it"))
+    return issues
+
+
+def print_issues(issues, log=print):
+    for issue in issues:
+        log(f"{issue.level.upper()}: {issue.message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, compare and validate kernel .config files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = subparsers.add_parser("diff", help="Show the symbols that differ between two configs.")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+
+    fingerprint_parser = subparsers.add_parser("fingerprint", help="Print the fingerprint of one or more configs.")
+    fingerprint_parser.add_argument("configs", nargs="+")
+
+    validate_parser = subparsers.add_parser("validate", help="Check a config for malformed lines, expensive options and unknown symbols. Exits with 1 on errors.")
+    validate_parser.add_argument("config")
+    validate_parser.add_argument("--kernel-version", help="Kernel version the config is built for.")
+    validate_parser.add_argument("--symbol-cache", default=os.path.join(repo_root, "build-cache", "kconfig-symbols"), help="Directory of the known symbols per kernel version.")
+    validate_parser.add_argument("--strict", action="store_true", help="Treat warnings as errors.")
+
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        diff = diff_configs(KernelConfig.from_file(args.old), KernelConfig.from_file(args.new))
+        for name in sorted(diff["removed"]):
+            print(f"-CONFIG_{name}={diff['removed'][name]}")
+        for name in sorted(diff["added"]):
+            print(f"+CONFIG_{name}={diff['added'][name]}")
+        for name in sorted(diff["changed"]):
+            old_value, new_value = diff["changed"][name]
+            print(f" CONFIG_{name} {old_value} -> {new_value}")
+        print(f"{len(diff['removed'])} removed, {len(diff['added'])} added, {len(diff['changed'])} changed")
+    elif args.command == "fingerprint":
+        for path in args.configs:
+            print(f"{KernelConfig.from_file(path).fingerprint()}  {path}")
+    elif args.command == "validate":
+        config = KernelConfig.from_file(args.config)
+        known_symbols = KconfigSymbolCache(args.symbol_cache).load(args.kernel_version) if args.kernel_version else None
+        issues = validate_config(config, args.kernel_version, known_symbols, args.strict)
+        print_issues(issues)
+        counts = config.counts()
+        print(f"{args.config}: {counts['builtin']} built-in, {counts['modules']} modules, {counts['disabled']} disabled, {len(issues)} issues")
+        if args.kernel_version and known_symbols is None:
+            print(f"No symbol list cached for {args.kernel_version} yet, unknown symbols are not checked.")
+        sys.exit(1 if any(issue.level == "error" for issue in issues) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,134 @@
 import argparse
+import concurrent.futures
 import subprocess
 import os
 import datetime
 import sys
 import re
 import glob
+import json
 import logging
+import shlex
+import threading
+import time
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.artifacts import balanced_batches, publish_artifact, update_checksums_file, write_manifest
+from scripts.build_metrics import BuildMetrics, ResourceSampler
+from scripts.cc_timing_wrapper import TIMING_LOG_VARIABLE
+from scripts.command_runner import run_streaming
+from scripts.compiler_cache import CompilerCache
+from scripts.config_impact import analyze as analyze_config_impact, format_report as format_config_impact
+from scripts.distributed_compile import DistccCluster, DistccMonitor, parse_hosts
+from scripts.kconfig import KconfigSymbolCache, KernelConfig, dropped_symbols, scan_kconfig_symbols, validate_config
+from scripts.kernel_sources import (DECOMPRESSORS, DEFAULT_TARBALL_CACHE_SIZE, KERNEL_ORG_MIRROR, KernelSourceFetcher,
+                                    PristineSourceTree, TarballCache, ZstdSourceArchive,
+                                    cache_lock, extract_tarball, link_into, parse_size)
+from scripts.module_postprocess import format_summary as format_module_summary
+from scripts.stage_graph import StageGraph
+
+# rpm payload compressors: (rpmio name, default level, supports threads).
+# zstd and xz compress the payload with several threads (rpm >= 4.14).
+PAYLOAD_COMPRESSORS = {
+    "zstd": ("zstdio", 6, True),
+    "xz": ("xzdio", 2, True),
+    "gzip": ("gzdio", 6, False),
+    "none": ("ufdio", None, False),
+}
+BUILD_ID_LINKS = ("none", "alldebug", "separate", "compat")
+
+# Longest wait for the signing key generated alongside the build (--wait-for-signing-key)
+SIGNING_KEY_TIMEOUT = 600
 
 class KernelBuilder:
     def __init__(self, kernel_version, make_jobs, repo_root, rpmbuild_root,
                  kernel_config_path, custom_kernel_release_suffix,
-                 log_dir, log_files):
+                 log_dir, log_files, incremental=False, build_cache_dir=None,
+                 compiler_cache=None, source_cache="none", kernel_mirror=KERNEL_ORG_MIRROR,
+                 download_segments=4, tarball_cache_size=None, decompressor="auto", sign_jobs=4,
+                 strict_config=False, compile_timing=False, signing_key_status_path=None,
+                 payload_compression="zstd", payload_level=None, build_id_links="none", debuginfo=False,
+                 module_compression="zstd", strip_modules=True, distcc=None):
         self.kernel_version = kernel_version
         self.make_jobs = make_jobs
+        # Jobs of this machine, make_jobs grows with the distcc hosts
+        self.local_make_jobs = make_jobs
         self.repo_root = repo_root
         self.rpmbuild_root = rpmbuild_root
         self.kernel_config_path = kernel_config_path
         self.custom_kernel_release_suffix = custom_kernel_release_suffix
         self.log_dir = log_dir
         self.log_files = log_files
+        self.incremental = incremental
+        self.build_cache_dir = build_cache_dir or os.path.join(self.repo_root, "build-cache")
+        self.compiler_cache = compiler_cache
+        self.source_cache = source_cache
+        self.kernel_mirror = kernel_mirror
+        self.download_segments = download_segments
+        self.tarball_cache_size = tarball_cache_size
+        self.decompressor = decompressor
+        self.sign_jobs = max(1, sign_jobs)
+        self.strict_config = strict_config
+        self.compile_timing = compile_timing
+        self.signing_key_status_path = signing_key_status_path
+        self.payload_compression = payload_compression
+        self.payload_level = payload_level
+        self.build_id_links = build_id_links
+        self.debuginfo = debuginfo
+        self.module_compression = module_compression
+        self.strip_modules = strip_modules
+        self.distcc = distcc
+        self.distcc_utilization = {}
+        self.metrics = BuildMetrics()
+        self.metrics_path = os.path.join(self.log_dir, "build-metrics.json")
+        self.compile_times_path = os.path.join(self.log_dir, "compile-times.jsonl")
+        self.config_impact_path = os.path.join(self.log_dir, "config-impact.json")
+        self.module_report_path = os.path.join(self.log_dir, "module-postprocess.json")
         self.loggers = {}
         self._setup_logging()
 
         self.kernel_tar = f"linux-{self.kernel_version}.tar.xz"
+        self.kernel_sources_path = os.path.join(self.repo_root, "kernel-sources")
+        self.kernel_tar_path = os.path.join(self.kernel_sources_path, self.kernel_tar)
         self.kernel_build_dir = os.path.join(self.rpmbuild_root, "BUILD", f"linux-{self.kernel_version}")
         self.rpm_spec_path = os.path.join(self.rpmbuild_root, "SPECS", "kernel.spec")
         self.artifacts_rpms_dir = os.path.join(self.repo_root, "artifacts", "rpms")
+        self.artifacts_manifest_path = os.path.join(self.log_dir, "artifacts-manifest.json")
+        self.rpm_files = []
         self.gpg_name = "Kernel Builder for Docker <kernel-builder-docker@example.com>"
+        self.kconfig_symbols = KconfigSymbolCache(os.path.join(self.build_cache_dir, "kconfig-symbols"))
+        self.kernel_config = None
+        # The .config after olddefconfig, what the kernel is actually built with
+        self.resolved_config = None
+        self.compiler_cache_stats_before = None
+        # Per stage thread: the ResourceSampler its commands report to
+        self._stage_context = threading.local()
+
+        self.pristine_tree = None
+        self.zstd_archive = None
+        if self.source_cache == "tree":
+            self.pristine_tree = PristineSourceTree(os.path.join(self.build_cache_dir, "sources"), self.kernel_version)
+        elif self.source_cache == "zstd":
+            self.zstd_archive = ZstdSourceArchive(os.path.join(self.build_cache_dir, "sources"), self.kernel_version)
+
+        # In incremental mode the objects live outside rpmbuild_root (make O=...),
+        # one tree per (kernel version, config, suffix), and survive the cleanup.
+        self.kernel_obj_dir = None
+        if self.incremental:
+            config_name = os.path.basename(self.kernel_config_path)
+            if config_name.endswith(".config"):
+                config_name = config_name[:-len(".config")]
+            objtree_name = f"linux-{self.kernel_version}-{config_name}"
+            if self.custom_kernel_release_suffix:
+                objtree_name += f"-{self.custom_kernel_release_suffix}"
+            self.kernel_obj_dir = os.path.join(self.build_cache_dir, "objtree", objtree_name)
+            # make O=... never writes to the source tree, so the cached pristine
+            # tree can be built from directly instead of being cloned first
+            if self.pristine_tree:
+                self.kernel_build_dir = self.pristine_tree.path
 
     def _setup_logging(self):
         log_format = '%(asctime)s - %(levelname)s - %(message)s'
@@ -67,28 +169,89 @@ class KernelBuilder:
         elif level == 'debug':
             logger.debug(message)
 
-    def _run_command(self, command, cwd=None, capture_output=False, check=True, logger_name='kernel-build'):
+    def _run_command(self, command, cwd=None, capture_output=False, check=True, logger_name='kernel-build', route_line=None, env=None):
         self._log(f"Executing: {' '.join(command)}", logger_name=logger_name)
-        
-        process = subprocess.run(
-            command,
-            cwd=cwd,
-            capture_output=True, # Always capture output to log it
-            text=True,
-            check=False, # Don't raise CalledProcessError immediately, handle it below
-            encoding='utf-8'
-        )
 
-        if process.stdout:
-            self._log(process.stdout.strip(), logger_name=logger_name)
-        if process.stderr:
-            self._log(process.stderr.strip(), level='error', logger_name=logger_name)
+        # Output is logged line by line while the command runs; route_line may
+        # pick a different logger per line (e.g. the %build part of rpmbuild).
+        def log_stdout(line):
+            self._log(line, logger_name=route_line(line) if route_line else logger_name)
 
-        if check and process.returncode != 0:
-            self._log(f"Command failed with exit code {process.returncode}", level='error', logger_name=logger_name)
-            raise subprocess.CalledProcessError(process.returncode, command, process.stdout, process.stderr)
-        
-        return process.stdout, process.stderr
+        def log_stderr(line):
+            self._log(line, level='error', logger_name=route_line(line) if route_line else logger_name)
+
+        # Commands of a sampled stage count towards its resources, see _run_stage
+        sampler = getattr(self._stage_context, "sampler", None)
+        processes = []
+        result = None
+
+        def started(process):
+            processes.append(process)
+            sampler.add_process(process)
+
+        try:
+            result = run_streaming(
+                command,
+                cwd=cwd,
+                env=dict(os.environ, **env) if env else None,
+                on_stdout=log_stdout,
+                on_stderr=log_stderr,
+                capture_stdout=capture_output,
+                # Routing depends on line order, so keep both streams in one pipe.
+                merge_stderr=route_line is not None,
+                on_start=started if sampler else None
+            )
+        finally:
+            if processes:
+                sampler.process_finished(processes[0], result.rusage if result else None)
+
+        if check and result.returncode != 0:
+            self._log(f"Command failed with exit code {result.returncode}", level='error', logger_name=logger_name)
+            result.check_returncode()
+
+        return result.stdout, result.stderr
+
+    def _rpmbuild_log_router(self):
+        # rpmbuild announces every scriptlet with "Executing(%build): ...".
+        # Lines of the %build scriptlet are the actual kernel compilation.
+        current = {'logger': 'rpm-build'}
+
+        def route(line):
+            match = re.search(r"Executing\(%(\w+)\)", line)
+            if match:
+                current['logger'] = 'kernel-compilation' if match.group(1) == 'build' else 'rpm-build'
+            return current['logger']
+        return route
+
+    def _make_variables(self):
+        variables = self.compiler_cache.make_variables() if self.compiler_cache else []
+        distcc_active = self.distcc is not None and self.distcc.active
+        if distcc_active and not self.compiler_cache:
+            # Behind ccache, distcc is the CCACHE_PREFIX instead (see _build_environment)
+            variables.append(f"CC={self.distcc.compiler()}")
+        if self.compile_timing:
+            # The timing wrapper goes in front of the compiler cache, so cache hits are timed as well
+            compiler = f"{self.compiler_cache.tool} gcc" if self.compiler_cache else (self.distcc.compiler() if distcc_active else "gcc")
+            wrapper = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cc_timing_wrapper.py")
+            variables = [variable for variable in variables if not variable.startswith("CC=")]
+            variables.append(f"CC={sys.executable} {wrapper} {compiler}")
+        return variables
+
+    def _make_command(self, *args):
+        command = ["make"]
+        if self.kernel_obj_dir:
+            command.append(f"O={self.kernel_obj_dir}")
+        return command + self._make_variables() + list(args)
+
+    def _build_environment(self):
+        environment = {}
+        if self.compiler_cache:
+            environment.update(self.compiler_cache.environment())
+        if self.compile_timing:
+            environment[TIMING_LOG_VARIABLE] = self.compile_times_path
+        if self.distcc:
+            environment.update(self.distcc.environment(behind_ccache=self.compiler_cache is not None))
+        return environment or None
 
     def _setup_rpmbuild_environment(self):
         self._log("Setting up rpmbuild environment...")
@@ -96,33 +259,205 @@ class KernelBuilder:
             os.makedirs(os.path.join(self.rpmbuild_root, subdir), exist_ok=True)
         self._log("rpmbuild environment setup complete.")
 
-    def _download_and_extract_kernel_source(self):
+    def _download_kernel_source(self):
         self._log("Ensuring kernel source tarball is available...")
-        kernel_sources_path = os.path.join(self.repo_root, "kernel-sources")
-        os.makedirs(kernel_sources_path, exist_ok=True)
-        
-        if not os.path.exists(os.path.join(kernel_sources_path, self.kernel_tar)):
-            self._log(f"Downloading kernel source: {self.kernel_tar}...")
-            self._run_command(["wget", f"https://cdn.kernel.org/pub/linux/kernel/v6.x/{self.kernel_tar}", "-O", os.path.join(kernel_sources_path, self.kernel_tar)])
-        
-        self._run_command(["cp", os.path.join(kernel_sources_path, self.kernel_tar), os.path.join(self.rpmbuild_root, "SOURCES/")])
-        self._log("Extracting kernel source...")
-        self._run_command(["tar", "-xf", os.path.join(self.rpmbuild_root, "SOURCES", self.kernel_tar)], cwd=os.path.join(self.rpmbuild_root, "BUILD"))
+        fetcher = KernelSourceFetcher(
+            TarballCache(self.kernel_sources_path, self.tarball_cache_size),
+            mirror=self.kernel_mirror,
+            segments=self.download_segments,
+            log=self._log
+        )
+        self.kernel_tar_path = fetcher.fetch(self.kernel_version)
+        self._log(f"Kernel source tarball verified: {self.kernel_tar_path}")
+
+    def _extract_kernel_source(self):
+        kernel_tar_path = self.kernel_tar_path
+        # rpmbuild no longer unpacks Source0 itself, a link is all it needs
+        link_method = link_into(kernel_tar_path, os.path.join(self.rpmbuild_root, "SOURCES", self.kernel_tar))
+        self._log(f"Kernel source tarball made available in SOURCES/ ({link_method}).")
+
+        if self.pristine_tree:
+            with cache_lock(self.pristine_tree.cache_dir):
+                if self.pristine_tree.exists():
+                    self._log(f"Reusing pristine source tree: {self.pristine_tree.path}")
+                else:
+                    self._log(f"Extracting kernel source into pristine source tree cache: {self.pristine_tree.path}...")
+                    self.pristine_tree.populate(kernel_tar_path, self._run_command, self.decompressor)
+            if self.kernel_build_dir != self.pristine_tree.path:
+                self._log("Cloning pristine source tree...")
+                self._run_command(["rm", "-rf", self.kernel_build_dir])
+                self.pristine_tree.clone_to(self.kernel_build_dir, self._run_command)
+        else:
+            source_archive = kernel_tar_path
+            if self.zstd_archive:
+                with cache_lock(self.zstd_archive.cache_dir):
+                    if not self.zstd_archive.exists():
+                        self._log(f"Recompressing kernel source with zstd into {self.zstd_archive.path}...")
+                        self.zstd_archive.populate(kernel_tar_path, self._run_command)
+                source_archive = self.zstd_archive.path
+            self._log(f"Extracting kernel source from {source_archive}...")
+            self._run_command(["rm", "-rf", self.kernel_build_dir])
+            start = time.monotonic()
+            program = extract_tarball(source_archive, os.path.join(self.rpmbuild_root, "BUILD"), self._run_command, self.decompressor)
+            self._log(f"Extraction with '{program}' took {time.monotonic() - start:.2f} seconds.")
         self._log("Kernel source extracted.")
 
+    def _validate_kernel_config(self):
+        self._log("Validating kernel configuration...")
+        self.kernel_config = KernelConfig.from_file(os.path.join(self.repo_root, self.kernel_config_path))
+        known_symbols = self.kconfig_symbols.load(self.kernel_version)
+        issues = validate_config(self.kernel_config, self.kernel_version, known_symbols, self.strict_config)
+        for issue in issues:
+            self._log(issue.message, level=issue.level)
+        counts = self.kernel_config.counts()
+        self.metrics.set("config", dict(counts, fingerprint=self.kernel_config.fingerprint(), issues=[issue.message for issue in issues]))
+        errors = [issue for issue in issues if issue.level == "error"]
+        if errors:
+            raise RuntimeError(f"Kernel configuration {self.kernel_config_path} failed validation with {len(errors)} errors.")
+        self._log(f"Kernel configuration valid: {counts['builtin']} built-in, {counts['modules']} modules, "
+                  f"fingerprint {self.kernel_config.fingerprint()[:16]}.")
+
+    def _check_dropped_symbols(self, config_dir):
+        # Compare what was asked for with what olddefconfig kept
+        resolved = KernelConfig.from_file(os.path.join(config_dir, ".config"))
+        self.resolved_config = resolved
+        dropped = dropped_symbols(self.kernel_config, resolved)
+        for name, (requested, value) in sorted(dropped.items()):
+            self._log(f"CONFIG_{name}={requested} was changed by olddefconfig to {value or 'unset'}", level='warning')
+        self.metrics.set("config", dict(self.metrics.data.get("config", {}), dropped_symbols=sorted(dropped), resolved_fingerprint=resolved.fingerprint()))
+        if dropped and self.strict_config:
+            raise RuntimeError(f"olddefconfig dropped or changed {len(dropped)} symbols of {self.kernel_config_path}.")
+        if dropped:
+            self._log(f"olddefconfig dropped or changed {len(dropped)} symbols, see the warnings above.", level='warning')
+
     def _prepare_kernel_config(self):
         self._log("Preparing kernel configuration...")
         os.makedirs(self.kernel_build_dir, exist_ok=True)
-        self._run_command(["cp", os.path.join(self.repo_root, self.kernel_config_path), os.path.join(self.kernel_build_dir, ".config")])
-        self._run_command(["make", "olddefconfig"], cwd=self.kernel_build_dir)
+        # With O= the source tree has to stay clean, .config goes to the object tree
+        config_dir = self.kernel_build_dir
+        if self.kernel_obj_dir:
+            os.makedirs(self.kernel_obj_dir, exist_ok=True)
+            config_dir = self.kernel_obj_dir
+            self._log(f"Using persistent object tree: {self.kernel_obj_dir}")
+        if self.kconfig_symbols.load(self.kernel_version) is None:
+            # Lets later builds of this version report unknown symbols before extraction
+            symbols = scan_kconfig_symbols(self.kernel_build_dir)
+            if symbols:
+                self.kconfig_symbols.store(self.kernel_version, symbols)
+        self._run_command(["cp", os.path.join(self.repo_root, self.kernel_config_path), os.path.join(config_dir, ".config")])
+        self._run_command(self._make_command("olddefconfig"), cwd=self.kernel_build_dir)
+        self._check_dropped_symbols(config_dir)
         self._log("Kernel configuration prepared.")
 
+    def _probe_distcc(self):
+        self._log(f"Probing {len(self.distcc.hosts)} distcc hosts...")
+        self.distcc.probe()
+        for host in self.distcc.hosts:
+            state = "reachable" if host in self.distcc.reachable else "unreachable, not used"
+            self._log(f"distcc host {host.host}:{host.port} ({host.slots} slots): {state}",
+                      level='info' if host in self.distcc.reachable else 'warning')
+        if not self.distcc.active:
+            self._log("No distcc host reachable, compiling locally.", level='warning')
+            self.metrics.set("distcc", {"active": False, "make_jobs": self.make_jobs})
+            return
+        os.makedirs(self.distcc.state_dir, exist_ok=True)
+        self.make_jobs = str(self.distcc.make_jobs(int(self.local_make_jobs)))
+        self.metrics.set("distcc", {"active": True, "hosts": self.distcc.hosts_value(), "make_jobs": self.make_jobs})
+        self._log(f"Distributed compilation on {len(self.distcc.reachable)} hosts with {self.distcc.remote_slots()} remote slots, make -j{self.make_jobs}.")
+
+    def _log_distcc_utilization(self, stage_name, utilization):
+        self.distcc_utilization[stage_name] = utilization
+        self.metrics.set("distcc", dict(self.metrics.data.get("distcc", {}), utilization=self.distcc_utilization))
+        for host in utilization:
+            if host["reachable"]:
+                self._log(f"Stage '{stage_name}' distcc {host['host']}: {host['mean_busy_slots']} of {host['slots']} slots busy on average "
+                          f"({host['utilization_percent']}%)", logger_name='kernel-build')
+
+    def _prepare_compiler_cache(self):
+        self._log(f"Preparing compiler cache ({self.compiler_cache.tool}) in {self.compiler_cache.cache_dir}, max size {self.compiler_cache.max_size}...")
+        os.makedirs(self.compiler_cache.cache_dir, exist_ok=True)
+        for command in self.compiler_cache.prepare_commands():
+            self._run_command(command, env=self._build_environment())
+        # Other builds may share the cache, its counters are compared instead of zeroed
+        stats_output, _ = self._run_command(self.compiler_cache.stats_command(), capture_output=True, env=self._build_environment())
+        self.compiler_cache_stats_before = self.compiler_cache.parse_stats(stats_output)
+        self._log("Compiler cache prepared.")
+
+    def _collect_compiler_cache_stats(self):
+        self._log("Collecting compiler cache statistics...")
+        stats_output, _ = self._run_command(self.compiler_cache.stats_command(), capture_output=True, env=self._build_environment())
+        stats = self.compiler_cache.parse_stats(stats_output, before=self.compiler_cache_stats_before)
+        for command in self.compiler_cache.finish_commands():
+            self._run_command(command, check=False, env=self._build_environment())
+
+        self.metrics.set("compiler_cache", stats)
+        self._log(f"Compiler cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']}% hit rate).")
+
+    def _compile_kernel_incremental(self):
+        self._check_signing_key()
+        self._log("Compiling kernel in persistent object tree (only stale objects are rebuilt)...")
+        self._run_command(
+            self._make_command(f"-j{self.make_jobs}", f"LOCALVERSION=-{self.custom_kernel_release_suffix}"),
+            cwd=self.kernel_build_dir,
+            logger_name='kernel-compilation',
+            env=self._build_environment()
+        )
+        self._run_command(self._make_command("modules_prepare"), cwd=self.kernel_build_dir, logger_name='kernel-compilation', env=self._build_environment())
+        self._log("Kernel compilation finished.")
+
+    def _packaging_threads(self):
+        return int(self.local_make_jobs) if str(self.local_make_jobs).isdigit() else os.cpu_count()
+
+    def _packaging_macros(self):
+        """
+        rpm macros of the packaging mode. rpm (>= 4.15) builds the binary
+        packages of one spec concurrently with up to %_smp_build_nthreads
+        threads, and zstd/xz compress each payload with several threads, so
+        the large modules and devel payloads no longer go through one core.
+        """
+        threads = self._packaging_threads()
+        io_name, default_level, threaded = PAYLOAD_COMPRESSORS[self.payload_compression]
+        level = self.payload_level if self.payload_level is not None else default_level
+        payload = f"w{level if level is not None else ''}{f'T{threads}' if threaded else ''}.{io_name}"
+        return {
+            "_binary_payload": payload,
+            "_smp_build_nthreads": str(threads),
+            # Also the -j of find-debuginfo
+            "_smp_build_ncpus": str(threads),
+            "_build_id_links": self.build_id_links,
+        }
+
+    def _module_install_section(self):
+        """
+        modules_install, then module_postprocess.py strips and compresses the
+        modules with one process per core and runs depmod on the buildroot.
+        """
+        # find-debuginfo needs the modules unstripped and uncompressed
+        strip = self.strip_modules and not self.debuginfo
+        compression = "none" if self.debuginfo else self.module_compression
+        install_variables = ""
+        if strip and self.resolved_config and self.resolved_config.enabled("MODULE_SIG_ALL"):
+            # Modules signed during modules_install must be stripped before signing, i.e. by kbuild
+            install_variables = " INSTALL_MOD_STRIP=1"
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "module_postprocess.py")
+        postprocess = [sys.executable, script, "%{buildroot}", "%{final_krelease}",
+                       "--compression", compression, "--jobs", str(self._packaging_threads()),
+                       "--report", self.module_report_path]
+        if self.resolved_config:
+            postprocess += ["--config", self.resolved_config.path]
+        if not strip:
+            postprocess.append("--no-strip")
+        return (
+            f"make modules_install INSTALL_MOD_PATH=%{{buildroot}} KERNELRELEASE=%{{final_krelease}} DEPMOD=/bin/true{install_variables}\n"
+            f"{' '.join(shlex.quote(arg) if not arg.startswith('%') else arg for arg in postprocess)}"
+        )
+
     def _generate_spec_file(self):
         self._log("Generating dynamic .spec file...", logger_name='kernel-build')
 
         # Determine final kernel release string
         final_kernel_release_output, _ = self._run_command(
-            ["make", "-s", "kernelrelease", f"LOCALVERSION=-{self.custom_kernel_release_suffix}"],
+            self._make_command("-s", "kernelrelease", f"LOCALVERSION=-{self.custom_kernel_release_suffix}"),
             cwd=self.kernel_build_dir,
             capture_output=True,
             logger_name='kernel-build'
@@ -133,11 +468,44 @@ class KernelBuilder:
         self._log(f"Final kernel release string (for uname -r): {final_kernel_release}", logger_name='kernel-build')
         self._log(f"RPM Release string (for spec file): {rpm_release_string}", logger_name='kernel-build')
 
+        # The source tree is already extracted and configured (olddefconfig) by
+        # the previous stages, so %prep has nothing left to do and the other
+        # sections work directly in that tree.
+        prep_section = f"# Kernel source prepared by kernel_builder.py in {self.kernel_build_dir}"
+        if self.incremental:
+            # Compilation already happened in _compile_kernel_incremental(),
+            # rpmbuild only packages what is in the object tree.
+            build_section = "# Nothing to do, compiled in the persistent object tree"
+            install_chdir = f'cd "{self.kernel_obj_dir}"\n'
+        else:
+            build_exports = "".join(f"export {name}={shlex.quote(value)}\n" for name, value in (self._build_environment() or {}).items())
+            make_variables = "".join(f" {shlex.quote(variable)}" for variable in self._make_variables())
+            build_section = (
+                f'cd "{self.kernel_build_dir}"\n' +
+                build_exports +
+                f"make -j{self.make_jobs}{make_variables} LOCALVERSION=-%{{custom_suffix}}\n"
+                f"make{make_variables} modules_prepare"
+            )
+            install_chdir = f'cd "{self.kernel_build_dir}"\n'
+
+        packaging_macros = self._packaging_macros()
+        self.metrics.set("packaging", dict(packaging_macros, debuginfo=self.debuginfo))
+        self._log(f"Packaging: payload {packaging_macros['_binary_payload']}, {packaging_macros['_smp_build_nthreads']} threads, "
+                  f"build-id links {self.build_id_links}, debuginfo {'on' if self.debuginfo else 'off'}.", logger_name='kernel-build')
+        packaging_section = "".join(f"%global {name} {value}\n" for name, value in packaging_macros.items())
+        if self.debuginfo:
+            # There is no %setup, hence no build subdirectory to collect sources from
+            debuginfo_section = "%undefine _debugsource_packages\n%debug_package"
+        else:
+            debuginfo_section = "%global debug_package %{nil}"
+
         spec_content = f"""
 # Global definitions
 %global final_krelease {final_kernel_release}
 %global custom_suffix {self.custom_kernel_release_suffix}
-%global _build_id_links %{{nil}}
+
+# Packaging mode, see _packaging_macros()
+{packaging_section}
 
 # --- Main Package (kernel) ---
 Name:           kernel
@@ -161,6 +529,8 @@ BuildRequires:  bc, rsync, openssl, openssl-devel, elfutils, rpm-build, dwarves,
 %description
 Custom kernel for this project (%{{final_krelease}}).
 
+{debuginfo_section}
+
 # --- Sub-package for modules ---
 %package modules
 Summary:        Kernel modules for the custom kernel
@@ -182,23 +552,20 @@ Development headers and files for building modules against the custom kernel (%{
 
 # --- Build Process ---
 %prep
-%setup -q -n linux-%{{version}}
-cp "{self.repo_root}/{self.kernel_config_path}" .config
-make olddefconfig
+{prep_section}
 
 %build
-make -j{self.make_jobs} LOCALVERSION=-%{{custom_suffix}}
-make modules_prepare
+{build_section}
 
 %install
-# Install kernel
+{install_chdir}# Install kernel
 mkdir -p %{{buildroot}}/boot
 cp -v arch/x86/boot/bzImage %{{buildroot}}/boot/vmlinuz-%{{final_krelease}}
 cp -v System.map %{{buildroot}}/boot/System.map-%{{final_krelease}}
 cp -v .config %{{buildroot}}/boot/config-%{{final_krelease}}
 
-# Install modules
-make modules_install INSTALL_MOD_PATH=%{{buildroot}} KERNELRELEASE=%{{final_krelease}} DEPMOD=/bin/true
+# Install modules, strip and compress them and run depmod
+{self._module_install_section()}
 
 # --- File Definitions ---
 %files
@@ -224,6 +591,7 @@ make modules_install INSTALL_MOD_PATH=%{{buildroot}} KERNELRELEASE=%{{final_krel
         return final_kernel_release # Return this for later use in install
 
     def _run_rpm_build(self):
+        self._check_signing_key()
         self._log("Starting RPM build...", logger_name='kernel-build')
         rpmbuild_cmd = [
             "rpmbuild", "-bb", "-vv",
@@ -231,50 +599,247 @@ make modules_install INSTALL_MOD_PATH=%{{buildroot}} KERNELRELEASE=%{{final_krel
             "--noclean",
             self.rpm_spec_path
         ]
-        self._run_command(rpmbuild_cmd, logger_name='rpm-build')
+        if os.path.exists(self.module_report_path):
+            os.remove(self.module_report_path)
+        self._run_command(rpmbuild_cmd, logger_name='rpm-build', route_line=self._rpmbuild_log_router())
         self._log("RPM build finished successfully.", logger_name='kernel-build')
+        if os.path.exists(self.module_report_path):
+            with open(self.module_report_path, encoding='utf-8') as f:
+                module_report = json.load(f)
+            for line in format_module_summary(module_report):
+                self._log(line, logger_name='kernel-build')
+            if module_report["totals"].get("compression_skipped"):
+                self._log(f"Modules left uncompressed: {module_report['totals']['compression_skipped']}.", level='warning', logger_name='kernel-build')
+            if module_report["totals"]["depmod"] != "ok":
+                self._log(f"depmod {module_report['totals']['depmod']}, the modules package has no modules.dep.", level='warning', logger_name='kernel-build')
+            self.metrics.set("modules", module_report["totals"])
+
+    def _analyze_config_impact(self):
+        self._log("Attributing compile times and module sizes to Kconfig symbols...")
+        if not os.path.exists(self.compile_times_path):
+            self._log(f"No compile times recorded in {self.compile_times_path}, nothing was compiled.", level='warning')
+            return
+        object_dir = self.kernel_obj_dir or self.kernel_build_dir
+        config = KernelConfig.from_file(os.path.join(object_dir, ".config"))
+        report = analyze_config_impact(self.kernel_build_dir, object_dir, self.compile_times_path, config)
+        with open(self.config_impact_path, "w", encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        for line in format_config_impact(report, top=15):
+            self._log(line)
+        self.metrics.set("config_impact", {
+            "totals": report["totals"],
+            "top_symbols": [{key: stats[key] for key in ("symbol", "value", "cpu_seconds", "cpu_share_percent", "module_bytes")}
+                            for stats in report["symbols"][:10]],
+        })
+        self._log(f"Config impact report written to {self.config_impact_path}")
+
+    def _collect_rpms(self):
+        self.rpm_files = sorted(glob.glob(os.path.join(self.rpmbuild_root, "RPMS", "x86_64", "*.rpm")))
+        return self.rpm_files
+
+    def _signing_key_status(self):
+        """
+        "ready" or "failed" once local_kernel_build.py is done generating the
+        key, None while it still runs (no status file, or an empty one).
+        """
+        if not self.signing_key_status_path:
+            return None
+        try:
+            with open(self.signing_key_status_path, encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _check_signing_key(self):
+        # Without a key the packages cannot be signed, so do not start building them
+        if self._signing_key_status() == "failed":
+            raise RuntimeError("Signing key generation failed, see gpg-signing.log.")
+
+    def _wait_for_signing_key(self):
+        # local_kernel_build.py generates the key while the build runs and
+        # writes "ready" or "failed" to the status file when it is done
+        self._log(f"Waiting for the signing key ({self.signing_key_status_path})...", logger_name='kernel-build')
+        deadline = time.monotonic() + SIGNING_KEY_TIMEOUT
+        while time.monotonic() < deadline:
+            status = self._signing_key_status()
+            if status:
+                if status != "ready":
+                    raise RuntimeError(f"Signing key generation {status}, see gpg-signing.log.")
+                self._log("Signing key available.", logger_name='kernel-build')
+                return
+            time.sleep(0.5)
+        raise RuntimeError(f"Signing key not available after {SIGNING_KEY_TIMEOUT} seconds.")
 
     def _sign_rpms(self):
         self._log("Signing RPM packages...", logger_name='kernel-build')
-        rpm_files = glob.glob(os.path.join(self.rpmbuild_root, "RPMS", "x86_64", "*.rpm"))
+        rpm_files = self._collect_rpms()
         if not rpm_files:
             self._log("No RPM files found to sign.", level='warning', logger_name='kernel-build')
             return
 
-        for rpm_file in rpm_files:
-            self._log(f"Signing {os.path.basename(rpm_file)}...", logger_name='kernel-build')
-            self._run_command(["rpmsign", "--addsign", "--define", f"_gpg_name {self.gpg_name}", rpm_file], logger_name='gpg-signing')
+        # rpmsign takes several packages per call; the batches run concurrently
+        # since signing is mostly reading and rewriting the (large) payloads.
+        batches = balanced_batches(rpm_files, self.sign_jobs)
+        self._log(f"Signing {len(rpm_files)} packages in {len(batches)} batches...", logger_name='kernel-build')
+
+        def sign_batch(batch):
+            self._log(f"Signing {', '.join(os.path.basename(rpm_file) for rpm_file in batch)}...", logger_name='kernel-build')
+            self._run_command(["rpmsign", "--addsign", "--define", f"_gpg_name {self.gpg_name}"] + batch, logger_name='gpg-signing')
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            for future in [executor.submit(sign_batch, batch) for batch in batches]:
+                future.result()
         self._log("RPM packages signed successfully.", logger_name='kernel-build')
 
     def _copy_rpms_to_artifacts(self):
-        self._log("Copying RPMs to artifacts directory...", logger_name='kernel-build')
+        self._log("Moving RPMs to artifacts directory...", logger_name='kernel-build')
         os.makedirs(self.artifacts_rpms_dir, exist_ok=True)
-        rpm_files = glob.glob(os.path.join(self.rpmbuild_root, "RPMS", "x86_64", "*.rpm"))
-        self._run_command(["cp", "-v"] + rpm_files + [self.artifacts_rpms_dir], logger_name='kernel-build')
-        self._log("RPMs copied to artifacts directory.", logger_name='kernel-build')
+        rpm_files = self.rpm_files or self._collect_rpms()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.sign_jobs) as executor:
+            entries = list(executor.map(lambda rpm_file: publish_artifact(rpm_file, self.artifacts_rpms_dir), rpm_files))
+        for entry in entries:
+            self._log(f"{entry['name']}: {entry['size_bytes'] / 2**20:.1f} MiB, {entry['method']}, sha256 {entry['sha256']}", logger_name='kernel-build')
+
+        checksums_path = update_checksums_file(self.artifacts_rpms_dir, entries)
+        write_manifest(self.artifacts_manifest_path, entries, kernel_version=self.kernel_version,
+                       kernel_config=self.kernel_config_path, custom_suffix=self.custom_kernel_release_suffix)
+        self.metrics.set("artifacts", entries)
+        self._log(f"RPMs moved to artifacts directory (checksums: {checksums_path}, manifest: {self.artifacts_manifest_path}).", logger_name='kernel-build')
 
     def _cleanup_rpmbuild_directory(self):
         self._log("Removing rpmbuild directory...", logger_name='kernel-build')
         self._run_command(["rm", "-rf", self.rpmbuild_root], logger_name='kernel-build')
         self._log("rpmbuild directory removed.", logger_name='kernel-build')
 
+    def _run_stage(self, name, stage, sample_resources=False):
+        started_at = datetime.datetime.now()
+        start = time.monotonic()
+        sampler = None
+        distcc_monitor = None
+        if sample_resources:
+            sampler = ResourceSampler(samples_path=os.path.join(self.log_dir, "resource-samples.jsonl"), label=name)
+            sampler.start()
+            # Every stage runs in a thread of its own, see StageGraph
+            self._stage_context.sampler = sampler
+            if self.distcc and self.distcc.active:
+                distcc_monitor = DistccMonitor(self.distcc)
+                distcc_monitor.start()
+        status = "failed"
+        try:
+            stage()
+            status = "success"
+        finally:
+            self._stage_context.sampler = None
+            duration = time.monotonic() - start
+            resources = sampler.stop() if sampler else None
+            self.metrics.record_stage(name, started_at, duration, status, resources)
+            if distcc_monitor:
+                distcc_monitor.stop()
+                if distcc_monitor.available:
+                    self._log_distcc_utilization(name, distcc_monitor.utilization())
+                else:
+                    self._log("distccmon-text not found, no distcc utilization recorded.", level='warning')
+        self._log(f"Stage '{name}' finished in {duration:.2f} seconds.", logger_name='kernel-build')
+        if resources:
+            self._log(f"Stage '{name}' resources: peak RSS {resources['peak_rss_bytes'] / 2**20:.0f} MiB, "
+                      f"CPU utilization {resources['cpu_utilization_percent']}%, "
+                      f"read {resources['read_bytes'] / 2**20:.0f} MiB, written {resources['write_bytes'] / 2**20:.0f} MiB, "
+                      f"max load {resources['load_average_max']}", logger_name='kernel-build')
+
+    def _log_stage_summary(self, graph):
+        self._log("Stage durations:", logger_name='kernel-build')
+        for stage in self.metrics.stages:
+            self._log(f"  {stage['name']:<20} {stage['duration_seconds']:10.2f} s", logger_name='kernel-build')
+        for line in graph.report():
+            self._log(line, logger_name='kernel-build')
+
+    def _stage_graph(self):
+        """
+        The build stages and what each one needs. Independent stages run
+        concurrently, e.g. the download next to the compiler cache setup, or
+        the config impact analysis next to the compiler cache statistics.
+        """
+        graph = StageGraph()
+
+        def add(name, stage, after=(), sample_resources=False):
+            graph.add(name, lambda: self._run_stage(name, stage, sample_resources), after)
+
+        # Validation takes well under a second, nothing is downloaded for a broken config
+        add("validate-config", self._validate_kernel_config)
+        add("setup", self._setup_rpmbuild_environment, after=["validate-config"])
+        add("download", self._download_kernel_source, after=["validate-config"])
+        add("extract", self._extract_kernel_source, after=["setup", "download"])
+        config_after = ["extract"]
+        build_after = ["config"]
+        if self.distcc:
+            add("distcc", self._probe_distcc, after=["validate-config"])
+            # make olddefconfig gets the distcc CC, which depends on the probe
+            config_after.append("distcc")
+            build_after.append("distcc")
+        add("config", self._prepare_kernel_config, after=config_after)
+        if self.compiler_cache:
+            add("compiler-cache", self._prepare_compiler_cache, after=["validate-config"])
+            build_after.append("compiler-cache")
+        # The spec's %build has the make -j and the distcc environment
+        spec_after = list(build_after)
+        if self.incremental:
+            add("compile", self._compile_kernel_incremental, after=build_after, sample_resources=True)
+            # make kernelrelease must not run in the object tree while it is being built
+            spec_after = ["compile"]
+        add("spec", self._generate_spec_file, after=spec_after)
+        add("rpmbuild", self._run_rpm_build, after=["spec"] + build_after, sample_resources=True)
+        sign_after = ["rpmbuild"]
+        if self.signing_key_status_path:
+            # Waits only once there is something to sign, a failed build never blocks on it
+            add("signing-key", self._wait_for_signing_key, after=["rpmbuild"])
+            sign_after.append("signing-key")
+        add("sign", self._sign_rpms, after=sign_after)
+        add("artifacts", self._copy_rpms_to_artifacts, after=["sign"])
+        # The reports come after the artifacts: once a stage fails no other one
+        # starts, and a failed analysis must not cost the signed packages
+        cleanup_after = ["artifacts"]
+        if self.compile_timing:
+            add("config-impact", self._analyze_config_impact, after=["artifacts"])
+            cleanup_after.append("config-impact")
+        if self.compiler_cache:
+            add("compiler-cache-stats", self._collect_compiler_cache_stats, after=["artifacts"])
+            cleanup_after.append("compiler-cache-stats")
+        add("cleanup", self._cleanup_rpmbuild_directory, after=cleanup_after)
+        return graph
+
+    def _write_metrics(self, status):
+        self.metrics.set("status", status)
+        self.metrics.write(self.metrics_path)
+        self._log(f"Build metrics written to {self.metrics_path}", logger_name='kernel-build')
+
     def build(self):
         self._log("Kernel build process started.", logger_name='kernel-build')
+        self.metrics.set("kernel_version", self.kernel_version)
+        self.metrics.set("kernel_config", self.kernel_config_path)
+        self.metrics.set("custom_suffix", self.custom_kernel_release_suffix)
+        self.metrics.set("make_jobs", self.make_jobs)
+        self.metrics.set("incremental", self.incremental)
+        self.metrics.set("source_cache", self.source_cache)
+        self.metrics.set("compiler_cache_tool", self.compiler_cache.tool if self.compiler_cache else "none")
+        self.metrics.set("started_at", datetime.datetime.now().isoformat(timespec="seconds"))
+        graph = self._stage_graph()
         try:
-            self._setup_rpmbuild_environment()
-            self._download_and_extract_kernel_source()
-            self._prepare_kernel_config()
-            self._generate_spec_file()
-            self._run_rpm_build()
-            self._sign_rpms()
-            self._copy_rpms_to_artifacts()
-            self._cleanup_rpmbuild_directory()
+            try:
+                graph.run()
+            finally:
+                self.metrics.set("critical_path", graph.critical_path())
+                if graph.skipped:
+                    self.metrics.set("skipped_stages", graph.skipped)
+            self._log_stage_summary(graph)
+            self._write_metrics("success")
             self._log("Kernel build process finished successfully.", logger_name='kernel-build')
         except subprocess.CalledProcessError as e:
             self._log(f"Kernel build failed: {e}", level='error', logger_name='kernel-build')
+            self._write_metrics("failed")
             sys.exit(1)
         except Exception as e:
             self._log(f"An unexpected error occurred: {e}", level='error', logger_name='kernel-build')
+            self._write_metrics("failed")
             sys.exit(1)
 
 if __name__ == "__main__":
@@ -285,6 +850,29 @@ if __name__ == "__main__":
     parser.add_argument("--rpmbuild-root", default="/root/rpmbuild", help="Root directory for rpmbuild.")
     parser.add_argument("--log-dir", required=True, help="Directory to store log files.")
     parser.add_argument("--make-jobs", default="auto", help="Number of jobs for make. Can be an integer, \"auto\", or \"auto+1\".")
+    parser.add_argument("--incremental", action="store_true", help="Keep a persistent object tree (make O=...) per kernel version and config, and rebuild only what changed.")
+    parser.add_argument("--build-cache-dir", default=None, help="Directory for persistent build data. Defaults to <repo-root>/build-cache.")
+    parser.add_argument("--compiler-cache", choices=["none", "ccache", "sccache"], default="none", help="Compiler cache to put in front of gcc.")
+    parser.add_argument("--compiler-cache-dir", default="/compiler-cache", help="Directory of the compiler cache (usually a mounted host volume).")
+    parser.add_argument("--compiler-cache-size", default="20G", help="Maximum size of the compiler cache, older entries are evicted (e.g. 20G).")
+    parser.add_argument("--kernel-version", default="6.16.8", help="Kernel version to build (e.g. 6.16.8).")
+    parser.add_argument("--kernel-mirror", default=KERNEL_ORG_MIRROR, help="Base URL of the kernel.org mirror to download from.")
+    parser.add_argument("--download-segments", type=int, default=4, help="Number of parallel range requests used to download the kernel tarball.")
+    parser.add_argument("--tarball-cache-size", default=DEFAULT_TARBALL_CACHE_SIZE, help="Size limit of the kernel-sources/ tarball cache, least recently used tarballs are evicted.")
+    parser.add_argument("--source-cache", choices=["none", "tree", "zstd"], default="none", help="\"tree\" keeps an extracted pristine source tree per kernel version in the build cache, \"zstd\" a zstd recompressed tarball.")
+    parser.add_argument("--decompressor", choices=["auto"] + sorted(DECOMPRESSORS), default="auto", help="Program used to decompress the xz tarball. \"auto\" prefers pixz, then multithreaded xz.")
+    parser.add_argument("--compile-timing", action="store_true", help="Time every compiler call and rank Kconfig symbols by the compile time and module size they cost.")
+    parser.add_argument("--strict-config", action="store_true", help="Fail on configuration warnings, e.g. expensive options or symbols dropped by olddefconfig.")
+    parser.add_argument("--sign-jobs", type=int, default=4, help="Number of concurrent rpmsign batches (and artifact copies).")
+    parser.add_argument("--payload-compression", choices=sorted(PAYLOAD_COMPRESSORS), default="zstd", help="Compression of the RPM payloads. zstd and xz use one thread per make job.")
+    parser.add_argument("--payload-level", type=int, default=None, help="Compression level of the RPM payloads. Defaults to 6 for zstd, 2 for xz and 6 for gzip.")
+    parser.add_argument("--build-id-links", choices=BUILD_ID_LINKS, default="none", help="How rpm packages /usr/lib/.build-id links (%%_build_id_links).")
+    parser.add_argument("--debuginfo", action="store_true", help="Also build a kernel-debuginfo package (only useful with CONFIG_DEBUG_INFO).")
+    parser.add_argument("--module-compression", choices=["zstd", "xz", "none"], default="zstd", help="Compression of the installed modules (.ko.zst, .ko.xz).")
+    parser.add_argument("--no-module-strip", action="store_true", help="Keep the debug sections of the installed modules.")
+    parser.add_argument("--distcc-hosts", default=None, help="Compile on these distcc hosts as well, \"host[:port][/slots] ...\". make -j becomes the total number of slots.")
+    parser.add_argument("--distcc-local-slots", type=int, default=2, help="Compile jobs kept on this machine next to the distcc hosts.")
+    parser.add_argument("--wait-for-signing-key", default=None, metavar="STATUS_FILE", help="The signing key is generated while the build runs; wait before signing until STATUS_FILE says \"ready\".")
     
     args = parser.parse_args()
 
@@ -295,6 +883,19 @@ if __name__ == "__main__":
     elif make_jobs == 'auto+1':
         make_jobs = str(os.cpu_count() + 1)
 
+    distcc = None
+    if args.distcc_hosts:
+        if args.compiler_cache == "sccache":
+            parser.error("--distcc-hosts works with --compiler-cache ccache or none, sccache has its own distributed mode")
+        try:
+            distcc = DistccCluster(parse_hosts(args.distcc_hosts), args.distcc_local_slots, os.path.join(args.rpmbuild_root, "distcc"))
+        except ValueError as e:
+            parser.error(str(e))
+
+    compiler_cache = None
+    if args.compiler_cache != "none":
+        compiler_cache = CompilerCache(args.compiler_cache, args.compiler_cache_dir, args.compiler_cache_size)
+
     # Define log file paths
     log_files = {
         'kernel-build': os.path.join(args.log_dir, 'kernel-build.log'),
@@ -305,13 +906,32 @@ if __name__ == "__main__":
     }
 
     builder = KernelBuilder(
-        kernel_version="6.16.8",
+        kernel_version=args.kernel_version,
         make_jobs=make_jobs,
         repo_root=args.repo_root,
         rpmbuild_root=args.rpmbuild_root,
         kernel_config_path=args.kernel_config_path,
         custom_kernel_release_suffix=args.custom_kernel_release_suffix,
         log_dir=args.log_dir,
-        log_files=log_files
+        log_files=log_files,
+        incremental=args.incremental,
+        build_cache_dir=args.build_cache_dir,
+        compiler_cache=compiler_cache,
+        source_cache=args.source_cache,
+        kernel_mirror=args.kernel_mirror,
+        download_segments=args.download_segments,
+        tarball_cache_size=parse_size(args.tarball_cache_size),
+        decompressor=args.decompressor,
+        sign_jobs=args.sign_jobs,
+        strict_config=args.strict_config,
+        compile_timing=args.compile_timing,
+        signing_key_status_path=args.wait_for_signing_key,
+        payload_compression=args.payload_compression,
+        payload_level=args.payload_level,
+        build_id_links=args.build_id_links,
+        debuginfo=args.debuginfo,
+        module_compression=args.module_compression,
+        strip_modules=not args.no_module_strip,
+        distcc=distcc
     )
     builder.build()
@@ -0,0 +1,436 @@
+import concurrent.futures
+import contextlib
+import fcntl
+import hashlib
+import json
+import lzma
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+
+@contextlib.contextmanager
+def cache_lock(directory):
+    """
+    Exclusive lock on a cache directory shared by concurrent builds (also
+    across containers, as long as they bind-mount the same host directory).
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def link_into(src, dst):
+    """
+    Makes `src` available as `dst` without copying its data. A hardlink is used
+    when both paths are on the same filesystem, otherwise a symlink (the
+    rpmbuild root usually lives in the container while kernel-sources/ is on
+    the bind-mounted workspace). Returns the method that was used.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        os.symlink(os.path.abspath(src), dst)
+        return "symlink"
+
+
+DECOMPRESSORS = {
+    "xz": "xz",
+    # xz >= 5.4 decodes multi-block archives in parallel; kernel.org tarballs
+    # are a single block, so for them this is as fast as plain xz
+    "xz-mt": "xz -T0",
+    "pixz": "pixz",
+}
+
+
+def decompressor_program(archive, decompressor="auto"):
+    if archive.endswith(".zst"):
+        return "zstd"
+    if decompressor == "auto":
+        decompressor = "pixz" if shutil.which("pixz") else "xz-mt"
+    return DECOMPRESSORS[decompressor]
+
+
+def extract_tarball(archive, dest_dir, run_command, decompressor="auto"):
+    """Extracts `archive` into `dest_dir` and returns the decompressor used."""
+    program = decompressor_program(archive, decompressor)
+    run_command(["tar", "-I", program, "-xf", archive], cwd=dest_dir)
+    return program
+
+
+class ZstdSourceArchive:
+    """
+    The kernel tarball recompressed once with zstd, which decompresses several
+    times faster than xz. Kept per kernel version next to the pristine trees.
+    """
+
+    def __init__(self, cache_dir, kernel_version, level=3):
+        self.cache_dir = cache_dir
+        self.level = level
+        self.path = os.path.join(cache_dir, f"linux-{kernel_version}.tar.zst")
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def populate(self, tarball, run_command):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            run_command(["bash", "-o", "pipefail", "-c",
+                         f"xz -T0 -dc {shlex.quote(tarball)} | zstd -T0 -{self.level} -q -f -o {shlex.quote(tmp_path)}"])
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class PristineSourceTree:
+    """
+    An extracted, never modified kernel source tree kept per kernel version
+    under `cache_dir`. It is extracted once and then cloned (or, for builds
+    that keep the source tree clean with make O=..., used directly).
+    """
+
+    def __init__(self, cache_dir, kernel_version):
+        self.cache_dir = cache_dir
+        self.kernel_version = kernel_version
+        self.path = os.path.join(cache_dir, f"linux-{kernel_version}")
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def populate(self, tarball, run_command, decompressor="auto"):
+        # Extract next to the final location and rename, so an interrupted
+        # extraction never leaves a half-populated tree behind.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_dir = os.path.join(self.cache_dir, f".linux-{self.kernel_version}.{os.getpid()}.tmp")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        try:
+            extract_tarball(tarball, staging_dir, run_command, decompressor)
+            os.rename(os.path.join(staging_dir, f"linux-{self.kernel_version}"), self.path)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def clone_to(self, dest, run_command):
+        # cp -a keeps the tarball mtimes, which Kbuild relies on; on
+        # btrfs/xfs --reflink=auto makes the copy nearly free.
+        run_command(["cp", "-a", "--reflink=auto", self.path, dest])
+
+
+KERNEL_ORG_MIRROR = "https://cdn.kernel.org/pub/linux/kernel"
+DEFAULT_TARBALL_CACHE_SIZE = "10G"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def print_log(message, level='info'):
+    print(message if level == 'info' else f"{level.upper()}: {message}")
+
+
+def parse_size(value):
+    """Parses sizes like "512M", "10G" or plain byte counts."""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    value = str(value).strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def kernel_release_dir_url(kernel_version, mirror=KERNEL_ORG_MIRROR):
+    major = kernel_version.split(".")[0]
+    url = f"{mirror.rstrip('/')}/v{major}.x"
+    if "-rc" in kernel_version:
+        url += "/testing"
+    return url
+
+
+def kernel_tarball_url(kernel_version, mirror=KERNEL_ORG_MIRROR):
+    return f"{kernel_release_dir_url(kernel_version, mirror)}/linux-{kernel_version}.tar.xz"
+
+
+def parse_sha256sums(text):
+    # sha256sums.asc is a clearsigned list of "<sha256>  <file name>" lines
+    checksums = {}
+    for line in text.splitlines():
+        match = re.match(r"^([0-9a-f]{64})\s+\*?(\S+)$", line.strip())
+        if match:
+            checksums[match.group(2)] = match.group(1)
+    return checksums
+
+
+def xz_intact(path):
+    """
+    Integrity check of an xz file (like xz -t): decompresses it completely and
+    returns False if it is truncated or corrupted. For tarballs without a
+    published checksum to compare with.
+    """
+    if shutil.which("xz"):
+        return subprocess.run(["xz", "-t", "-T0", path], capture_output=True).returncode == 0
+    try:
+        with lzma.open(path, "rb") as f:
+            while f.read(HASH_CHUNK_SIZE):
+                pass
+    except (lzma.LZMAError, EOFError):
+        return False
+    return True
+
+
+def sha256_of_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SegmentedDownloader:
+    """
+    Downloads a file over HTTP(S) in `segments` parallel byte ranges. Every
+    segment is written to its own part file next to the destination, so an
+    interrupted download continues where it stopped on the next run. Servers
+    without range support get a plain single-stream download.
+    """
+
+    def __init__(self, segments=4, timeout=60, retries=3, log=print_log):
+        self.segments = max(1, segments)
+        self.timeout = timeout
+        self.retries = retries
+        self.log = log
+
+    def _probe(self, url):
+        request = urllib.request.Request(url, method="HEAD")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            size = int(response.headers.get("Content-Length") or 0)
+            accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        return size, accepts_ranges
+
+    def _fetch_range(self, url, part_path, start, end):
+        # Resume from whatever an earlier attempt already wrote
+        for attempt in range(1, self.retries + 1):
+            done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if start + done > end:
+                return
+            request = urllib.request.Request(url, headers={"Range": f"bytes={start + done}-{end}"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    if response.status != 206:
+                        raise IOError(f"server ignored range request (HTTP {response.status})")
+                    with open(part_path, "ab") as part:
+                        shutil.copyfileobj(response, part, HASH_CHUNK_SIZE)
+                if os.path.getsize(part_path) == end - start + 1:
+                    return
+            except (OSError, urllib.error.URLError) as e:
+                if attempt == self.retries:
+                    raise
+                self.log(f"Segment {start}-{end} interrupted ({e}), retrying ({attempt}/{self.retries})...", level='warning')
+        raise IOError(f"segment {start}-{end} of {url} is incomplete")
+
+    def _fetch_whole(self, url, dest):
+        with urllib.request.urlopen(url, timeout=self.timeout) as response, open(dest, "wb") as out:
+            shutil.copyfileobj(response, out, HASH_CHUNK_SIZE)
+
+    def download(self, url, dest):
+        size, accepts_ranges = self._probe(url)
+        if not size or not accepts_ranges or self.segments == 1:
+            self.log(f"Downloading {url} (single stream)...")
+            self._fetch_whole(url, dest)
+            return
+
+        parts_dir = f"{dest}.parts"
+        os.makedirs(parts_dir, exist_ok=True)
+        segment_size = -(-size // self.segments)
+        ranges = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+        part_paths = [os.path.join(parts_dir, f"{start}-{end}") for start, end in ranges]
+        # Parts from an earlier attempt with a different size or layout are useless
+        for stale in set(os.listdir(parts_dir)) - {os.path.basename(p) for p in part_paths}:
+            os.remove(os.path.join(parts_dir, stale))
+
+        self.log(f"Downloading {url} ({size} bytes) in {len(ranges)} segments...")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(self._fetch_range, url, path, start, end)
+                       for path, (start, end) in zip(part_paths, ranges)]
+            for future in futures:
+                future.result()
+
+        with open(dest, "wb") as out:
+            for path in part_paths:
+                with open(path, "rb") as part:
+                    shutil.copyfileobj(part, out, HASH_CHUNK_SIZE)
+        shutil.rmtree(parts_dir)
+
+
+class TarballCache:
+    """
+    Content-addressed store for kernel tarballs. Objects live under
+    objects/<sha256[:2]>/<sha256>, index.json maps file names to their hash
+    and last use, and every cached tarball is also hardlinked under its usual
+    name (kernel-sources/linux-X.tar.xz). The least recently used entries are
+    evicted once the cache grows beyond `max_size` bytes.
+    """
+
+    def __init__(self, root, max_size=None):
+        self.root = root
+        self.max_size = max_size
+        self.index_path = os.path.join(root, "index.json")
+        os.makedirs(root, exist_ok=True)
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def named_path(self, name):
+        return os.path.join(self.root, name)
+
+    def lookup(self, name):
+        entry = self._load_index().get(name)
+        if entry and os.path.exists(self.object_path(entry["sha256"])):
+            return entry
+        return None
+
+    def touch(self, name):
+        index = self._load_index()
+        index[name]["last_used"] = time.time()
+        self._save_index(index)
+        named = self.named_path(name)
+        if not os.path.exists(named):
+            os.link(self.object_path(index[name]["sha256"]), named)
+        return named
+
+    def add(self, name, path, sha256):
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.abspath(path) == os.path.abspath(self.named_path(name)):
+            if not os.path.exists(object_path):
+                os.link(path, object_path)
+        else:
+            os.replace(path, object_path)
+            if os.path.lexists(self.named_path(name)):
+                os.remove(self.named_path(name))
+            os.link(object_path, self.named_path(name))
+        index = self._load_index()
+        index[name] = {"sha256": sha256, "size": os.path.getsize(object_path), "last_used": time.time()}
+        self._save_index(index)
+        return self.named_path(name)
+
+    def remove(self, name):
+        index = self._load_index()
+        entry = index.pop(name, None)
+        for path in [self.named_path(name)] + ([self.object_path(entry["sha256"])] if entry else []):
+            if os.path.lexists(path):
+                os.remove(path)
+        self._save_index(index)
+
+    def evict(self, keep=()):
+        if self.max_size is None:
+            return []
+        index = self._load_index()
+        total = sum(entry["size"] for entry in index.values())
+        evicted = []
+        for name, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_size:
+                break
+            if name in keep:
+                continue
+            self.remove(name)
+            total -= entry["size"]
+            evicted.append(name)
+        return evicted
+
+
+class KernelSourceFetcher:
+    """
+    Makes sure linux-<version>.tar.xz is in the tarball cache and matches the
+    checksum published in kernel.org's sha256sums.asc (the OpenPGP signature
+    of that file itself is not checked here). Tarballs placed in
+    kernel-sources/ by hand are verified and adopted into the cache.
+    """
+
+    def __init__(self, cache, mirror=KERNEL_ORG_MIRROR, segments=4, verify=True, log=print_log):
+        self.cache = cache
+        self.mirror = mirror
+        self.verify = verify
+        self.log = log
+        self.downloader = SegmentedDownloader(segments=segments, log=log)
+
+    def _expected_sha256(self, kernel_version, tarball_name):
+        url = f"{kernel_release_dir_url(kernel_version, self.mirror)}/sha256sums.asc"
+        try:
+            with urllib.request.urlopen(url, timeout=self.downloader.timeout) as response:
+                checksums = parse_sha256sums(response.read().decode("utf-8", errors="replace"))
+        except (OSError, urllib.error.URLError) as e:
+            self.log(f"Could not fetch {url}: {e}", level='warning')
+            return None
+        if tarball_name not in checksums:
+            self.log(f"{tarball_name} is not listed in {url}", level='warning')
+        return checksums.get(tarball_name)
+
+    def fetch(self, kernel_version):
+        tarball_name = f"linux-{kernel_version}.tar.xz"
+        expected = self._expected_sha256(kernel_version, tarball_name) if self.verify else None
+        with cache_lock(self.cache.root):
+            path = self._fetch_locked(kernel_version, tarball_name, expected)
+            # Also after a cache hit: the limit may have been lowered since the last download
+            for evicted in self.cache.evict(keep=(tarball_name,)):
+                self.log(f"Evicted {evicted} from the source cache.")
+            return path
+
+    def _fetch_locked(self, kernel_version, tarball_name, expected):
+        entry = self.cache.lookup(tarball_name)
+        if entry and (expected is None or entry["sha256"] == expected):
+            self.log(f"Using cached {tarball_name} (sha256 {entry['sha256']}).")
+            return self.cache.touch(tarball_name)
+        if entry:
+            self.log(f"Cached {tarball_name} does not match the published checksum, fetching it again.", level='warning')
+            self.cache.remove(tarball_name)
+
+        named_path = self.cache.named_path(tarball_name)
+        if os.path.exists(named_path):
+            sha256 = sha256_of_file(named_path)
+            if expected is not None and sha256 == expected:
+                self.log(f"Adopting existing {named_path} into the source cache (sha256 {sha256}).")
+                return self.cache.add(tarball_name, named_path, sha256)
+            # Without a published checksum (mirror unreachable) the file is at least tested for truncation
+            if expected is None and (not self.verify or xz_intact(named_path)):
+                self.log(f"Adopting existing {named_path} into the source cache without a published checksum "
+                         f"(sha256 {sha256}, {'xz integrity check passed' if self.verify else 'not verified'}).", level='warning')
+                return self.cache.add(tarball_name, named_path, sha256)
+            self.log(f"Existing {named_path} is corrupted or truncated (sha256 {sha256}), fetching it again.", level='warning')
+            os.remove(named_path)
+
+        if self.verify and expected is None:
+            raise RuntimeError(f"No published sha256 checksum available for {tarball_name}, refusing to download it unverified.")
+
+        downloads_dir = os.path.join(self.cache.root, "downloads")
+        os.makedirs(downloads_dir, exist_ok=True)
+        download_path = os.path.join(downloads_dir, tarball_name)
+        self.downloader.download(kernel_tarball_url(kernel_version, self.mirror), download_path)
+
+        sha256 = sha256_of_file(download_path)
+        if expected is not None and sha256 != expected:
+            os.remove(download_path)
+            raise RuntimeError(f"Checksum mismatch for {tarball_name}: expected {expected}, got {sha256}.")
+        self.log(f"Downloaded {tarball_name} (sha256 {sha256}).")
+        return self.cache.add(tarball_name, download_path, sha256)
@@ -1,64 +1,104 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
 import subprocess
 import os
 import datetime
 import sys
 import os
+import json
+import re
+import threading
+import time
 
 # Add the repository root to sys.path for module imports
 repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 sys.path.insert(0, repo_root)
 
+from scripts.build_history import BuildHistory, DEFAULT_DB_PATH
+from scripts.builder_image import DEFAULT_IMAGE, ensure_image, image_status
+from scripts.container_pool import ContainerPool
+from scripts.docker_api import ContainerStatsSampler, DockerAPIError, DockerCli, DockerClient
+from scripts.kconfig import KconfigSymbolCache, KernelConfig, validate_config
 from scripts.kernel_builder import KernelBuilder
+from scripts.kernel_sources import DEFAULT_TARBALL_CACHE_SIZE
+from scripts.stage_graph import StageGraph
 
-def run_command(command, cwd=None, capture_output=False, check=True, log_file=None):
+# The GPG key and the build run in the container at the same time
+log_lock = threading.Lock()
+
+def exec_in_container(docker, container_name, command, log_file):
     """
-    Runs a shell command, optionally capturing output and writing to a log file.
+    Runs a command in the container and writes its output to the log file line
+    by line as it arrives, so the log can be followed while the build runs.
+    Raises CalledProcessError (with the last lines of output) on failure.
     """
-    print(f"Executing: {' '.join(command)}")
-    if log_file:
-        log_file.write(f"Executing: {' '.join(command)}\n")
+    print(f"Executing in {container_name}: {' '.join(command)}")
+    with log_lock:
+        log_file.write(f"Executing in {container_name}: {' '.join(command)}\n")
         log_file.flush()
 
-    if log_file:
-        capture_output = True
-
-    process = subprocess.run(
-        command,
-        cwd=cwd,
-        capture_output=capture_output,
-        text=True,
-        check=check,
-        encoding='utf-8'
-    )
-
-    if capture_output:
-        if log_file:
-            log_file.write(process.stdout)
-            log_file.write(process.stderr)
-            log_file.flush()
-        return process.stdout, process.stderr
-    else:
-        if log_file:
-            log_file.write(process.stdout)
-            log_file.write(process.stderr)
+    def write_line(line):
+        with log_lock:
+            log_file.write(line + "\n")
             log_file.flush()
-        return None, None
+
+    result = docker.exec_run(container_name, command, on_stdout=write_line, on_stderr=write_line)
+    result.check_returncode()
+    return result
+
+@contextlib.contextmanager
+def timed_stage(stages, name):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        stages[name] = round(time.monotonic() - start, 3)
 
 def main():
     parser = argparse.ArgumentParser(description="Build a custom Linux kernel RPM in a Docker container.")
     parser.add_argument("kernel_config_path", help="Path to the kernel configuration file (e.g., kernel-config/host-config/host-config.config)")
     parser.add_argument("kernel_release_suffix", nargs="?", default="", help="Optional suffix for the kernel release (e.g., my-build)")
     parser.add_argument("--make-jobs", "-j", help="Number of jobs for make. Can be an integer, \"auto\", or \"auto+1\". Default is \"auto\".", default="auto")
+    parser.add_argument("--kernel-version", default="6.16.8", help="Kernel version to build. Default is \"6.16.8\".")
+    parser.add_argument("--build-id", default=None, help="Unique name of this build, used for the log directory and the container name. Defaults to the build timestamp.")
+    parser.add_argument("--incremental", action="store_true", help="Reuse the persistent object tree under build-cache/ and rebuild only what changed.")
+    parser.add_argument("--compiler-cache", choices=["none", "ccache", "sccache"], default="none", help="Compiler cache shared between builds. Default is \"none\".")
+    parser.add_argument("--compiler-cache-dir", default=None, help="Host directory holding the compiler cache. Defaults to build-cache/compiler-cache in the repository.")
+    parser.add_argument("--compiler-cache-size", default="20G", help="Maximum compiler cache size, older entries are evicted. Default is \"20G\".")
+    parser.add_argument("--kernel-mirror", default=None, help="Base URL of a kernel.org mirror (must provide v<major>.x/sha256sums.asc). Default is cdn.kernel.org.")
+    parser.add_argument("--download-segments", type=int, default=4, help="Number of parallel range requests used to download the kernel tarball. Default is 4.")
+    parser.add_argument("--tarball-cache-size", default=DEFAULT_TARBALL_CACHE_SIZE, help=f"Size limit of the kernel-sources/ tarball cache, least recently used tarballs are evicted. Default is \"{DEFAULT_TARBALL_CACHE_SIZE}\".")
+    parser.add_argument("--source-cache", choices=["none", "tree", "zstd"], default="none", help="\"tree\" keeps an extracted pristine source tree per kernel version under build-cache/sources/, \"zstd\" a zstd recompressed tarball that extracts faster. Default is \"none\".")
+    parser.add_argument("--decompressor", choices=["auto", "xz", "xz-mt", "pixz"], default="auto", help="Decompressor for the xz tarball. Default is \"auto\" (pixz if available, otherwise xz -T0).")
+    parser.add_argument("--pool", action="store_true", help="Lease a pre-started container with a GPG key from the container pool (see container_pool.py) instead of starting a new one.")
+    parser.add_argument("--docker-backend", choices=["cli", "api"], default="cli", help="Control containers through the docker command (\"cli\") or directly through the Engine API socket (\"api\"), which also records the container's CPU, memory and block I/O. Default is \"cli\".")
+    parser.add_argument("--update-image", action="store_true", help="Rebuild the builder image first if it is missing or older than its Dockerfile and package lists.")
+    parser.add_argument("--compile-timing", action="store_true", help="Time every compiler call and write a ranking of the Kconfig symbols by compile time and module size (config-impact.json).")
+    parser.add_argument("--strict-config", action="store_true", help="Fail the build on configuration warnings (expensive options such as DEBUG_INFO, unknown symbols, symbols dropped by olddefconfig).")
+    parser.add_argument("--sign-jobs", type=int, default=4, help="Number of rpmsign batches run concurrently. Default is 4.")
+    parser.add_argument("--payload-compression", choices=["zstd", "xz", "gzip", "none"], default="zstd", help="Compression of the RPM payloads; zstd and xz use one thread per make job. Default is \"zstd\".")
+    parser.add_argument("--payload-level", type=int, default=None, help="Compression level of the RPM payloads. Defaults to 6 for zstd, 2 for xz and 6 for gzip.")
+    parser.add_argument("--build-id-links", choices=["none", "alldebug", "separate", "compat"], default="none", help="How rpm packages /usr/lib/.build-id links. Default is \"none\".")
+    parser.add_argument("--debuginfo", action="store_true", help="Also build a kernel-debuginfo package (only useful with CONFIG_DEBUG_INFO).")
+    parser.add_argument("--module-compression", choices=["zstd", "xz", "none"], default="zstd", help="Compression of the kernel modules in the kernel-modules RPM. Default is \"zstd\".")
+    parser.add_argument("--no-module-strip", action="store_true", help="Keep the debug sections of the kernel modules.")
+    parser.add_argument("--distcc-hosts", default=None, help="Also compile on these distcc hosts, e.g. \"buildbox1/16 buildbox2:3633/8\" (host[:port][/slots]). make -j becomes the total number of slots; unreachable hosts are skipped.")
+    parser.add_argument("--distcc-local-slots", type=int, default=2, help="Compile jobs kept in the container next to the distcc hosts. Default is 2.")
+    parser.add_argument("--history-db", default=DEFAULT_DB_PATH, help=f"Build history database the run is recorded in. Default is {DEFAULT_DB_PATH}.")
+    parser.add_argument("--regression-threshold", type=float, default=0.2, help="Growth of the build duration or RPM size over earlier runs of the same config that is reported as a regression. Default is 0.2 (20%%).")
     args = parser.parse_args()
 
     repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-    docker_image = "kernel-builder-py"
+    docker_image = DEFAULT_IMAGE
     build_script_in_container = "/workspace/scripts/kernel_builder.py"
+    compiler_cache_in_container = "/compiler-cache"
+    compiler_cache_dir = os.path.abspath(args.compiler_cache_dir or os.path.join(repo_root, "build-cache", "compiler-cache"))
 
     build_timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_dir = os.path.join(repo_root, "log", build_timestamp)
+    # Concurrent builds (see matrix_build.py) need their own log dir and container
+    build_id = re.sub(r"[^A-Za-z0-9_.-]", "-", args.build_id or build_timestamp)
+    log_dir = os.path.join(repo_root, "log", build_id)
     os.makedirs(log_dir, exist_ok=True)
 
     log_files = {
@@ -74,13 +114,19 @@ def main():
 
     with open(log_files['kernel-build'], "w", encoding='utf-8') as log_f:
         log_f.write(f">>> Build started at: {datetime.datetime.now()}\n")
+        log_f.write(f">>> Kernel Version: {args.kernel_version}\n")
         log_f.write(f">>> Kernel Config: {args.kernel_config_path}\n")
         log_f.write(f">>> Custom Suffix: {args.kernel_release_suffix}\n")
+        log_f.write(f">>> Incremental: {'yes' if args.incremental else 'no'}\n")
+        log_f.write(f">>> Compiler Cache: {args.compiler_cache}\n")
         log_f.flush()
 
         print(f">>> Build started at: {datetime.datetime.now()}")
+        print(f">>> Kernel Version: {args.kernel_version}")
         print(f">>> Kernel Config: {args.kernel_config_path}")
         print(f">>> Custom Suffix: {args.kernel_release_suffix}")
+        print(f">>> Incremental: {'yes' if args.incremental else 'no'}")
+        print(f">>> Compiler Cache: {args.compiler_cache}")
 
         cpu_model = "Unknown CPU"
         total_ram = "Unknown RAM"
@@ -92,64 +138,214 @@ def main():
             log_f.write(f"Warning: Could not get system info: {e}\n")
             log_f.flush()
 
-        container_name = "kernel-builder-container-py"
+        # Catch a broken config before a container is started or a tarball extracted
+        kernel_config = KernelConfig.from_file(os.path.join(repo_root, args.kernel_config_path))
+        known_symbols = KconfigSymbolCache(os.path.join(repo_root, "build-cache", "kconfig-symbols")).load(args.kernel_version)
+        config_issues = validate_config(kernel_config, args.kernel_version, known_symbols, args.strict_config)
+        for issue in config_issues:
+            print(f">>> {issue.level.upper()}: {issue.message}", file=sys.stderr if issue.level == "error" else sys.stdout)
+            log_f.write(f">>> {issue.level.upper()}: {issue.message}\n")
+        log_f.flush()
+        if any(issue.level == "error" for issue in config_issues):
+            print(f">>> ERROR: Kernel configuration {args.kernel_config_path} is not valid, aborting.", file=sys.stderr)
+            log_f.write(f">>> ERROR: Kernel configuration {args.kernel_config_path} is not valid, aborting.\n")
+            sys.exit(1)
+
+        container_name = f"kernel-builder-container-py-{build_id}"
         print(f">>> Building kernel in Docker (openSUSE Tumbleweed base)...")
         log_f.write(f">>> Building kernel in Docker (openSUSE Tumbleweed base)...\n")
         log_f.flush()
 
-        run_command(["docker", "rm", "-f", container_name], check=False, log_file=log_f)
+        if args.docker_backend == "api":
+            try:
+                docker = DockerClient()
+                if not docker.ping():
+                    raise DockerAPIError(f"The Docker daemon at {docker.socket_path} did not answer the ping.")
+            except DockerAPIError as e:
+                print(f">>> ERROR: {e}", file=sys.stderr)
+                log_f.write(f">>> ERROR: {e}\n")
+                sys.exit(1)
+        else:
+            docker = DockerCli()
+
+        if not args.pool:
+            docker.remove_container(container_name)
 
         start_time = datetime.datetime.now()
+        host_stages = {}
 
-        docker_run_cmd = [
-            "docker", "run", "-d", "--name", container_name,
-            "-v", f"{repo_root}:/workspace",
-            "-e", f"BUILD_TIMESTAMP={build_timestamp}",
-            "-e", f"LOG_DIR={log_dir}", # Pass log_dir to the container
-            docker_image,
-            "tail", "-f", "/dev/null"
-        ]
-        run_command(docker_run_cmd, log_file=log_f)
+        with timed_stage(host_stages, "image-check"):
+            image_state, image_dockerfile = image_status(docker_image, docker=docker)
+            if args.update_image and image_state in ("missing", "stale"):
+                try:
+                    ensure_image(docker_image, log=lambda message, level='info': print(f">>> {message}"), docker=docker)
+                except subprocess.CalledProcessError as e:
+                    print(f">>> ERROR: Could not build the Docker image: {e}", file=sys.stderr)
+                    log_f.write(f">>> ERROR: Could not build the Docker image: {e}\n")
+                    sys.exit(1)
+            elif image_state == "missing":
+                print(f">>> ERROR: Docker image '{docker_image}' not found. Build it with docker/build-tumbleweed.sh or pass --update-image.", file=sys.stderr)
+                log_f.write(f">>> ERROR: Docker image '{docker_image}' not found.\n")
+                sys.exit(1)
+            elif image_state == "stale":
+                print(f">>> WARNING: Docker image '{docker_image}' is older than {image_dockerfile} or its package lists. Rebuild it or pass --update-image.")
+                log_f.write(f">>> WARNING: Docker image '{docker_image}' is older than {image_dockerfile} or its package lists.\n")
+        log_f.flush()
 
-        try:
-            print(">>> Generating GPG key pair inside container...")
-            log_f.write(f">>> Generating GPG key pair inside container...\n")
+        pool = None
+        container_stats = None
+        if args.pool:
+            # Pool containers always mount the compiler cache and already have a GPG key
+            pool = ContainerPool(image=docker_image, compiler_cache_dir=compiler_cache_dir,
+                                 log=lambda message, level='info': print(f">>> {message}"), docker=docker)
+            try:
+                with timed_stage(host_stages, "container-lease"):
+                    container_name = pool.lease(build_id)
+            except (subprocess.CalledProcessError, DockerAPIError) as e:
+                print(f">>> ERROR: Could not lease a pool container: {e}: {getattr(e, 'stderr', '')}", file=sys.stderr)
+                log_f.write(f">>> ERROR: Could not lease a pool container: {e}: {getattr(e, 'stderr', '')}\n")
+                sys.exit(1)
+            print(f">>> Leased pool container {container_name}")
+            log_f.write(f">>> Leased pool container {container_name}\n")
             log_f.flush()
-            run_command(["docker", "exec", container_name, "bash", "/workspace/scripts/generate_gpg_key.sh"], log_file=open(log_files['gpg-signing'], 'a'))
-
-            print(">>> Executing kernel_builder.py inside Docker container...")
-            log_f.write(f">>> Executing kernel_builder.py inside Docker container...\n")
+        else:
+            volumes = [f"{repo_root}:/workspace"]
+            if args.compiler_cache != "none":
+                os.makedirs(compiler_cache_dir, exist_ok=True)
+                volumes.append(f"{compiler_cache_dir}:{compiler_cache_in_container}")
+            environment = {
+                "BUILD_TIMESTAMP": build_timestamp,
+                "LOG_DIR": log_dir, # Pass log_dir to the container
+            }
+            print(f">>> Starting container {container_name} ({docker.name} backend)")
+            log_f.write(f">>> Starting container {container_name} ({docker.name} backend)\n")
             log_f.flush()
+            try:
+                with timed_stage(host_stages, "container-start"):
+                    docker.run_container(container_name, docker_image, ["tail", "-f", "/dev/null"], volumes, environment)
+            except (subprocess.CalledProcessError, DockerAPIError) as e:
+                print(f">>> ERROR: Could not start the container: {e}", file=sys.stderr)
+                log_f.write(f">>> ERROR: Could not start the container: {e}: {getattr(e, 'stderr', '')}\n")
+                sys.exit(1)
 
+        build_failed = False
+        try:
             docker_exec_cmd = [
-                "docker", "exec", container_name,
                 "python3", build_script_in_container,
                 args.kernel_config_path,
                 args.kernel_release_suffix,
                 "--repo-root", "/workspace",
                 "--rpmbuild-root", "/root/rpmbuild",
-                "--log-dir", f"/workspace/log/{build_timestamp}", # Pass log_dir in container context
-                "--make-jobs", args.make_jobs
+                "--log-dir", f"/workspace/log/{build_id}", # Pass log_dir in container context
+                "--kernel-version", args.kernel_version,
+                "--make-jobs", args.make_jobs,
+                "--download-segments", str(args.download_segments),
+                "--tarball-cache-size", args.tarball_cache_size,
+                "--source-cache", args.source_cache,
+                "--decompressor", args.decompressor,
+                "--sign-jobs", str(args.sign_jobs),
+                "--payload-compression", args.payload_compression,
+                "--build-id-links", args.build_id_links,
+                "--module-compression", args.module_compression
             ]
-            run_command(docker_exec_cmd, log_file=log_f)
+            if args.no_module_strip:
+                docker_exec_cmd.append("--no-module-strip")
+            if args.distcc_hosts:
+                docker_exec_cmd += ["--distcc-hosts", args.distcc_hosts, "--distcc-local-slots", str(args.distcc_local_slots)]
+            if args.payload_level is not None:
+                docker_exec_cmd += ["--payload-level", str(args.payload_level)]
+            if args.debuginfo:
+                docker_exec_cmd.append("--debuginfo")
+            if args.strict_config:
+                docker_exec_cmd.append("--strict-config")
+            if args.compile_timing:
+                docker_exec_cmd.append("--compile-timing")
+            if args.incremental:
+                docker_exec_cmd.append("--incremental")
+            if args.kernel_mirror:
+                docker_exec_cmd += ["--kernel-mirror", args.kernel_mirror]
+            if args.compiler_cache != "none":
+                docker_exec_cmd += [
+                    "--compiler-cache", args.compiler_cache,
+                    "--compiler-cache-dir", compiler_cache_in_container,
+                    "--compiler-cache-size", args.compiler_cache_size
+                ]
+
+            # The key is only needed for signing, kernel_builder.py waits for
+            # the status file before that stage instead of the build waiting here
+            host_graph = StageGraph()
+            if not pool:
+                signing_key_status_path = os.path.join(log_dir, "signing-key.status")
+                if os.path.exists(signing_key_status_path):
+                    os.remove(signing_key_status_path)
+                docker_exec_cmd += ["--wait-for-signing-key", f"/workspace/log/{build_id}/signing-key.status"]
+
+                def generate_signing_key():
+                    print(">>> Generating GPG key pair inside container...")
+                    with log_lock:
+                        log_f.write(">>> Generating GPG key pair inside container...\n")
+                        log_f.flush()
+                    status = "failed"
+                    try:
+                        with timed_stage(host_stages, "gpg-key"), open(log_files['gpg-signing'], 'a', encoding='utf-8') as gpg_log_f:
+                            exec_in_container(docker, container_name, ["bash", "/workspace/scripts/generate_gpg_key.sh"], gpg_log_f)
+                        status = "ready"
+                    finally:
+                        # kernel_builder.py polls the file, it must never see it half written
+                        with open(f"{signing_key_status_path}.tmp", "w", encoding='utf-8') as status_f:
+                            status_f.write(f"{status}\n")
+                        os.replace(f"{signing_key_status_path}.tmp", signing_key_status_path)
+
+                host_graph.add("gpg-key", generate_signing_key)
+
+            def run_kernel_builder():
+                nonlocal container_stats
+                print(">>> Executing kernel_builder.py inside Docker container...")
+                with log_lock:
+                    log_f.write(">>> Executing kernel_builder.py inside Docker container...\n")
+                    log_f.flush()
+                # Resource usage of the whole container, only the Engine API exposes it cheaply
+                stats_sampler = None
+                if args.docker_backend == "api":
+                    stats_sampler = ContainerStatsSampler(docker, container_name, samples_path=os.path.join(log_dir, "container-stats.jsonl"))
+                    stats_sampler.start()
+                try:
+                    with timed_stage(host_stages, "kernel-builder"):
+                        exec_in_container(docker, container_name, docker_exec_cmd, log_f)
+                finally:
+                    if stats_sampler:
+                        container_stats = stats_sampler.stop()
+
+            host_graph.add("kernel-builder", run_kernel_builder)
+            host_graph.run()
 
             print(">>> RPM build finished successfully.")
             log_f.write(f">>> RPM build finished successfully.\n")
             log_f.flush()
 
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, DockerAPIError) as e:
+            # The command's output is already in the log, print its end for the console
             print(f">>> ERROR: Kernel build failed: {e}", file=sys.stderr)
+            for line in (getattr(e, 'stdout', None) or "").splitlines()[-20:]:
+                print(f"    {line}", file=sys.stderr)
             log_f.write(f">>> ERROR: Kernel build failed: {e}\n")
-            log_f.write(f"Stdout: {e.stdout}\n")
-            log_f.write(f"Stderr: {e.stderr}\n")
             log_f.flush()
-            sys.exit(1)
+            # Reported and recorded in the history like a successful build, the exit code follows at the end
+            build_failed = True
         finally:
-            print(">>> Stopping and removing Docker container...")
-            log_f.write(f">>> Stopping and removing Docker container...\n")
-            log_f.flush()
-            run_command(["docker", "stop", container_name], check=False, log_file=log_f)
-            run_command(["docker", "rm", container_name], check=False, log_file=log_f)
+            if pool:
+                print(f">>> Returning container {container_name} to the pool...")
+                log_f.write(f">>> Returning container {container_name} to the pool...\n")
+                log_f.flush()
+                with timed_stage(host_stages, "container-release"):
+                    pool.release(container_name)
+            else:
+                print(">>> Stopping and removing Docker container...")
+                log_f.write(f">>> Stopping and removing Docker container...\n")
+                log_f.flush()
+                with timed_stage(host_stages, "container-stop"):
+                    docker.stop_container(container_name)
+                    docker.remove_container(container_name)
 
         end_time = datetime.datetime.now()
         duration = (end_time - start_time).total_seconds()
@@ -164,24 +360,132 @@ def main():
             except ValueError:
                 make_jobs_str = f"{args.make_jobs} (invalid)"
 
+        # Written by kernel_builder.py inside the container
+        build_metrics = {}
+        build_metrics_path = os.path.join(log_dir, "build-metrics.json")
+        if os.path.exists(build_metrics_path):
+            with open(build_metrics_path, encoding='utf-8') as metrics_f:
+                build_metrics = json.load(metrics_f)
+        if build_failed:
+            # Without metrics (kernel_builder.py did not get far) or with a failure after it finished
+            build_metrics["status"] = "failed"
+        compiler_cache_stats = build_metrics.get("compiler_cache")
+
+        report = {
+            "build_id": build_id,
+            "timestamp": build_timestamp,
+            "kernel_version": args.kernel_version,
+            "kernel_config": args.kernel_config_path,
+            "config_hash": kernel_config.fingerprint(),
+            "custom_suffix": args.kernel_release_suffix,
+            "cpu_model": cpu_model,
+            "total_ram": total_ram,
+            "make_jobs": make_jobs_str,
+            "incremental": args.incremental,
+            "compiler_cache": args.compiler_cache,
+            "source_cache": args.source_cache,
+            "total_duration_seconds": round(duration, 2),
+            "host_stages": host_stages,
+            "docker_backend": args.docker_backend,
+            "container_stats": container_stats,
+            "build": build_metrics,
+        }
+
+        # Compare with earlier runs of the same config, see build_history.py
+        regressions = []
+        try:
+            history = BuildHistory(args.history_db)
+            history.record(report)
+            # A failed build stops early, its durations say nothing about performance
+            if not build_failed:
+                regressions = history.check_regressions(history.get_run(build_id), threshold=args.regression_threshold)
+            history.close()
+        except Exception as e:
+            print(f"Warning: Could not update the build history: {e}", file=sys.stderr)
+            log_f.write(f"Warning: Could not update the build history: {e}\n")
+        for regression in regressions:
+            print(f">>> WARNING: {regression}")
+            log_f.write(f">>> WARNING: {regression}\n")
+        log_f.flush()
+
         report_file_path = os.path.join(log_dir, "report-summary.log")
         with open(report_file_path, "w", encoding='utf-8') as report_f:
             report_f.write(f"--- Kernel Build Report ---\n")
             report_f.write(f"Timestamp: {build_timestamp}\n")
+            report_f.write(f"Build ID: {build_id}\n")
+            report_f.write(f"Kernel Version: {args.kernel_version}\n")
             report_f.write(f"Kernel Config: {os.path.basename(args.kernel_config_path)}\n")
             report_f.write(f"Custom Suffix: {args.kernel_release_suffix if args.kernel_release_suffix else 'None'}\n")
             report_f.write(f"CPU Model: {cpu_model}\n")
             report_f.write(f"Total RAM: {total_ram}\n")
             report_f.write(f"CPU Cores for Compilation: {make_jobs_str}\n")
+            report_f.write(f"Incremental Build: {'yes' if args.incremental else 'no'}\n")
+            report_f.write(f"Source Cache: {args.source_cache}\n")
+            if compiler_cache_stats:
+                report_f.write(f"Compiler Cache: {compiler_cache_stats['tool']} ({compiler_cache_dir}, max {compiler_cache_stats['max_size']})\n")
+                report_f.write(f"Compiler Cache Hits/Misses: {compiler_cache_stats['hits']}/{compiler_cache_stats['misses']} ({compiler_cache_stats['hit_rate']}% hit rate)\n")
+            else:
+                report_f.write(f"Compiler Cache: none\n")
+            packaging = build_metrics.get("packaging")
+            if packaging:
+                report_f.write(f"RPM Payload: {packaging['_binary_payload']} ({packaging['_smp_build_nthreads']} packaging threads, debuginfo {'on' if packaging['debuginfo'] else 'off'})\n")
+            modules = build_metrics.get("modules")
+            if modules:
+                report_f.write(f"Modules: {modules['modules']}, {modules['bytes'] / 2**20:.1f} MiB installed -> "
+                               f"{modules['final_bytes'] / 2**20:.1f} MiB ({'stripped, ' if modules['strip'] else ''}{modules['compression']}), depmod {modules['depmod']}\n")
+            distcc = build_metrics.get("distcc")
+            if distcc:
+                if distcc["active"]:
+                    report_f.write(f"Distributed Compilation: distcc, make -j{distcc['make_jobs']} ({distcc['hosts']})\n")
+                    for stage_name, hosts in distcc.get("utilization", {}).items():
+                        report_f.write(f"  {stage_name}: " + ", ".join(f"{host['host']} {host['utilization_percent']}%" for host in hosts if host["reachable"]) + "\n")
+                else:
+                    report_f.write(f"Distributed Compilation: no distcc host reachable, compiled locally\n")
+            report_f.write(f"Build Status: {build_metrics.get('status', 'unknown')}\n")
             report_f.write(f"Total Build Duration: {duration:.2f} seconds\n")
+            report_f.write(f"Host Stages:\n")
+            for name, stage_duration in host_stages.items():
+                report_f.write(f"  {name:<20} {stage_duration:10.2f} s\n")
+            if container_stats and container_stats["samples"]:
+                report_f.write(f"Container Resources: CPU {container_stats['cpu_percent_mean']}% mean / {container_stats['cpu_percent_max']}% max, "
+                               f"peak memory {container_stats['memory_peak_bytes'] / 2**20:.0f} MiB, "
+                               f"block I/O read {container_stats['block_read_bytes'] / 2**20:.0f} MiB / written {container_stats['block_write_bytes'] / 2**20:.0f} MiB\n")
+            report_f.write(f"Build Stages:\n")
+            for stage in build_metrics.get("stages", []):
+                report_f.write(f"  {stage['name']:<20} {stage['duration_seconds']:10.2f} s\n")
+                resources = stage.get("resources")
+                if resources:
+                    report_f.write(f"    peak RSS {resources['peak_rss_bytes'] / 2**20:.0f} MiB, "
+                                   f"CPU utilization {resources['cpu_utilization_percent']}%, "
+                                   f"I/O read {resources['read_bytes'] / 2**20:.0f} MiB / written {resources['write_bytes'] / 2**20:.0f} MiB, "
+                                   f"max load {resources['load_average_max']}\n")
+            config_impact = build_metrics.get("config_impact")
+            critical_path = build_metrics.get("critical_path")
+            if critical_path:
+                report_f.write(f"Critical Path: {' -> '.join(stage['name'] for stage in critical_path)} "
+                               f"({sum(stage['duration_seconds'] for stage in critical_path):.2f} s)\n")
+            if config_impact:
+                report_f.write(f"Most expensive config symbols (compiler CPU time, see config-impact.json):\n")
+                for stats in config_impact["top_symbols"][:5]:
+                    report_f.write(f"  {stats['symbol']:<30} {stats['cpu_seconds']:10.1f} s ({stats['cpu_share_percent']}%)\n")
+            if regressions:
+                report_f.write(f"Regressions against earlier runs:\n")
+                for regression in regressions:
+                    report_f.write(f"  {regression}\n")
             report_f.write(f"Full log: {log_files['kernel-build']}\n")
             report_f.write(f"---------------------------\n")
 
-        print(f"Build report saved to: {report_file_path}")
-        log_f.write(f"Build report saved to: {report_file_path}\n")
+        report_json_path = os.path.join(log_dir, "report-summary.json")
+        with open(report_json_path, "w", encoding='utf-8') as report_json_f:
+            json.dump(report, report_json_f, indent=2)
+
+        print(f"Build report saved to: {report_file_path} (machine-readable: {report_json_path})")
+        log_f.write(f"Build report saved to: {report_file_path} (machine-readable: {report_json_path})\n")
         log_f.write(f"End date: {datetime.datetime.now()}\n")
         log_f.flush()
         print(f"End date: {datetime.datetime.now()}")
+        if build_failed:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.kernel_sources import DEFAULT_TARBALL_CACHE_SIZE, KERNEL_ORG_MIRROR, KernelSourceFetcher, TarballCache, parse_size
+
+print_lock = threading.Lock()
+
+
+def log(message):
+    with print_lock:
+        print(message, flush=True)
+
+
+class BuildTarget:
+    def __init__(self, kernel_version, kernel_config_path, suffix=""):
+        self.kernel_version = kernel_version
+        self.kernel_config_path = kernel_config_path
+        self.suffix = suffix
+
+    @property
+    def label(self):
+        config_name = os.path.basename(self.kernel_config_path)
+        if config_name.endswith(".config"):
+            config_name = config_name[:-len(".config")]
+        label = f"{self.kernel_version}-{config_name}"
+        if self.suffix:
+            label += f"-{self.suffix}"
+        return re.sub(r"[^A-Za-z0-9_.-]", "-", label)
+
+
+def parse_target(spec):
+    # VERSION:CONFIG[:SUFFIX], e.g. 6.16.8:kernel-config/tiny-config/tiny.config:tiny
+    parts = spec.split(":")
+    if len(parts) not in (2, 3) or not parts[0] or not parts[1]:
+        raise argparse.ArgumentTypeError(f"invalid target '{spec}', expected VERSION:CONFIG[:SUFFIX]")
+    return BuildTarget(parts[0], parts[1], parts[2] if len(parts) == 3 else "")
+
+
+def load_matrix_file(path):
+    """
+    Reads a JSON list of targets:
+    [{"version": "6.16.8", "config": "kernel-config/tiny-config/tiny.config", "suffix": "tiny"}, ...]
+    """
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    return [BuildTarget(entry["version"], entry["config"], entry.get("suffix", "")) for entry in entries]
+
+
+def split_job_budget(budget, parallel):
+    """Splits `budget` make jobs over `parallel` concurrent builds, e.g. 16 over 3 -> [6, 5, 5]."""
+    parallel = max(1, parallel)
+    base, remainder = divmod(max(budget, parallel), parallel)
+    return [base + (1 if i < remainder else 0) for i in range(parallel)]
+
+
+def prefetch_sources(targets, kernel_mirror, cache_size=None, segments=4):
+    # Fetch every kernel version once up front, so concurrent builds never
+    # race to download the same tarball into the shared source cache.
+    cache = TarballCache(os.path.join(repo_root, "kernel-sources"), cache_size)
+    fetcher = KernelSourceFetcher(cache, mirror=kernel_mirror, segments=segments,
+                                  log=lambda message, level='info': log(f">>> [sources] {message}"))
+    for kernel_version in sorted({target.kernel_version for target in targets}):
+        fetcher.fetch(kernel_version)
+
+
+class MatrixScheduler:
+    """
+    Runs local_kernel_build.py for every target, at most `parallel` at a time,
+    each in its own container and log directory. Make jobs come from a shared
+    budget: a build is started with the slot's share of `jobs_budget`.
+    """
+
+    def __init__(self, targets, parallel, jobs_budget, matrix_id, extra_args):
+        self.targets = targets
+        self.parallel = max(1, min(parallel, len(targets)))
+        self.jobs_budget = jobs_budget
+        self.matrix_id = matrix_id
+        self.extra_args = extra_args
+        self.free_slots = list(enumerate(split_job_budget(jobs_budget, self.parallel)))
+        self.slots_lock = threading.Lock()
+
+    def _acquire_slot(self):
+        with self.slots_lock:
+            return self.free_slots.pop(0)
+
+    def _release_slot(self, slot):
+        with self.slots_lock:
+            self.free_slots.append(slot)
+
+    def _run_target(self, target):
+        slot_index, make_jobs = self._acquire_slot()
+        build_id = f"{self.matrix_id}_{target.label}"
+        log_dir = os.path.join(repo_root, "log", build_id)
+        os.makedirs(log_dir, exist_ok=True)
+        command = [
+            sys.executable, os.path.join(repo_root, "scripts", "local_kernel_build.py"),
+            target.kernel_config_path, target.suffix,
+            "--kernel-version", target.kernel_version,
+            "--make-jobs", str(make_jobs),
+            "--build-id", build_id,
+        ] + self.extra_args
+
+        log(f">>> [{target.label}] started in slot {slot_index} with {make_jobs} make jobs (logs: {log_dir})")
+        start_time = datetime.datetime.now()
+        try:
+            with open(os.path.join(log_dir, "console.log"), "w", encoding='utf-8') as console_f:
+                returncode = subprocess.call(command, stdout=console_f, stderr=subprocess.STDOUT, cwd=repo_root)
+        finally:
+            self._release_slot((slot_index, make_jobs))
+        duration = (datetime.datetime.now() - start_time).total_seconds()
+
+        status = "success" if returncode == 0 else f"failed (exit code {returncode})"
+        log(f">>> [{target.label}] {status} after {duration:.2f} seconds")
+        return {
+            "target": target.label,
+            "kernel_version": target.kernel_version,
+            "kernel_config": target.kernel_config_path,
+            "suffix": target.suffix,
+            "make_jobs": make_jobs,
+            "build_id": build_id,
+            "log_dir": log_dir,
+            "returncode": returncode,
+            "duration_seconds": round(duration, 2),
+        }
+
+    def run(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            return list(executor.map(self._run_target, self.targets))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build several kernel configurations and versions concurrently, each in its own Docker container.",
+        epilog="Any other options (e.g. --incremental, --compiler-cache ccache) are passed to every local_kernel_build.py run."
+    )
+    parser.add_argument("--target", "-t", action="append", type=parse_target, default=[], help="Build target as VERSION:CONFIG[:SUFFIX]. Can be given several times.")
+    parser.add_argument("--matrix", help="JSON file with a list of targets ({\"version\", \"config\", \"suffix\"}).")
+    parser.add_argument("--parallel", "-p", type=int, default=2, help="Number of builds running at the same time. Default is 2.")
+    parser.add_argument("--jobs-budget", type=int, default=os.cpu_count(), help=f"Total make jobs shared by all running builds. Default is the number of CPUs ({os.cpu_count()}).")
+    parser.add_argument("--kernel-mirror", default=KERNEL_ORG_MIRROR, help="kernel.org mirror used to prefetch the source tarballs.")
+    parser.add_argument("--download-segments", type=int, default=4, help="Number of parallel range requests per tarball download. Default is 4.")
+    parser.add_argument("--tarball-cache-size", default=DEFAULT_TARBALL_CACHE_SIZE, help=f"Size limit of the kernel-sources/ tarball cache. Default is \"{DEFAULT_TARBALL_CACHE_SIZE}\".")
+    args, extra_args = parser.parse_known_args()
+
+    targets = list(args.target)
+    if args.matrix:
+        targets += load_matrix_file(args.matrix)
+    if not targets:
+        parser.error("no targets given, use --target and/or --matrix")
+    labels = [target.label for target in targets]
+    duplicates = sorted({label for label in labels if labels.count(label) > 1})
+    if duplicates:
+        parser.error(f"duplicate targets: {', '.join(duplicates)}")
+    if args.kernel_mirror != KERNEL_ORG_MIRROR:
+        extra_args += ["--kernel-mirror", args.kernel_mirror]
+    # The builds share the cache, every one of them must keep it within the same limit
+    extra_args += ["--download-segments", str(args.download_segments), "--tarball-cache-size", args.tarball_cache_size]
+
+    matrix_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    scheduler = MatrixScheduler(targets, args.parallel, args.jobs_budget, matrix_id, extra_args)
+    log(f">>> Matrix build {matrix_id}: {len(targets)} targets, {scheduler.parallel} in parallel, job budget {args.jobs_budget}")
+
+    try:
+        prefetch_sources(targets, args.kernel_mirror, parse_size(args.tarball_cache_size), args.download_segments)
+    except Exception as e:
+        print(f">>> ERROR: Could not prefetch kernel sources: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    results = scheduler.run()
+
+    summary_path = os.path.join(repo_root, "log", f"matrix_{matrix_id}.json")
+    with open(summary_path, "w", encoding='utf-8') as summary_f:
+        json.dump({"matrix_id": matrix_id, "jobs_budget": args.jobs_budget, "parallel": scheduler.parallel, "targets": results}, summary_f, indent=2)
+
+    log(f"--- Matrix Build Report ({matrix_id}) ---")
+    for result in results:
+        status = "OK" if result["returncode"] == 0 else "FAILED"
+        log(f"{result['target']:<40} {status:<7} {result['duration_seconds']:>10.2f} s  -j{result['make_jobs']}  {result['log_dir']}")
+    log(f"Summary saved to: {summary_path}")
+
+    if any(result["returncode"] != 0 for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Strips and compresses the modules of a staged kernel and runs depmod on it.
+
+Called from the %install section of the generated spec after
+`make modules_install ... DEPMOD=/bin/true`:
+
+    module_postprocess.py BUILDROOT KERNELRELEASE --compression zstd --config .config --jobs 16 --report module-postprocess.json
+
+Every module is handled by its own worker process (strip, then zstd or xz),
+so the work spreads over all cores. depmod runs afterwards, because it has
+to index the compressed file names. With --config (the .config the kernel
+was built with) modules are only compressed in a format that kernel can
+decompress, at the level kbuild would use.
+"""
+import argparse
+import concurrent.futures
+import json
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.kconfig import KernelConfig
+
+COMPRESSION_SUFFIXES = {"zstd": ".zst", "xz": ".xz"}
+# kbuild's levels for CONFIG_MODULE_COMPRESS_*; zstd -19 is several times slower for a few percent
+DEFAULT_LEVELS = {"zstd": 3, "xz": 6}
+# The format the in-kernel decompressor (CONFIG_MODULE_DECOMPRESS) is built for
+COMPRESSION_OPTIONS = {"zstd": "MODULE_COMPRESS_ZSTD", "xz": "MODULE_COMPRESS_XZ"}
+# Appended by scripts/sign-file; stripping would cut the signature off
+MODULE_SIGNATURE_MAGIC = b"~Module signature appended~\n"
+
+
+def _is_signed(path):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < len(MODULE_SIGNATURE_MAGIC):
+            return False
+        f.seek(-len(MODULE_SIGNATURE_MAGIC), os.SEEK_END)
+        return f.read() == MODULE_SIGNATURE_MAGIC
+
+
+def _compress_xz(path, level):
+    # The in-kernel xz decompressor (CONFIG_MODULE_DECOMPRESS) needs CRC32 and a small dictionary
+    filters = [{"id": lzma.FILTER_LZMA2, "preset": level, "dict_size": 1 << 20}]
+    with open(path, "rb") as src, lzma.open(path + ".xz", "wb", check=lzma.CHECK_CRC32, filters=filters) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.remove(path)
+
+
+def process_module(path, strip=True, compression="zstd", level=None):
+    """Strips and compresses one module in place. Returns its sizes at each step."""
+    size = os.path.getsize(path)
+    signed = _is_signed(path)
+    if strip and not signed:
+        subprocess.run(["strip", "--strip-debug", path], check=True, capture_output=True, text=True)
+    stripped_size = os.path.getsize(path)
+    level = level if level is not None else DEFAULT_LEVELS.get(compression)
+    if compression == "zstd":
+        # One thread per module, the parallelism comes from the process pool
+        subprocess.run(["zstd", "-q", "-f", "--rm", f"-{level}", "-T1", path], check=True, capture_output=True, text=True)
+    elif compression == "xz":
+        _compress_xz(path, level)
+    final_path = path + COMPRESSION_SUFFIXES.get(compression, "")
+    return {
+        "module": path,
+        "bytes": size,
+        "stripped_bytes": stripped_size,
+        "final_bytes": os.path.getsize(final_path),
+        "signed": signed,
+    }
+
+
+def unloadable_compression(config, compression):
+    """Why the kernel of `config` could not load modules compressed with `compression`, or None."""
+    if compression not in COMPRESSION_OPTIONS:
+        return None
+    missing = [f"CONFIG_{option}" for option in ("MODULE_DECOMPRESS", COMPRESSION_OPTIONS[compression]) if not config.enabled(option)]
+    if missing:
+        return f"{' and '.join(missing)} not set, the kernel cannot decompress {compression} modules"
+    return None
+
+
+def configured_level(config, compression):
+    """The compression level of `config` (CONFIG_MODULE_COMPRESS_ZSTD_LEVEL), else kbuild's default."""
+    value = config.get("MODULE_COMPRESS_ZSTD_LEVEL") if compression == "zstd" else "n"
+    return int(value) if value.isdigit() else DEFAULT_LEVELS.get(compression)
+
+
+def find_modules(module_dir):
+    modules = []
+    for dirpath, _, filenames in os.walk(module_dir):
+        modules += [os.path.join(dirpath, name) for name in filenames if name.endswith(".ko")]
+    return sorted(modules)
+
+
+def run_depmod(buildroot, kernel_release, module_dir):
+    """Runs depmod on the staged tree. Returns "ok", "missing" or "no-output"."""
+    depmod = shutil.which("depmod") or next((path for path in ("/sbin/depmod", "/usr/sbin/depmod") if os.path.exists(path)), None)
+    if not depmod:
+        return "missing"
+    command = [depmod, "-b", buildroot]
+    system_map = os.path.join(buildroot, "boot", f"System.map-{kernel_release}")
+    if os.path.exists(system_map):
+        command += ["-F", system_map]
+    process = subprocess.run(command + [kernel_release], check=True, capture_output=True, text=True)
+    # Warnings such as unknown symbols still belong in the build log
+    if process.stderr:
+        sys.stderr.write(process.stderr)
+    # depmod builds with a different module directory (e.g. /usr/lib/modules) look elsewhere
+    return "ok" if os.path.exists(os.path.join(module_dir, "modules.dep")) else "no-output"
+
+
+def postprocess(buildroot, kernel_release, compression="zstd", level=None, strip=True, jobs=None, depmod=True, config=None):
+    """
+    Strips and compresses every module below `buildroot`, then runs depmod.
+    `config` is the KernelConfig the kernel was built with: modules stay
+    uncompressed if it cannot decompress them, and its level is the default.
+    """
+    module_dir = os.path.join(buildroot, "lib", "modules", kernel_release)
+    compression_skipped = None
+    if config is not None:
+        compression_skipped = unloadable_compression(config, compression)
+        if compression_skipped:
+            compression = "none"
+        elif level is None:
+            level = configured_level(config, compression)
+    if level is None:
+        level = DEFAULT_LEVELS.get(compression)
+    modules = find_modules(module_dir)
+    start = time.monotonic()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        results = list(executor.map(process_module, modules, [strip] * len(modules),
+                                    [compression] * len(modules), [level] * len(modules), chunksize=8))
+    process_seconds = time.monotonic() - start
+
+    depmod_status = "skipped"
+    depmod_seconds = 0.0
+    if depmod:
+        start = time.monotonic()
+        depmod_status = run_depmod(buildroot, kernel_release, module_dir)
+        depmod_seconds = time.monotonic() - start
+
+    for result in results:
+        result["module"] = os.path.relpath(result["module"], module_dir)
+    return {
+        "totals": {
+            "modules": len(results),
+            "signed_modules": sum(1 for result in results if result["signed"]),
+            "bytes": sum(result["bytes"] for result in results),
+            "stripped_bytes": sum(result["stripped_bytes"] for result in results),
+            "final_bytes": sum(result["final_bytes"] for result in results),
+            "compression": compression,
+            "level": level,
+            "compression_skipped": compression_skipped,
+            "strip": strip,
+            "process_seconds": round(process_seconds, 2),
+            "depmod": depmod_status,
+            "depmod_seconds": round(depmod_seconds, 2),
+        },
+        "largest": sorted(results, key=lambda result: result["final_bytes"], reverse=True)[:20],
+    }
+
+
+def format_summary(report):
+    totals = report["totals"]
+    compression = totals["compression"]
+    if totals.get("level") is not None and compression != "none":
+        compression += f" -{totals['level']}"
+    return [
+        f"Modules: {totals['modules']} ({totals['signed_modules']} signed, kept unstripped), "
+        f"{totals['bytes'] / 2**20:.1f} MiB installed, {totals['stripped_bytes'] / 2**20:.1f} MiB stripped, "
+        f"{totals['final_bytes'] / 2**20:.1f} MiB {compression} in {totals['process_seconds']:.2f} s",
+        f"depmod: {totals['depmod']} ({totals['depmod_seconds']:.2f} s)",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strip and compress the modules of a staged kernel, then run depmod.")
+    parser.add_argument("buildroot", help="Staging root containing lib/modules/<kernel release>.")
+    parser.add_argument("kernel_release")
+    parser.add_argument("--compression", choices=["zstd", "xz", "none"], default="zstd")
+    parser.add_argument("--level", type=int, default=None,
+                        help="Compression level. Default is the config's CONFIG_MODULE_COMPRESS_ZSTD_LEVEL, else 3 for zstd and 6 for xz.")
+    parser.add_argument("--config", default=None, help="The kernel's resolved .config, checked for in-kernel decompression support.")
+    parser.add_argument("--no-strip", action="store_true", help="Keep the debug sections.")
+    parser.add_argument("--no-depmod", action="store_true")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes. Default is the number of CPUs.")
+    parser.add_argument("--report", default=None, help="Write the sizes as JSON to this file.")
+    args = parser.parse_args()
+
+    config = KernelConfig.from_file(args.config) if args.config else None
+    try:
+        report = postprocess(args.buildroot, args.kernel_release, args.compression, args.level,
+                             not args.no_strip, args.jobs, not args.no_depmod, config)
+    except subprocess.CalledProcessError as e:
+        print(f"ERROR: {e}\n{e.stderr.strip()}", file=sys.stderr)
+        sys.exit(1)
+    if report["totals"]["compression_skipped"]:
+        print(f"WARNING: {report['totals']['compression_skipped']}, modules are left uncompressed.", file=sys.stderr)
+    for line in format_summary(report):
+        print(line)
+    if report["totals"]["depmod"] in ("missing", "no-output"):
+        print(f"WARNING: depmod {report['totals']['depmod']}, modules.dep is not part of the package.", file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
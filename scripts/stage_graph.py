@@ -0,0 +1,108 @@
+import concurrent.futures
+import time
+
+
+class StageGraph:
+    """
+    Runs stages with declared dependencies, each as soon as all of its
+    dependencies have finished, so independent stages overlap (a thread per
+    running stage; the stages mostly wait for subprocesses). After a failure
+    no further stage is started; the running ones are waited for and the first
+    exception is re-raised. Start and end of every stage are kept for
+    critical_path().
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.timings = {}
+        self.failed = []
+        self.skipped = []
+        self._origin = None
+
+    def add(self, name, func, after=()):
+        """Adds a stage; `after` names stages that must have finished first."""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' added twice.")
+        self.stages[name] = (func, tuple(after))
+
+    def _check(self):
+        for name, (_, after) in self.stages.items():
+            for dependency in after:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'.")
+        # Kahn's algorithm; whatever is left over is part of a cycle
+        remaining = {name: set(after) for name, (_, after) in self.stages.items()}
+        while remaining:
+            ready = [name for name, after in remaining.items() if not after]
+            if not ready:
+                raise ValueError(f"Stages {', '.join(sorted(remaining))} depend on each other.")
+            for name in ready:
+                del remaining[name]
+            for after in remaining.values():
+                after.difference_update(ready)
+
+    def run(self):
+        self._check()
+        self._origin = time.monotonic()
+        pending = {name: set(after) for name, (_, after) in self.stages.items()}
+        done = set()
+        running = {}
+        started = {}
+        failure = None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers or max(1, len(self.stages))) as executor:
+            while pending or running:
+                if failure is None:
+                    for name in [name for name, after in pending.items() if after <= done]:
+                        del pending[name]
+                        started[name] = time.monotonic() - self._origin
+                        running[executor.submit(self.stages[name][0])] = name
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    self.timings[name] = (started[name], time.monotonic() - self._origin)
+                    if future.exception() is not None:
+                        self.failed.append(name)
+                        failure = failure or future.exception()
+                    else:
+                        done.add(name)
+        self.skipped = sorted(pending)
+        if failure is not None:
+            raise failure
+
+    def critical_path(self):
+        """
+        The chain of stages that determined the total duration: starting from
+        the stage that finished last, each step goes to the dependency that
+        finished last, i.e. the one the stage was waiting for. Returns a list
+        of {"name", "start_seconds", "duration_seconds"} in execution order.
+        """
+        if not self.timings:
+            return []
+        path = []
+        name = max(self.timings, key=lambda stage: self.timings[stage][1])
+        while name:
+            start, end = self.timings[name]
+            path.append({"name": name, "start_seconds": round(start, 3), "duration_seconds": round(end - start, 3)})
+            after = [dependency for dependency in self.stages[name][1] if dependency in self.timings]
+            name = max(after, key=lambda stage: self.timings[stage][1]) if after else None
+        return path[::-1]
+
+    def report(self):
+        """Critical path report as lines of text, plus how much the overlap saved."""
+        path = self.critical_path()
+        if not path:
+            return []
+        wall = max(end for _, end in self.timings.values())
+        busy = sum(end - start for start, end in self.timings.values())
+        lines = [f"Critical path ({sum(stage['duration_seconds'] for stage in path):.2f} s of {wall:.2f} s wall time, "
+                 f"{busy:.2f} s of stage time in total):"]
+        for stage in path:
+            lines.append(f"  {stage['name']:<20} {stage['duration_seconds']:10.2f} s  (started at {stage['start_seconds']:.2f} s)")
+        on_path = {stage["name"] for stage in path}
+        overlapped = [name for name in self.timings if name not in on_path and self.timings[name][1] - self.timings[name][0] >= 0.01]
+        if overlapped:
+            lines.append(f"Overlapped with the critical path: {', '.join(overlapped)}")
+        return lines
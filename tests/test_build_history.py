@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.build_history import BuildHistory
+
+
+def make_report(number, duration=600.0, compile_seconds=400.0, rpm_bytes=100 * 2**20, status="success",
+                config_hash="a" * 64, incremental=False, compiler_cache="none", source_cache="none"):
+    return {
+        "build_id": f"build-{number}",
+        "timestamp": f"2026-10-{number:02d}T12:00:00",
+        "kernel_version": "6.16.8",
+        "kernel_config": "kernel-config/tiny/tiny.config",
+        "config_hash": config_hash,
+        "custom_suffix": "t",
+        "cpu_model": "Test CPU",
+        "total_ram": "16 GiB",
+        "make_jobs": "8",
+        "incremental": incremental,
+        "compiler_cache": compiler_cache,
+        "source_cache": source_cache,
+        "total_duration_seconds": duration,
+        "host_stages": {"image": 1.0},
+        "build": {
+            "status": status,
+            "stages": [{"name": "compile", "duration_seconds": compile_seconds}, {"name": "rpmbuild", "duration_seconds": 60.0}],
+            "artifacts": [{"name": "kernel.rpm", "size_bytes": rpm_bytes // 2}, {"name": "kernel-modules.rpm", "size_bytes": rpm_bytes // 2}],
+        },
+    }
+
+
+class BuildHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "history.sqlite3")
+        self.history = BuildHistory(self.db_path)
+
+    def tearDown(self):
+        self.history.close()
+        self.tmp.cleanup()
+
+    def record(self, *reports):
+        for report in reports:
+            self.history.record(report)
+        return self.history.get_run(reports[-1]["build_id"])
+
+    def test_record(self):
+        run = self.record(make_report(1, status="failed", incremental=True, compiler_cache="ccache", source_cache="zstd"))
+        self.assertEqual((run["status"], run["duration_seconds"], run["rpm_total_bytes"]), ("failed", 600.0, 100 * 2**20))
+        self.assertEqual((run["incremental"], run["compiler_cache"], run["source_cache"]), (1, "ccache", "zstd"))
+        self.assertEqual(self.history._stage_durations(run["id"]), {"image": 1.0, "compile": 400.0, "rpmbuild": 60.0})
+        # Recording a build again replaces it
+        run = self.record(make_report(1, duration=700.0))
+        self.assertEqual(len(self.history.runs()), 1)
+        self.assertEqual(run["duration_seconds"], 700.0)
+        self.assertEqual(self.history.connection.execute("SELECT COUNT(*) FROM stages").fetchone()[0], 3)
+
+    def test_older_database_gets_the_build_mode_columns(self):
+        self.history.close()
+        os.remove(self.db_path)
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("CREATE TABLE runs (id INTEGER PRIMARY KEY, build_id TEXT UNIQUE NOT NULL, timestamp TEXT NOT NULL,"
+                           " kernel_version TEXT, kernel_config TEXT, config_hash TEXT, custom_suffix TEXT, make_jobs TEXT,"
+                           " cpu_model TEXT, total_ram TEXT, status TEXT, duration_seconds REAL, rpm_total_bytes INTEGER)")
+        connection.close()
+        self.history = BuildHistory(self.db_path)
+        self.assertEqual(self.record(make_report(1, incremental=True))["incremental"], 1)
+
+    def test_baseline_runs(self):
+        self.record(make_report(1), make_report(2, status="failed"), make_report(3, incremental=True),
+                    make_report(4, compiler_cache="ccache"), make_report(5, source_cache="tree"), make_report(6))
+        run = self.record(make_report(7))
+        self.assertEqual([row["build_id"] for row in self.history.baseline_runs(run)], ["build-6", "build-1"])
+        self.assertEqual([row["build_id"] for row in self.history.baseline_runs(run, window=1)], ["build-6"])
+        warm = self.record(make_report(8, incremental=True))
+        self.assertEqual([row["build_id"] for row in self.history.baseline_runs(warm)], ["build-3"])
+
+    def test_regression_above_threshold(self):
+        self.record(make_report(1, duration=600.0), make_report(2, duration=620.0), make_report(3, duration=580.0))
+        run = self.record(make_report(4, duration=800.0, compile_seconds=600.0))
+        regressions = self.history.check_regressions(run, threshold=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("total build duration regressed: 800.00 vs. median 600.00 (+33%)", regressions)
+        self.assertTrue(any(regression.startswith("'compile' stage regressed") for regression in regressions))
+
+    def test_growth_within_threshold(self):
+        self.record(make_report(1, duration=600.0), make_report(2, duration=620.0))
+        run = self.record(make_report(3, duration=700.0, compile_seconds=450.0, rpm_bytes=110 * 2**20))
+        self.assertEqual(self.history.check_regressions(run, threshold=0.2), [])
+
+    def test_small_absolute_growth_is_ignored(self):
+        self.record(make_report(1, duration=20.0, compile_seconds=10.0))
+        run = self.record(make_report(2, duration=28.0, compile_seconds=15.0))
+        self.assertEqual(self.history.check_regressions(run, threshold=0.2), [])
+
+    def test_cold_build_is_not_compared_with_warm_ones(self):
+        self.record(make_report(1, duration=100.0, compile_seconds=20.0, compiler_cache="ccache"),
+                    make_report(2, duration=600.0, compile_seconds=400.0))
+        run = self.record(make_report(3, duration=610.0, compile_seconds=405.0))
+        self.assertEqual(self.history.check_regressions(run), [])
+
+    def test_config_change_in_any_baseline_run_is_noted(self):
+        self.record(make_report(1, config_hash="b" * 64), make_report(2), make_report(3))
+        run = self.record(make_report(4, duration=900.0))
+        regressions = self.history.check_regressions(run)
+        self.assertEqual(regressions[-1], "Note: the kernel configuration differs from some of the runs compared with.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.command_runner import run_streaming
+
+# Writes more than a pipe buffer (64 KiB) to each stream
+NOISY_COMMAND = [sys.executable, "-c", (
+    "import sys\n"
+    "for n in range(5000):\n"
+    "    print(f'out {n:04d} ' + 'x' * 20)\n"
+    "    print(f'err {n:04d} ' + 'y' * 20, file=sys.stderr)\n"
+    "sys.exit(3)\n"
+)]
+
+
+class RunStreamingTest(unittest.TestCase):
+    def test_tail_and_exit_code(self):
+        stdout, stderr = [], []
+        result = run_streaming(NOISY_COMMAND, on_stdout=stdout.append, on_stderr=stderr.append, tail_lines=3)
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual((len(stdout), len(stderr)), (5000, 5000))
+        self.assertEqual(result.stdout.splitlines(), stdout[-3:])
+        self.assertEqual(result.stderr.splitlines(), stderr[-3:])
+        with self.assertRaises(subprocess.CalledProcessError):
+            result.check_returncode()
+
+    def test_capture_stdout_keeps_everything(self):
+        result = run_streaming([sys.executable, "-c", "print('a\\nb\\nc')"], capture_stdout=True, tail_lines=1)
+        self.assertEqual(result.stdout, "a\nb\nc")
+
+    def test_failing_callback_drains_the_output_and_is_raised(self):
+        lines = []
+
+        def on_stdout(line):
+            lines.append(line)
+            raise OSError("No space left on device")
+
+        started = []
+        with self.assertRaisesRegex(OSError, "No space left"):
+            run_streaming(NOISY_COMMAND, on_stdout=on_stdout, on_start=started.append)
+        # The child was not left blocked on a full pipe: it ran to its end and was reaped
+        self.assertEqual(lines, ["out 0000 " + "x" * 20])
+        self.assertEqual(started[0].returncode, 3)
+
+    def test_rusage_of_the_command(self):
+        result = run_streaming([sys.executable, "-c", "bytearray(64 * 2**20)"])
+        self.assertEqual(result.returncode, 0)
+        # ru_maxrss is in KiB on Linux
+        self.assertGreater(result.rusage.ru_maxrss, 64 * 1024)
+        self.assertGreater(result.rusage.ru_utime + result.rusage.ru_stime, 0)
+
+    def test_failing_on_start_kills_the_command(self):
+        processes = []
+
+        def on_start(process):
+            processes.append(process)
+            raise RuntimeError("sampler broken")
+
+        with self.assertRaisesRegex(RuntimeError, "sampler broken"):
+            run_streaming([sys.executable, "-c", "import time; time.sleep(30)"], on_start=on_start)
+        self.assertEqual(processes[0].returncode, -9)
+
+
+if __name__ == "__main__":
+    unittest.main()
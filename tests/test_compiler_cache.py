@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.compiler_cache import CompilerCache
+
+
+def ccache_output(direct_hits, preprocessed_hits, misses, size_kib=2048):
+    return (f"stats_updated_timestamp\t1760000000\ndirect_cache_hit\t{direct_hits}\npreprocessed_cache_hit\t{preprocessed_hits}\n"
+            f"cache_miss\t{misses}\ncache_size_kibibyte\t{size_kib}\n")
+
+
+def sccache_output(hits, misses):
+    return json.dumps({"stats": {"cache_hits": {"counts": {"C/C++": hits}}, "cache_misses": {"counts": {"C/C++": misses}}},
+                       "cache_size": 4096})
+
+
+class CompilerCacheTest(unittest.TestCase):
+    def test_counters_are_never_zeroed(self):
+        for tool in ("ccache", "sccache"):
+            commands = CompilerCache(tool, "/cache", "20G").prepare_commands()
+            self.assertFalse([command for command in commands if "--zero-stats" in command], tool)
+
+    def test_ccache_stats_since_the_build_started(self):
+        cache = CompilerCache("ccache", "/cache", "20G")
+        before = cache.parse_stats(ccache_output(100, 20, 80))
+        self.assertEqual((before["hits"], before["misses"], before["hit_rate"]), (120, 80, 60.0))
+        stats = cache.parse_stats(ccache_output(130, 20, 90), before=before)
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (30, 10, 75.0))
+        self.assertEqual(stats["cache_size_bytes"], 2048 * 1024)
+
+    def test_sccache_stats_since_the_build_started(self):
+        cache = CompilerCache("sccache", "/cache", "20G")
+        before = cache.parse_stats(sccache_output(5, 5))
+        stats = cache.parse_stats(sccache_output(8, 6), before=before)
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (3, 1, 75.0))
+
+    def test_counters_reset_in_between(self):
+        cache = CompilerCache("ccache", "/cache", "20G")
+        before = cache.parse_stats(ccache_output(100, 0, 100))
+        stats = cache.parse_stats(ccache_output(4, 0, 1), before=before)
+        self.assertEqual((stats["hits"], stats["misses"]), (4, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
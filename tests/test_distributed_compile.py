@@ -0,0 +1,83 @@
+import os
+import shutil
+import sys
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.distributed_compile import DistccCluster, DistccHost, DistccMonitor, parse_hosts, self_check
+
+
+def listing(*hosts):
+    return "".join(f"  {4000 + n}  Compile     unit{n}.c          {host}\n" for n, host in enumerate(hosts))
+
+
+class DistccClusterTest(unittest.TestCase):
+    def test_parse_hosts(self):
+        self.assertEqual(parse_hosts("buildbox1/16, buildbox2:3633/8  127.0.0.1:3701"), [
+            DistccHost("buildbox1", 3632, 16), DistccHost("buildbox2", 3633, 8), DistccHost("127.0.0.1", 3701, 4),
+        ])
+        with self.assertRaisesRegex(ValueError, "Invalid distcc host"):
+            parse_hosts("buildbox1:port")
+
+    def test_make_jobs_and_hosts_value(self):
+        cluster = DistccCluster(parse_hosts("a/8 b:3633/4"), local_slots=2, state_dir="/tmp/distcc")
+        self.assertEqual(cluster.make_jobs(6), 6)
+        cluster.reachable = cluster.hosts[:1]
+        self.assertEqual(cluster.make_jobs(6), 10)
+        self.assertEqual(cluster.hosts_value(), "a:3632/8 localhost/2")
+
+
+class DistccMonitorTest(unittest.TestCase):
+    def monitor(self, spec, local_slots=2):
+        cluster = DistccCluster(parse_hosts(spec), local_slots, state_dir=None)
+        cluster.reachable = list(cluster.hosts)
+        return DistccMonitor(cluster)
+
+    def test_hosts_are_keyed_by_their_monitor_name(self):
+        monitor = self.monitor("buildbox1/4 buildbox2:3633/2")
+        monitor.record(listing("buildbox1[0]", "buildbox1[1]", "buildbox2[0]", "localhost[0]"))
+        monitor.record(listing("buildbox1[0]", "buildbox1[2]", "buildbox1[3]", "buildbox1[1]"))
+        rows = {row["host"]: row for row in monitor.utilization()}
+        self.assertEqual(rows["buildbox1:3632"]["mean_busy_slots"], 3.0)
+        self.assertEqual(rows["buildbox1:3632"]["utilization_percent"], 75.0)
+        self.assertEqual(rows["buildbox2:3633"]["mean_busy_slots"], 0.5)
+        self.assertEqual(rows["localhost"]["mean_busy_slots"], 0.5)
+
+    def test_daemons_sharing_a_host_name_are_not_counted_twice(self):
+        # Stand-ins on one machine: distccmon-text cannot tell the ports apart
+        monitor = self.monitor("127.0.0.1:3701/2 127.0.0.1:3702/2 127.0.0.1:3703/2")
+        for _ in range(4):
+            monitor.record(listing("127.0.0.1[0]", "127.0.0.1[1]", "127.0.0.1[0]", "localhost[0]"))
+        rows = monitor.utilization()
+        self.assertEqual([row["host"] for row in rows], ["127.0.0.1:3701, 127.0.0.1:3702, 127.0.0.1:3703", "localhost"])
+        self.assertEqual(rows[0]["slots"], 6)
+        self.assertEqual(rows[0]["mean_busy_slots"], 3.0)
+        self.assertEqual(rows[0]["utilization_percent"], 50.0)
+        self.assertEqual(rows[1]["mean_busy_slots"], 1.0)
+        self.assertEqual(rows[1]["utilization_percent"], 50.0)
+
+    def test_jobs_listed_with_their_port_count_once(self):
+        monitor = self.monitor("127.0.0.1:3701/2 127.0.0.1:3702/2")
+        monitor.record(listing("127.0.0.1:3701[0]", "127.0.0.1:3702[0]", "127.0.0.1:3702[1]"))
+        self.assertEqual(monitor.utilization()[0]["mean_busy_slots"], 3.0)
+
+    def test_unreachable_hosts_add_no_slots(self):
+        monitor = self.monitor("127.0.0.1:3701/2 127.0.0.1:3702/6 buildbox3/4")
+        monitor.cluster.reachable = monitor.cluster.hosts[:1]
+        monitor.record(listing("127.0.0.1[0]"))
+        rows = monitor.utilization()
+        self.assertEqual((rows[0]["slots"], rows[0]["utilization_percent"]), (2, 50.0))
+        self.assertEqual((rows[1]["host"], rows[1]["reachable"], rows[1]["utilization_percent"]), ("buildbox3:3632", False, 0.0))
+
+    @unittest.skipUnless(shutil.which("distccd") and shutil.which("distcc") and shutil.which("gcc"), "needs distccd, distcc and gcc")
+    def test_self_check_uses_every_daemon(self):
+        result = self_check(daemons=3, slots=2, log=lambda message: None)
+        self.assertEqual(result["failed"], 0)
+        self.assertTrue(all(result["served"].values()), result["served"])
+
+
+if __name__ == "__main__":
+    unittest.main()
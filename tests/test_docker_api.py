@@ -0,0 +1,285 @@
+import contextlib
+import http.server
+import io
+import json
+import os
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.builder_image import DOCKERFILE_LABEL, HASH_LABEL, image_status
+from scripts.container_pool import ContainerPool
+from scripts.docker_api import STREAM_STDERR, STREAM_STDOUT, DockerAPIError, DockerClient, _LineSplitter, demux_stream, summarize_stats
+
+
+def frame(stream_type, payload):
+    return struct.pack(">BxxxL", stream_type, len(payload)) + payload
+
+
+class FakeEngineHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers the handful of Engine API calls DockerClient makes. What it
+    answers is set on the server (see FakeEngine); every request is recorded.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return "unix"
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self):
+        engine = self.server.engine
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        engine.requests.append((self.command, self.path, body))
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/exec") and self.command == "POST":
+            self.send_json(201, {"Id": "exec1"})
+        elif path == "/exec/exec1/start":
+            # Raw stream until the connection closes, written in small pieces
+            # so that headers and payloads arrive cut at arbitrary points
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.docker.raw-stream")
+            self.end_headers()
+            for offset in range(0, len(engine.exec_stream), engine.chunk_size):
+                self.wfile.write(engine.exec_stream[offset:offset + engine.chunk_size])
+                self.wfile.flush()
+            self.close_connection = True
+        elif path == "/exec/exec1/json":
+            engine.inspections += 1
+            running = engine.inspections <= engine.running_inspections
+            self.send_json(200, {"Running": running, "ExitCode": None if running else engine.exit_code})
+        elif path in engine.responses:
+            status, content_type, data = engine.responses[path].pop(0)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_json(404, {"message": f"page not found: {path}"})
+
+    do_GET = do_POST = do_DELETE = handle_request
+
+
+class FakeEngine:
+    def __init__(self, socket_path):
+        self.requests = []
+        self.responses = {}
+        self.exec_stream = b""
+        self.chunk_size = 3
+        self.inspections = 0
+        self.running_inspections = 0
+        self.exit_code = 0
+        self.server = socketserver.ThreadingUnixStreamServer(socket_path, FakeEngineHandler)
+        self.server.daemon_threads = True
+        self.server.engine = self
+
+    def respond(self, path, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.responses.setdefault(path, []).append((status, content_type, data))
+
+
+@contextlib.contextmanager
+def fake_engine():
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "docker.sock")
+        engine = FakeEngine(socket_path)
+        threading.Thread(target=engine.server.serve_forever, daemon=True).start()
+        try:
+            yield engine, DockerClient(socket_path)
+        finally:
+            engine.server.shutdown()
+            engine.server.server_close()
+
+
+class StreamTest(unittest.TestCase):
+    def test_demux_stream(self):
+        data = frame(STREAM_STDOUT, b"out") + frame(STREAM_STDERR, b"") + frame(STREAM_STDERR, b"err\n")
+        self.assertEqual(list(demux_stream(io.BytesIO(data))), [(STREAM_STDOUT, b"out"), (STREAM_STDERR, b""), (STREAM_STDERR, b"err\n")])
+
+    def test_demux_stream_stops_at_a_truncated_header(self):
+        data = frame(STREAM_STDOUT, b"out") + frame(STREAM_STDOUT, b"more")[:5]
+        self.assertEqual(list(demux_stream(io.BytesIO(data))), [(STREAM_STDOUT, b"out")])
+
+    def test_line_splitter_joins_lines_cut_between_frames(self):
+        lines = []
+        splitter = _LineSplitter(lines.append, tail_lines=2)
+        for data in (b"first li", b"ne\nsecond", b"", b" line\nthi", b"rd"):
+            splitter.feed(data)
+        self.assertEqual(lines, ["first line", "second line"])
+        splitter.feed(b"", final=True)
+        self.assertEqual(lines, ["first line", "second line", "third"])
+        self.assertEqual(list(splitter.tail), ["second line", "third"])
+
+    def test_line_splitter_decodes_characters_cut_between_frames(self):
+        lines = []
+        splitter = _LineSplitter(lines.append, tail_lines=10)
+        encoded = "Übersetze drivers/gpu/drm/ä.c\n".encode("utf-8")
+        for offset in range(len(encoded)):
+            splitter.feed(encoded[offset:offset + 1])
+        splitter.feed(b"\xff\n", final=True)
+        self.assertEqual(lines, ["Übersetze drivers/gpu/drm/ä.c", "�"])
+
+    def test_summarize_stats(self):
+        stats = {
+            "cpu_stats": {"cpu_usage": {"total_usage": 3_000_000}, "system_cpu_usage": 10_000_000, "online_cpus": 4},
+            "precpu_stats": {"cpu_usage": {"total_usage": 1_000_000}, "system_cpu_usage": 6_000_000},
+            "memory_stats": {"usage": 500, "limit": 1000, "stats": {"inactive_file": 200}},
+            "blkio_stats": {"io_service_bytes_recursive": [
+                {"op": "Read", "value": 10}, {"op": "write", "value": 20}, {"op": "Write", "value": 5}, {"op": "Total", "value": 35},
+            ]},
+            "pids_stats": {"current": 7},
+        }
+        self.assertEqual(summarize_stats(stats), {
+            "cpu_percent": 200.0,
+            "memory_bytes": 300,
+            "memory_limit_bytes": 1000,
+            "block_read_bytes": 10,
+            "block_write_bytes": 25,
+            "pids": 7,
+        })
+
+    def test_summarize_stats_without_a_previous_sample(self):
+        # The first snapshot of a stream has empty precpu_stats and cgroup v1 names
+        stats = {"cpu_stats": {"cpu_usage": {"total_usage": 5, "percpu_usage": [1, 2]}},
+                 "memory_stats": {"usage": 100, "stats": {"total_inactive_file": 300}}}
+        summary = summarize_stats(stats)
+        self.assertIsNone(summary["cpu_percent"])
+        self.assertEqual(summary["memory_bytes"], 0)
+        self.assertIsNone(summary["pids"])
+
+
+class DockerClientTest(unittest.TestCase):
+    def test_exec_run_streams_split_frames_and_waits_for_the_exit_code(self):
+        with fake_engine() as (engine, client):
+            engine.exec_stream = (frame(STREAM_STDOUT, b"  CC      ker") + frame(STREAM_STDOUT, b"nel/fork.o\n  CC      k\xc3")
+                                  + frame(STREAM_STDERR, "warning: ünused\n".encode("utf-8"))
+                                  + frame(STREAM_STDOUT, b"\xa4.o\nlast"))
+            engine.running_inspections = 2
+            engine.exit_code = 2
+            stdout, stderr = [], []
+            result = client.exec_run("builder", ["make", "-j4"], on_stdout=stdout.append, on_stderr=stderr.append,
+                                     environment={"ARCH": "x86_64"})
+
+        self.assertEqual(stdout, ["  CC      kernel/fork.o", "  CC      kä.o", "last"])
+        self.assertEqual(stderr, ["warning: ünused"])
+        self.assertEqual(result.returncode, 2)
+        self.assertEqual(result.stdout, "  CC      kernel/fork.o\n  CC      kä.o\nlast")
+        self.assertEqual(result.stderr, "warning: ünused")
+        self.assertEqual(engine.inspections, 3)
+        method, path, body = engine.requests[0]
+        self.assertEqual((method, path), ("POST", "/containers/builder/exec"))
+        self.assertEqual(body["Cmd"], ["make", "-j4"])
+        self.assertEqual(body["Env"], ["ARCH=x86_64"])
+
+    def test_exec_run_gives_up_when_no_exit_code_is_reported(self):
+        with fake_engine() as (engine, client):
+            engine.running_inspections = 1000
+            with unittest.mock.patch("scripts.docker_api.time.sleep"):
+                with self.assertRaisesRegex(DockerAPIError, "did not report an exit code"):
+                    client.exec_run("builder", ["true"])
+            self.assertEqual(engine.inspections, 50)
+
+    def test_failing_callback_stops_the_container(self):
+        with fake_engine() as (engine, client):
+            engine.exec_stream = frame(STREAM_STDOUT, b"first\nsecond\n")
+            engine.respond("/containers/builder/stop", 204, b"")
+
+            def on_stdout(line):
+                raise OSError("No space left on device")
+
+            with self.assertRaisesRegex(OSError, "No space left"):
+                client.exec_run("builder", ["make"], on_stdout=on_stdout)
+            self.assertEqual(engine.requests[-1][:2], ("POST", "/containers/builder/stop?t=10"))
+            self.assertEqual(engine.inspections, 0)
+
+    def test_inspect(self):
+        with fake_engine() as (engine, client):
+            engine.respond("/containers/builder/json", 200, {"Id": "c1", "State": {"Running": True}})
+            self.assertTrue(client.inspect_container("builder")["State"]["Running"])
+            engine.respond("/images/gone/json", 404, {"message": "No such image: gone"})
+            self.assertIsNone(client.inspect_image("gone"))
+
+    def test_image_and_pool_use_the_client(self):
+        with fake_engine() as (engine, client), tempfile.TemporaryDirectory() as pool_dir:
+            engine.respond("/images/kernel-builder-py/json", 200, {
+                "Id": "sha256:1", "Config": {"Labels": {DOCKERFILE_LABEL: "tumbleweed.Dockerfile", HASH_LABEL: "outdated"}},
+            })
+            self.assertEqual(image_status("kernel-builder-py", docker=client), ("stale", "tumbleweed.Dockerfile"))
+            # Looked up by the lease and by the new container's entry
+            for _ in range(2):
+                engine.respond("/images/kernel-builder-py/json", 200, {"Id": "sha256:1"})
+            engine.respond("/containers/create", 201, {"Id": "c1"})
+            engine.respond("/containers/c1/start", 204, b"")
+            pool = ContainerPool(pool_dir, "kernel-builder-py", pool_dir, log=lambda message, level='info': None, docker=client)
+            name = pool.lease("build-1")
+            self.assertEqual(pool.status()[name]["image_id"], "sha256:1")
+            paths = [path for _, path, _ in engine.requests]
+        self.assertIn(f"/containers/create?name={name}", paths)
+        self.assertIn(f"/containers/{name}/exec", paths)
+
+    def test_error_message_is_decoded(self):
+        with fake_engine() as (engine, client):
+            engine.respond("/containers/gone/stats", 404, {"message": "No such container: gone"})
+            with self.assertRaises(DockerAPIError) as raised:
+                client.stats("gone")
+        self.assertEqual(raised.exception.status, 404)
+        self.assertEqual(str(raised.exception), "GET /containers/gone/stats: 404 No such container: gone")
+
+    def test_error_without_json_body_is_reported_as_text(self):
+        with fake_engine() as (engine, client):
+            engine.respond("/containers/builder/stop", 500, b"daemon is shutting down\n", content_type="text/plain")
+            with self.assertRaisesRegex(DockerAPIError, r"POST /containers/builder/stop: 500 daemon is shutting down$"):
+                client.stop_container("builder")
+
+    def test_ignored_status_is_not_an_error(self):
+        with fake_engine() as (engine, client):
+            engine.respond("/containers/gone", 404, {"message": "No such container: gone"})
+            client.remove_container("gone")
+            self.assertEqual(engine.requests[0][:2], ("DELETE", "/containers/gone?force=true"))
+
+    def test_unreachable_daemon(self):
+        client = DockerClient(os.path.join(tempfile.gettempdir(), f"no-docker-{os.getpid()}.sock"))
+        with self.assertRaisesRegex(DockerAPIError, "Cannot reach the Docker daemon"):
+            client.ping()
+
+    def test_missing_image_is_pulled(self):
+        with fake_engine() as (engine, client):
+            engine.respond("/containers/create", 404, {"message": "No such image: registry:5000/kernel-builder:9"})
+            engine.respond("/images/create", 200, b'{"status":"Pulling from kernel-builder"}\r\n{"status":"Download complete"}\r\n')
+            engine.respond("/containers/create", 201, {"Id": "c1"})
+            engine.respond("/containers/c1/start", 204, b"")
+            self.assertEqual(client.run_container("builder", "registry:5000/kernel-builder:9", ["sleep", "infinity"]), "c1")
+            paths = [path for _, path, _ in engine.requests]
+        self.assertEqual(paths, ["/containers/create?name=builder", "/images/create?fromImage=registry%3A5000%2Fkernel-builder&tag=9",
+                                 "/containers/create?name=builder", "/containers/c1/start"])
+
+    def test_failed_pull_is_reported(self):
+        with fake_engine() as (engine, client):
+            engine.respond("/containers/create", 404, {"message": "No such image: kernel-builder:latest"})
+            engine.respond("/images/create", 200, b'{"status":"Pulling"}\r\n{"error":"pull access denied for kernel-builder"}\r\n')
+            with self.assertRaisesRegex(DockerAPIError, "Pulling kernel-builder failed: pull access denied"):
+                client.run_container("builder", "kernel-builder", ["sleep", "infinity"])
+            self.assertEqual(engine.requests[1][1], "/images/create?fromImage=kernel-builder&tag=latest")
+
+
+if __name__ == "__main__":
+    unittest.main()
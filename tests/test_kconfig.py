@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.kconfig import KernelConfig, diff_configs, validate_config
+
+CONFIG = """\
+#
+# Automatically generated file; DO NOT EDIT.
+# Linux/x86 6.16.8 Kernel Configuration
+#
+CONFIG_CC_VERSION_TEXT="gcc (SUSE Linux) 15.1.1"
+CONFIG_GCC_VERSION=150101
+CONFIG_64BIT=y
+CONFIG_EXT4_FS=m
+# CONFIG_KASAN is not set
+CONFIG_NR_CPUS=64
+CONFIG_PHYSICAL_START=0x1000000
+CONFIG_LOCALVERSION="-bench"
+"""
+
+
+def config(text):
+    return KernelConfig.from_lines(text.splitlines(keepends=True))
+
+
+class KernelConfigTest(unittest.TestCase):
+    def test_parse(self):
+        parsed = config(CONFIG)
+        self.assertEqual(parsed.kernel_version, "6.16.8")
+        self.assertEqual(parsed.symbols["EXT4_FS"], "m")
+        self.assertEqual(parsed.symbols["KASAN"], "n")
+        self.assertEqual(parsed.symbols["PHYSICAL_START"], "0x1000000")
+        self.assertEqual(parsed.symbols["LOCALVERSION"], '"-bench"')
+        self.assertEqual(parsed.get("MISSING"), "n")
+        self.assertTrue(parsed.enabled("EXT4_FS"))
+        self.assertEqual((parsed.errors, parsed.duplicates), ([], []))
+        self.assertEqual(parsed.counts(), {"builtin": 1, "modules": 1, "disabled": 1, "total": 8})
+
+    def test_malformed_and_duplicate_lines(self):
+        parsed = config("CONFIG_64BIT=y\nCONFIG_NR_CPUS=many\nCONFIG_BROKEN\nstray text\nCONFIG_64BIT=n\n")
+        self.assertEqual(parsed.errors, [(2, "CONFIG_NR_CPUS=many"), (3, "CONFIG_BROKEN"), (4, "stray text")])
+        self.assertEqual(parsed.duplicates, [(5, "64BIT")])
+        # The last assignment wins, like in kconfig
+        self.assertEqual(parsed.symbols["64BIT"], "n")
+
+    def test_only_the_first_version_header_counts(self):
+        parsed = config("# Linux/arm64 6.12.1 Kernel Configuration\n# Linux/x86 6.16.8 Kernel Configuration\nCONFIG_64BIT=y\n")
+        self.assertEqual(parsed.kernel_version, "6.12.1")
+        self.assertIsNone(config("CONFIG_64BIT=y\n").kernel_version)
+
+    def test_fingerprint(self):
+        fingerprint = config(CONFIG).fingerprint()
+        # Comments, order, "is not set" lines and the compiler version do not count
+        reordered = "\n".join(sorted(line for line in CONFIG.splitlines()
+                                     if line.startswith("CONFIG_") and not line.startswith(("CONFIG_CC_VERSION_TEXT", "CONFIG_GCC_VERSION"))))
+        self.assertEqual(config(reordered + '\nCONFIG_GCC_VERSION=140201\n').fingerprint(), fingerprint)
+        self.assertNotEqual(config(CONFIG.replace("CONFIG_EXT4_FS=m", "CONFIG_EXT4_FS=y")).fingerprint(), fingerprint)
+
+
+class DiffConfigsTest(unittest.TestCase):
+    def test_diff(self):
+        old = config("CONFIG_A=y\nCONFIG_B=m\nCONFIG_C=y\n# CONFIG_D is not set\n")
+        new = config("CONFIG_A=y\nCONFIG_B=y\nCONFIG_E=m\n# CONFIG_C is not set\n")
+        self.assertEqual(diff_configs(old, new), {"added": {"E": "m"}, "removed": {}, "changed": {"B": ("m", "y"), "C": ("y", "n")}})
+        self.assertEqual(diff_configs(new, old)["removed"], {"E": "m"})
+
+    def test_not_set_is_the_same_as_absent(self):
+        old = config("CONFIG_A=y\n# CONFIG_B is not set\n")
+        new = config("CONFIG_A=y\n# CONFIG_C is not set\n")
+        self.assertEqual(diff_configs(old, new), {"added": {}, "removed": {}, "changed": {}})
+
+
+class ValidateConfigTest(unittest.TestCase):
+    def messages(self, issues):
+        return [(issue.level, issue.symbol) for issue in issues]
+
+    def test_valid_config(self):
+        self.assertEqual(validate_config(config(CONFIG), "6.16.8"), [])
+
+    def test_empty_config(self):
+        issues = validate_config(config("# just a comment\n"))
+        self.assertEqual(self.messages(issues), [("error", None)])
+        self.assertIn("no CONFIG_ symbols", issues[0].message)
+
+    def test_issues(self):
+        text = CONFIG + "CONFIG_NR_CPUS=64\nCONFIG_DEBUG_INFO=y\nCONFIG_NEW_DRIVER=m\nCONFIG_OLD_DRIVER=n\nbroken\n"
+        issues = validate_config(config(text), "6.17", known_symbols=set(config(CONFIG).symbols) | {"DEBUG_INFO"})
+        self.assertEqual(self.messages(issues), [
+            ("error", None),            # the malformed line
+            ("warning", "NR_CPUS"),     # assigned twice
+            ("warning", None),          # generated for 6.16.8
+            ("warning", "DEBUG_INFO"),  # expensive
+            ("warning", "NEW_DRIVER"),  # unknown to the kernel, OLD_DRIVER is off anyway
+        ])
+        self.assertIn("line 17", issues[0].message)
+
+    def test_strict_turns_warnings_into_errors(self):
+        issues = validate_config(config(CONFIG + "CONFIG_KCOV=y\n"), strict=True)
+        self.assertEqual(self.messages(issues), [("error", "KCOV")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import contextlib
+import functools
+import hashlib
+import http.server
+import io
+import lzma
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.kernel_sources import KernelSourceFetcher, TarballCache, parse_sha256sums, xz_intact
+
+KERNEL_VERSION = "6.16.8"
+TARBALL_NAME = f"linux-{KERNEL_VERSION}.tar.xz"
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """Static files with single byte-range support, like the kernel.org CDN."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def do_GET(self):
+        requested = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not requested or not os.path.isfile(path):
+            return super().do_GET()
+        start, end = requested.split("=", 1)[1].split("-")
+        with open(path, "rb") as f:
+            data = f.read()
+        end = int(end) if end else len(data) - 1
+        body = data[int(start):end + 1]
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@contextlib.contextmanager
+def serve_directory(directory):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(RangeHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def make_tarball():
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:xz") as tar:
+        data = os.urandom(256 * 1024)
+        info = tarfile.TarInfo(f"linux-{KERNEL_VERSION}/Makefile")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def quiet_log(message, level='info'):
+    pass
+
+
+class KernelSourceFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mirror_dir = os.path.join(self.tmp.name, "mirror")
+        self.release_dir = os.path.join(self.mirror_dir, "v6.x")
+        os.makedirs(self.release_dir)
+        self.tarball = make_tarball()
+        with open(os.path.join(self.release_dir, TARBALL_NAME), "wb") as f:
+            f.write(self.tarball)
+        self.sha256 = hashlib.sha256(self.tarball).hexdigest()
+        self.cache = TarballCache(os.path.join(self.tmp.name, "kernel-sources"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def publish_checksum(self, sha256):
+        with open(os.path.join(self.release_dir, "sha256sums.asc"), "w", encoding='utf-8') as f:
+            f.write(f"-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA256\n\n{sha256}  {TARBALL_NAME}\n")
+
+    def place_by_hand(self, data):
+        os.makedirs(self.cache.root, exist_ok=True)
+        with open(self.cache.named_path(TARBALL_NAME), "wb") as f:
+            f.write(data)
+
+    def fetch(self, mirror):
+        return KernelSourceFetcher(self.cache, mirror=mirror, segments=4, log=quiet_log).fetch(KERNEL_VERSION)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_parse_sha256sums(self):
+        text = f"Hash: SHA256\n\n{'a' * 64}  {TARBALL_NAME}\n{'b' * 64} *linux-6.16.7.tar.xz\nsignature\n"
+        self.assertEqual(parse_sha256sums(text), {TARBALL_NAME: "a" * 64, "linux-6.16.7.tar.xz": "b" * 64})
+
+    def test_segmented_download_is_verified_and_cached(self):
+        self.publish_checksum(self.sha256)
+        with serve_directory(self.mirror_dir) as mirror:
+            path = self.fetch(mirror)
+            self.assertEqual(self.read(path), self.tarball)
+            self.assertEqual(self.cache.lookup(TARBALL_NAME)["sha256"], self.sha256)
+            # The second fetch is served from the cache
+            os.remove(os.path.join(self.release_dir, TARBALL_NAME))
+            self.assertEqual(self.read(self.fetch(mirror)), self.tarball)
+
+    def test_cache_hit_evicts_beyond_the_limit(self):
+        self.publish_checksum(self.sha256)
+        with serve_directory(self.mirror_dir) as mirror:
+            self.fetch(mirror)
+            # An older tarball from a run with a larger limit
+            old_path = os.path.join(self.tmp.name, "old.tar.xz")
+            with open(old_path, "wb") as f:
+                f.write(b"old tarball")
+            self.cache.add("linux-6.15.1.tar.xz", old_path, "1" * 64)
+            self.cache.max_size = len(self.tarball)
+            self.assertEqual(self.read(self.fetch(mirror)), self.tarball)
+        self.assertIsNone(self.cache.lookup("linux-6.15.1.tar.xz"))
+        self.assertIsNotNone(self.cache.lookup(TARBALL_NAME))
+
+    def test_checksum_mismatch_is_refused(self):
+        self.publish_checksum("0" * 64)
+        with serve_directory(self.mirror_dir) as mirror:
+            with self.assertRaisesRegex(RuntimeError, "Checksum mismatch"):
+                self.fetch(mirror)
+        self.assertIsNone(self.cache.lookup(TARBALL_NAME))
+
+    def test_truncated_tarball_placed_by_hand_is_downloaded_again(self):
+        self.publish_checksum(self.sha256)
+        self.place_by_hand(self.tarball[:len(self.tarball) // 2])
+        with serve_directory(self.mirror_dir) as mirror:
+            self.assertEqual(self.read(self.fetch(mirror)), self.tarball)
+
+    def test_truncated_tarball_is_not_adopted_without_published_checksum(self):
+        # No sha256sums.asc: the mirror cannot vouch for any file
+        self.place_by_hand(self.tarball[:len(self.tarball) // 2])
+        with serve_directory(self.mirror_dir) as mirror:
+            with self.assertRaisesRegex(RuntimeError, "refusing to download it unverified"):
+                self.fetch(mirror)
+        self.assertIsNone(self.cache.lookup(TARBALL_NAME))
+        self.assertFalse(os.path.exists(self.cache.named_path(TARBALL_NAME)))
+
+    def test_intact_tarball_is_adopted_without_published_checksum(self):
+        self.place_by_hand(self.tarball)
+        with serve_directory(self.mirror_dir) as mirror:
+            path = self.fetch(mirror)
+        self.assertEqual(self.read(path), self.tarball)
+        self.assertEqual(self.cache.lookup(TARBALL_NAME)["sha256"], self.sha256)
+
+    def test_xz_integrity_check(self):
+        self.place_by_hand(self.tarball)
+        self.assertTrue(xz_intact(self.cache.named_path(TARBALL_NAME)))
+        self.place_by_hand(self.tarball[:-100])
+        self.assertFalse(xz_intact(self.cache.named_path(TARBALL_NAME)))
+        self.place_by_hand(lzma.compress(b"x")[:5])
+        self.assertFalse(xz_intact(self.cache.named_path(TARBALL_NAME)))
+
+
+if __name__ == "__main__":
+    unittest.main()
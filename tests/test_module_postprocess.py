@@ -0,0 +1,115 @@
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.kconfig import KernelConfig
+from scripts.module_postprocess import MODULE_SIGNATURE_MAGIC, configured_level, postprocess, process_module, unloadable_compression
+
+KERNEL_RELEASE = "6.16.8-bench"
+ZSTD_CONFIG = ["CONFIG_MODULE_COMPRESS=y", "CONFIG_MODULE_COMPRESS_ZSTD=y", "CONFIG_MODULE_DECOMPRESS=y"]
+
+
+@unittest.skipUnless(shutil.which("gcc") and shutil.which("strip"), "needs gcc and strip")
+class ModulePostprocessTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.buildroot = self.tmp.name
+        self.module_dir = os.path.join(self.buildroot, "lib", "modules", KERNEL_RELEASE)
+        source = os.path.join(self.tmp.name, "module.c")
+        with open(source, "w", encoding='utf-8') as f:
+            f.write("".join(f"int bench_fn_{n}(int x) {{ return x * {n}; }}\n" for n in range(50)))
+        # An object with debug sections stands in for a module
+        self.object_path = os.path.join(self.tmp.name, "module.o")
+        subprocess.run(["gcc", "-g", "-c", source, "-o", self.object_path], check=True)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def install(self, name, signed=False):
+        path = os.path.join(self.module_dir, "kernel", "drivers", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy(self.object_path, path)
+        if signed:
+            with open(path, "ab") as f:
+                f.write(b"\0" * 64 + MODULE_SIGNATURE_MAGIC)
+        return path
+
+    def test_unsigned_module_is_stripped(self):
+        path = self.install("plain.ko")
+        result = process_module(path, strip=True, compression="none")
+        self.assertFalse(result["signed"])
+        self.assertLess(result["stripped_bytes"], result["bytes"])
+        self.assertEqual(result["final_bytes"], os.path.getsize(path))
+
+    def test_signed_module_is_kept_unstripped(self):
+        path = self.install("signed.ko", signed=True)
+        with open(path, "rb") as f:
+            data = f.read()
+        result = process_module(path, strip=True, compression="none")
+        self.assertTrue(result["signed"])
+        self.assertEqual(result["stripped_bytes"], result["bytes"])
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_xz_suffix_and_content(self):
+        path = self.install("plain.ko")
+        process_module(path, strip=False, compression="xz")
+        self.assertFalse(os.path.exists(path))
+        with lzma.open(path + ".xz") as f, open(self.object_path, "rb") as original:
+            self.assertEqual(f.read(), original.read())
+
+    @unittest.skipUnless(shutil.which("zstd"), "needs zstd")
+    def test_zstd_suffix(self):
+        path = self.install("plain.ko")
+        result = process_module(path, strip=False, compression="zstd", level=3)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(result["final_bytes"], os.path.getsize(path + ".zst"))
+        self.assertLess(result["final_bytes"], result["stripped_bytes"])
+
+    @unittest.skipUnless(shutil.which("zstd"), "needs zstd")
+    def test_report_totals(self):
+        self.install("a.ko")
+        self.install("b.ko", signed=True)
+        report = postprocess(self.buildroot, KERNEL_RELEASE, jobs=2, depmod=False, config=KernelConfig.from_lines(ZSTD_CONFIG))
+        totals = report["totals"]
+        self.assertEqual((totals["modules"], totals["signed_modules"]), (2, 1))
+        self.assertEqual((totals["compression"], totals["level"], totals["compression_skipped"]), ("zstd", 3, None))
+        self.assertEqual(totals["depmod"], "skipped")
+        self.assertEqual(totals["bytes"], sum(result["bytes"] for result in report["largest"]))
+        self.assertEqual(totals["final_bytes"], sum(result["final_bytes"] for result in report["largest"]))
+        self.assertLess(totals["stripped_bytes"], totals["bytes"])
+        self.assertEqual(sorted(result["module"] for result in report["largest"]), ["kernel/drivers/a.ko", "kernel/drivers/b.ko"])
+        self.assertTrue(os.path.exists(os.path.join(self.module_dir, "kernel", "drivers", "a.ko.zst")))
+
+    def test_modules_stay_uncompressed_for_a_kernel_that_cannot_load_them(self):
+        path = self.install("a.ko")
+        # The kernel decompresses zstd only, xz modules would not load
+        report = postprocess(self.buildroot, KERNEL_RELEASE, compression="xz", depmod=False, config=KernelConfig.from_lines(ZSTD_CONFIG))
+        self.assertEqual(report["totals"]["compression"], "none")
+        self.assertIn("CONFIG_MODULE_COMPRESS_XZ", report["totals"]["compression_skipped"])
+        self.assertTrue(os.path.exists(path))
+
+
+class CompressionConfigTest(unittest.TestCase):
+    def test_unloadable_compression(self):
+        self.assertIsNone(unloadable_compression(KernelConfig.from_lines(ZSTD_CONFIG), "zstd"))
+        self.assertIsNone(unloadable_compression(KernelConfig.from_lines([]), "none"))
+        reason = unloadable_compression(KernelConfig.from_lines(["CONFIG_MODULE_COMPRESS_ZSTD=y"]), "zstd")
+        self.assertIn("CONFIG_MODULE_DECOMPRESS", reason)
+
+    def test_configured_level(self):
+        self.assertEqual(configured_level(KernelConfig.from_lines(ZSTD_CONFIG), "zstd"), 3)
+        self.assertEqual(configured_level(KernelConfig.from_lines(ZSTD_CONFIG + ["CONFIG_MODULE_COMPRESS_ZSTD_LEVEL=9"]), "zstd"), 9)
+        self.assertEqual(configured_level(KernelConfig.from_lines([]), "xz"), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Add the repository root to sys.path for module imports
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, repo_root)
+
+from scripts.stage_graph import StageGraph
+
+
+class StageGraphTest(unittest.TestCase):
+    def test_cycle_is_rejected_before_anything_runs(self):
+        ran = []
+        graph = StageGraph()
+        graph.add("a", lambda: ran.append("a"))
+        graph.add("b", lambda: ran.append("b"), after=["a", "d"])
+        graph.add("c", lambda: ran.append("c"), after=["b"])
+        graph.add("d", lambda: ran.append("d"), after=["c"])
+        with self.assertRaisesRegex(ValueError, "Stages b, c, d depend on each other"):
+            graph.run()
+        self.assertEqual(ran, [])
+
+    def test_unknown_dependency(self):
+        graph = StageGraph()
+        graph.add("sign", lambda: None, after=["rpmbuild"])
+        with self.assertRaisesRegex(ValueError, "Stage 'sign' depends on unknown stage 'rpmbuild'"):
+            graph.run()
+
+    def test_stage_added_twice(self):
+        graph = StageGraph()
+        graph.add("a", lambda: None)
+        with self.assertRaisesRegex(ValueError, "added twice"):
+            graph.add("a", lambda: None)
+
+    def test_failure_blocks_the_dependents(self):
+        ran = []
+        other_started = threading.Event()
+
+        def fail():
+            # Fails while the independent stage is still running
+            other_started.wait(5)
+            raise RuntimeError("compile failed")
+
+        def independent():
+            other_started.set()
+            time.sleep(0.1)
+            ran.append("independent")
+
+        graph = StageGraph()
+        graph.add("compile", fail)
+        graph.add("independent", independent)
+        graph.add("package", lambda: ran.append("package"), after=["compile"])
+        graph.add("later", lambda: ran.append("later"), after=["independent"])
+        with self.assertRaisesRegex(RuntimeError, "compile failed"):
+            graph.run()
+        # The running stage is waited for, nothing new starts after the failure
+        self.assertEqual(ran, ["independent"])
+        self.assertEqual(graph.failed, ["compile"])
+        self.assertEqual(graph.skipped, ["later", "package"])
+
+    def test_critical_path_follows_the_dependency_finished_last(self):
+        graph = StageGraph()
+        graph.add("download", lambda: time.sleep(0.2))
+        graph.add("setup", lambda: time.sleep(0.05))
+        graph.add("extract", lambda: time.sleep(0.05), after=["setup", "download"])
+        graph.add("cache", lambda: time.sleep(0.01))
+        graph.run()
+        path = graph.critical_path()
+        self.assertEqual([stage["name"] for stage in path], ["download", "extract"])
+        self.assertGreaterEqual(path[1]["start_seconds"], path[0]["duration_seconds"])
+        self.assertEqual(sorted(graph.timings), ["cache", "download", "extract", "setup"])
+        self.assertIn("Overlapped with the critical path: ", graph.report()[-1])
+
+    def test_critical_path_of_a_graph_that_did_not_run(self):
+        self.assertEqual(StageGraph().critical_path(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()